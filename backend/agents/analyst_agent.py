@@ -1,20 +1,42 @@
-from .base_agent import BaseAgent
+import os
+from .base_agent import BaseAgent, FallbackReply
+from services.rate_limiter import RateLimitExceeded
 try:
     from google import genai
     from google.genai import types
 except ImportError:
     genai = None
+    types = None
 
-from PIL import Image
+from services.frame_preprocessor import frame_preprocessor
+from services.burst import BURST_MAX_MODEL_FRAMES, local_score, screen_frame
+from services.cpu_pool import cpu_pool
+from services.tracing import span
+from services.logging_setup import get_logger
+from .generation_profiles import ANALYZE_PROFILE, BURST_PROFILE, CHAT_PROFILE, generation_stats, parse_structured
+
+logger = get_logger("agents.analyst")
 
 class AnalystAgent(BaseAgent):
+    CHAT_PERSONA = """You are an expert AI photography coach helping users take better photos.
+
+Be conversational, encouraging, and helpful. Give specific actionable advice about:
+- Lighting, composition, posing
+- When to take a photo (respond with action: "capture_photo")
+- What adjustments to make
+
+Keep responses concise (2-3 sentences). When you think it's the right moment to capture a photo, include the word CAPTURE in your response."""
+
     def __init__(self):
         super().__init__()
-        self.model_id = 'gemini-2.0-flash' # Using flash for real-time guidance speed
+        self.model_id = os.getenv("ANALYST_MODEL", 'gemini-2.0-flash') # Using flash for real-time guidance speed
 
-    async def process(self, image: Image.Image, context: str) -> dict:
+    async def process(self, image, context: str) -> dict:
         """
         Analyzes the image using Gemini 2.0 Flash for real-time guidance.
+
+        `image` is either raw JPEG/PNG bytes from the upload, which are bounded
+        and re-encoded by the frame preprocessor, or an already decoded PIL image.
         """
         if not self.client:
             return {
@@ -45,49 +67,34 @@ class AnalystAgent(BaseAgent):
            - torch_on (boolean: true if extra light is needed)
         
         If the shot is perfect, say "Perfect, capture now!".
-        
-        Return the response in JSON format keys:
-        {
-            "composition_score": 85,
-            "suggestion": "Tilt up slightly, frame the subject.",
-            "lighting": "Soft and balanced",
-            "is_ready_to_shoot": true,
-            "technical_adjustments": {
-                "zoom_level": 1.1,
-                "exposure_offset": 0.0,
-                "torch_on": false
-            }
-        }
         """
         
         try:
-            # google-genai SDK 0.6.0+ format
-            response = self.client.models.generate_content(
-                model=self.model_id,
-                contents=[prompt, image]
+            if isinstance(image, bytes):
+                frame = await frame_preprocessor.prepare_async(image)
+                image = types.Part.from_bytes(data=frame.data, mime_type=frame.mime_type)
+
+            # JSON mode with the AnalysisResponse schema and a bounded reply
+            response = await self.generate_content(
+                [prompt, image],
+                config=ANALYZE_PROFILE.config(),
+                timeout=ANALYZE_PROFILE.timeout,
             )
             
-            import json
-            try:
-                # Clean up response text for JSON parsing
-                text = response.text
-                if "```json" in text:
-                    text = text.split("```json")[-1].split("```")[0].strip()
-                elif "```" in text:
-                    text = text.split("```")[-1].split("```")[0].strip()
-                
-                data = json.loads(text)
-                return data
-            except Exception as e:
-                print(f"JSON Parsing Error: {e}")
+            parsed = parse_structured(ANALYZE_PROFILE, response)
+            if parsed is not None:
+                return parsed.model_dump()
+            else:
                 return {
                     "composition_score": 75,
                     "suggestion": f"Director: {response.text[:50]}...",
                     "lighting": "Analyzing...",
                     "is_ready_to_shoot": False
                 }
+        except RateLimitExceeded:
+            raise
         except Exception as e:
-            print(f"Gemini API Error: {e}")
+            logger.error("Gemini API error", extra={"context": context, "error": str(e)})
             return {
                 "composition_score": 0,
                 "suggestion": f"Technical issue: {str(e)[:40]}",
@@ -95,16 +102,113 @@ class AnalystAgent(BaseAgent):
                 "is_ready_to_shoot": False
             }
 
-    async def chat_guidance(self, prompt: str) -> str:
+    async def analyze_burst(self, images: list, context: str) -> dict:
+        """
+        Scores a burst of captures and picks the best one.
+
+        Frames are decoded and screened in parallel on `cpu_pool`; blurry or
+        badly exposed ones keep their local score. The best few survivors go
+        to Gemini together in one request, labelled with their burst index.
+        """
+        with span("screen", frames=len(images)) as screen_span:
+            screened = await cpu_pool.map(screen_frame, list(enumerate(images)))
+            survivors = sorted((f for f in screened if f.rejected is None), key=local_score, reverse=True)
+            for frame in survivors[BURST_MAX_MODEL_FRAMES:]:
+                frame.rejected = "not_in_top"
+            survivors = sorted(survivors[:BURST_MAX_MODEL_FRAMES], key=lambda f: f.index)
+            screen_span.set(survivors=len(survivors))
+
+        results = {
+            f.index: {
+                "index": f.index,
+                "composition_score": local_score(f),
+                "lighting": f.local["lighting"],
+                "suggestion": f.local["suggestion"],
+                "source": "local",
+                "rejected": f.rejected,
+            }
+            for f in screened
+        }
+        # Without a model verdict, the best-scoring survivor (or frame, if none survived) wins.
+        best = max(survivors or screened, key=local_score)
+        best_index, reason = best.index, "Best local exposure and focus."
+
+        parsed = await self._compare_frames(survivors, context) if self.client and survivors else None
+        if parsed is not None:
+            for score in parsed.frames:
+                if score.index in results and results[score.index]["rejected"] is None:
+                    results[score.index].update(composition_score=score.composition_score,
+                                                suggestion=score.suggestion, source="model")
+            if any(f.index == parsed.best_index for f in survivors):
+                best_index, reason = parsed.best_index, parsed.reason
+
+        return {
+            "frames": [results[i] for i in sorted(results)],
+            "best_index": best_index,
+            "reason": reason,
+            "model_frames": len(survivors) if parsed is not None else 0,
+        }
+
+    async def _compare_frames(self, frames: list, context: str):
+        prompt = f"""
+        You are 'Gemini 3', an expert AI Director and Photography Coach.
+        The user shot a burst of {len(frames)} photos of: '{context}'. Each image follows its label "Frame <index>".
+
+        For every frame give its index, a quality score (0-100) and a SHORT spoken tip (max 10 words).
+        Then give best_index, the frame worth keeping, judged on sharpness of the subject,
+        expression or moment, composition and light, and a one-sentence reason.
+        """
+        contents = [prompt]
+        for frame in frames:
+            contents.append(f"Frame {frame.index}")
+            contents.append(types.Part.from_bytes(data=frame.prepared.data, mime_type=frame.prepared.mime_type))
+        try:
+            response = await self.generate_content(contents, config=BURST_PROFILE.config(),
+                                                   timeout=BURST_PROFILE.timeout)
+            return parse_structured(BURST_PROFILE, response)
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            logger.error("Gemini API error", extra={"context": context, "error": str(e)})
+            return None
+
+    async def chat_guidance(self, prompt, system_instruction: str = None) -> str:
         """Generate conversational photography guidance"""
         if not self.client:
             return "Hi! I'm Gemini 3. I'm ready to help you take professional photos. What are we shooting today?"
         
         try:
-            response = self.client.models.generate_content(
-                model=self.model_id,
-                contents=prompt
+            response = await self.generate_content(
+                prompt,
+                config=CHAT_PROFILE.config(system_instruction),
+                timeout=CHAT_PROFILE.timeout,
             )
+            generation_stats.record_response(CHAT_PROFILE, response)
             return response.text.strip()
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            return FallbackReply(f"Director is busy: {str(e)[:40]}. Let's try again!")
+
+    async def chat_guidance_stream(self, prompt, system_instruction: str = None):
+        """Streams the same guidance as `chat_guidance`, chunk by chunk."""
+        if not self.client:
+            yield "Hi! I'm Gemini 3. I'm ready to help you take professional photos. What are we shooting today?"
+            return
+
+        sent = False
+        try:
+            async for chunk in self.generate_content_stream(
+                prompt,
+                config=CHAT_PROFILE.config(system_instruction),
+                timeout=CHAT_PROFILE.timeout,
+            ):
+                sent = True
+                yield chunk
+        except RateLimitExceeded:
+            raise
         except Exception as e:
-            return f"Director is busy: {str(e)[:40]}. Let's try again!"
+            if sent:
+                # Part of the reply is already out; let the caller end the stream with an error.
+                raise
+            yield FallbackReply(f"Director is busy: {str(e)[:40]}. Let's try again!")
@@ -1,30 +1,301 @@
 from abc import ABC, abstractmethod
+import asyncio
+import functools
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 try:
     from google import genai
+    from google.genai import types
 except ImportError:
     genai = None
+    types = None
 
 from dotenv import load_dotenv
 
+from .registry import client_registry
+from services.rate_limiter import RateLimitExceeded, rate_limiter
+from services.metrics import (
+    MODEL_CALL_ERRORS, MODEL_CALL_LATENCY, MODEL_CALLS_IN_FLIGHT, MODEL_TIME_TO_FIRST_TOKEN,
+)
+from services.logging_setup import get_logger
+from services.tracing import span
+
 load_dotenv()
 
+# Upper bound for a single upstream model call, in seconds.
+MODEL_CALL_TIMEOUT = float(os.getenv("MODEL_CALL_TIMEOUT", "30"))
+# Threads used when an SDK call has no async surface and must run blocking.
+MODEL_EXECUTOR_WORKERS = int(os.getenv("MODEL_EXECUTOR_WORKERS", "8"))
+
+# Rough per-call token costs used for tokens-per-minute admission before the
+# real usage is known.
+IMAGE_TOKEN_ESTIMATE = 258
+OUTPUT_TOKEN_ESTIMATE = 256
+RATE_LIMITED_METHODS = ("generate_content", "generate_content_stream", "generate_images")
+
+_model_executor = None
+logger = get_logger("agents")
+
+
+class ClientDisconnected(Exception):
+    """Raised when the HTTP client went away before the model call finished."""
+
+
+class FallbackReply(str):
+    """A canned chat reply sent when the model call failed; shown to the user, never stored as a turn."""
+
+
+def get_model_executor() -> ThreadPoolExecutor:
+    """Bounded executor for blocking SDK calls, created on first use."""
+    global _model_executor
+    if _model_executor is None:
+        _model_executor = ThreadPoolExecutor(
+            max_workers=MODEL_EXECUTOR_WORKERS,
+            thread_name_prefix="model-call",
+        )
+    return _model_executor
+
+
+async def run_blocking(fn, *args, timeout: float = None, **kwargs):
+    """Run a blocking callable on the model executor without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(get_model_executor(), functools.partial(fn, *args, **kwargs))
+    return await asyncio.wait_for(future, timeout or MODEL_CALL_TIMEOUT)
+
+
+def estimate_tokens(contents, config=None) -> int:
+    """Cheap upper-bound guess of a request's input plus output tokens."""
+    def count(item):
+        if item is None:
+            return 0
+        if isinstance(item, str):
+            return len(item) // 4 + 1
+        if isinstance(item, (list, tuple)):
+            return sum(count(i) for i in item)
+        parts = getattr(item, "parts", None)
+        if parts is not None:
+            return count(parts)
+        text = getattr(item, "text", None)
+        if text:
+            return count(text)
+        return IMAGE_TOKEN_ESTIMATE
+
+    if isinstance(config, dict):
+        max_output = config.get("max_output_tokens")
+        system = config.get("system_instruction")
+    else:
+        max_output = getattr(config, "max_output_tokens", None)
+        system = getattr(config, "system_instruction", None)
+    return count(contents) + count(system) + (max_output or OUTPUT_TOKEN_ESTIMATE)
+
+
+async def invoke_model(client, method: str, timeout: float = None, **kwargs):
+    """
+    Calls `client.models.<method>` without blocking the event loop.
+
+    Prefers the SDK's native async surface (`client.aio.models`) and falls back
+    to the bounded executor for clients that only expose the sync API.
+    Generation calls are admitted by the per-model rate limiter first; an
+    upstream 429 is turned into RateLimitExceeded and pauses that model.
+    """
+    model_id = kwargs.get("model")
+    limited = method in RATE_LIMITED_METHODS
+    estimate = 0
+    if limited:
+        if method != "generate_images":
+            estimate = estimate_tokens(kwargs.get("contents"), kwargs.get("config"))
+        try:
+            with span("model.admit", model=model_id, tokens=estimate):
+                await rate_limiter.acquire(model_id, estimate)
+        except RateLimitExceeded:
+            MODEL_CALL_ERRORS.inc(model=model_id, method=method, error="rate_limited")
+            raise
+
+    started = time.perf_counter()
+    MODEL_CALLS_IN_FLIGHT.inc(model=model_id)
+    try:
+        with span("model.call", model=model_id, method=method):
+            aio = getattr(client, "aio", None)
+            if aio is not None:
+                call = getattr(aio.models, method)(**kwargs)
+                response = await asyncio.wait_for(call, timeout or MODEL_CALL_TIMEOUT)
+            else:
+                response = await run_blocking(getattr(client.models, method), timeout=timeout, **kwargs)
+    except asyncio.TimeoutError:
+        MODEL_CALL_ERRORS.inc(model=model_id, method=method, error="timeout")
+        raise
+    except Exception as e:
+        if limited and getattr(e, "code", None) == 429:
+            MODEL_CALL_ERRORS.inc(model=model_id, method=method, error="upstream_429")
+            raise rate_limiter.upstream_rejected(model_id) from e
+        MODEL_CALL_ERRORS.inc(model=model_id, method=method, error=type(e).__name__)
+        raise
+    finally:
+        MODEL_CALLS_IN_FLIGHT.dec(model=model_id)
+        MODEL_CALL_LATENCY.observe(time.perf_counter() - started, model=model_id, method=method)
+
+    usage = getattr(response, "usage_metadata", None)
+    if limited and usage is not None and getattr(usage, "total_token_count", None):
+        rate_limiter.record_usage(model_id, estimate, usage.total_token_count)
+    return response
+
+
+async def stream_model(client, timeout: float = None, **kwargs):
+    """
+    Async generator over `generate_content_stream`, yielding text chunks.
+
+    Admission, metrics and 429 handling match `invoke_model`. `timeout`
+    bounds the wait for each chunk rather than the whole reply, and the time
+    to the first chunk is recorded separately. Clients without an async
+    surface fall back to one blocking call yielded as a single chunk.
+    """
+    model_id = kwargs.get("model")
+    method = "generate_content_stream"
+    timeout = timeout or MODEL_CALL_TIMEOUT
+    estimate = estimate_tokens(kwargs.get("contents"), kwargs.get("config"))
+    try:
+        with span("model.admit", model=model_id, tokens=estimate):
+            await rate_limiter.acquire(model_id, estimate)
+    except RateLimitExceeded:
+        MODEL_CALL_ERRORS.inc(model=model_id, method=method, error="rate_limited")
+        raise
+
+    started = time.perf_counter()
+    usage = None
+    stream = None
+    MODEL_CALLS_IN_FLIGHT.inc(model=model_id)
+    try:
+        with span("model.stream", model=model_id) as stream_span:
+            aio = getattr(client, "aio", None)
+            if aio is not None:
+                stream = await asyncio.wait_for(aio.models.generate_content_stream(**kwargs), timeout)
+            else:
+                response = await run_blocking(client.models.generate_content, timeout=timeout, **kwargs)
+                stream = _single_chunk(response)
+            first = True
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), timeout)
+                except StopAsyncIteration:
+                    break
+                if first:
+                    first = False
+                    ttft = time.perf_counter() - started
+                    MODEL_TIME_TO_FIRST_TOKEN.observe(ttft, model=model_id)
+                    stream_span.set(ttft_ms=round(ttft * 1000, 1))
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                text = getattr(chunk, "text", None)
+                if text:
+                    yield text
+    except asyncio.TimeoutError:
+        MODEL_CALL_ERRORS.inc(model=model_id, method=method, error="timeout")
+        raise
+    except Exception as e:
+        if getattr(e, "code", None) == 429:
+            MODEL_CALL_ERRORS.inc(model=model_id, method=method, error="upstream_429")
+            raise rate_limiter.upstream_rejected(model_id) from e
+        MODEL_CALL_ERRORS.inc(model=model_id, method=method, error=type(e).__name__)
+        raise
+    finally:
+        MODEL_CALLS_IN_FLIGHT.dec(model=model_id)
+        MODEL_CALL_LATENCY.observe(time.perf_counter() - started, model=model_id, method=method)
+        # Closing early (client gone) must also release the upstream response.
+        if stream is not None and hasattr(stream, "aclose"):
+            await stream.aclose()
+
+    if usage is not None and getattr(usage, "total_token_count", None):
+        rate_limiter.record_usage(model_id, estimate, usage.total_token_count)
+
+
+async def _single_chunk(response):
+    yield response
+
+
+async def cancel_on_disconnect(request, coro, poll_interval: float = 0.25):
+    """
+    Awaits `coro`, cancelling it as soon as the HTTP client disconnects.
+
+    `request` is a Starlette Request; its body must already have been consumed
+    (which is always the case for Form/File and JSON body parameters).
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+def chat_contents(history, message: str) -> list:
+    """Multi-turn contents from (role, text) history plus the new user message."""
+    if types is None:
+        return message
+    turns = list(history) + [("user", message)]
+    return [types.Content(role=role, parts=[types.Part.from_text(text=text)]) for role, text in turns]
+
+
 class BaseAgent(ABC):
+    # Fixed persona sent as the system instruction for chat; kept byte-identical
+    # across turns so upstream prompt caching can reuse it.
+    CHAT_PERSONA = ""
+
+    def chat_system_instruction(self, context: str) -> str:
+        return f"{self.CHAT_PERSONA}\n\nShooting context: {context}."
+
     def __init__(self):
         self.api_key = os.getenv("GOOGLE_API_KEY")
         self.client = None
         if self.api_key:
-            print(f"DEBUG: GOOGLE_API_KEY found (starts with {self.api_key[:4]}...)")
+            logger.debug("GOOGLE_API_KEY found", extra={"agent": type(self).__name__, "key_prefix": self.api_key[:4]})
             if genai:
                 try:
-                    self.client = genai.Client(api_key=self.api_key)
-                    print("DEBUG: Gemini client initialized successfully.")
-                except Exception as e:
-                    print(f"DEBUG: Error initializing Gemini client: {e}")
+                    self.client = client_registry.get_client(self.api_key)
+                    logger.debug("Gemini client initialized", extra={"agent": type(self).__name__})
+                except Exception:
+                    logger.exception("Error initializing Gemini client", extra={"agent": type(self).__name__})
             else:
-                print("DEBUG: Warning: google-genai not installed.")
+                logger.warning("google-genai not installed")
         else:
-            print("DEBUG: Warning: GOOGLE_API_KEY not found in environment variables.")
+            logger.warning("GOOGLE_API_KEY not found in environment variables")
+
+    async def generate_content(self, contents, model: str = None, config=None, timeout: float = None):
+        """Non-blocking `models.generate_content` against this agent's model."""
+        return await invoke_model(
+            self.client,
+            "generate_content",
+            timeout=timeout,
+            model=model or self.model_id,
+            contents=contents,
+            config=config,
+        )
+
+    async def generate_images(self, prompt: str, model: str = None, config=None, timeout: float = None):
+        """Non-blocking `models.generate_images` against this agent's model."""
+        return await invoke_model(
+            self.client,
+            "generate_images",
+            timeout=timeout,
+            model=model or self.model_id,
+            prompt=prompt,
+            config=config,
+        )
+
+    def generate_content_stream(self, contents, model: str = None, config=None, timeout: float = None):
+        """Streaming `generate_content`: an async iterator of text chunks."""
+        return stream_model(
+            self.client,
+            timeout=timeout,
+            model=model or self.model_id,
+            contents=contents,
+            config=config,
+        )
 
     @abstractmethod
     async def process(self, *args, **kwargs):
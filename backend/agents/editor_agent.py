@@ -1,59 +1,92 @@
 import os
-import uuid
-from PIL import Image
 from .base_agent import BaseAgent
+from services.cpu_pool import cpu_pool
+from services.effect_cache import effect_cache
+from services.effect_compositor import PRESETS, composite_effect
+from services.effect_storage import effect_storage
+from services.logging_setup import get_logger
+from services.rate_limiter import RateLimitExceeded
+from services.tracing import span
+
+logger = get_logger("agents.editor")
+
+# Imagen prompts for the preset effects
+EFFECT_PROMPTS = {
+    "no effect": None,
+    "steam": "Add realistic enhanced steam and hot air rising from the food.",
+    "fresh": "Enhance colors and add a fresh-food simulation with subtle water droplets and vibrant textures.",
+    "glow": "Add a soft cinematic glow to the subject.",
+    "product": "Enhance product details, sharpen branding, and clean up the background lighting."
+}
+
+# Presets rendered on the user's photo by `effect_compositor` instead of Imagen.
+LOCAL_EFFECTS = {name.strip().lower() for name in os.getenv("EFFECT_LOCAL_PRESETS", ",".join(PRESETS)).split(",")
+                 if name.strip().lower() in PRESETS}
 
 class EditorAgent(BaseAgent):
     def __init__(self):
         super().__init__()
-        self.model_id = 'imagen-3.0-generate-001' 
+        self.model_id = os.getenv("EDITOR_MODEL", 'imagen-3.0-generate-001')
 
-    async def process(self, image: Image.Image, prompt: str) -> dict:
-        return await self.process_effect(image, prompt)
+    async def process(self, image_bytes: bytes, prompt: str) -> dict:
+        return await self.process_effect(image_bytes, prompt)
 
-    async def process_effect(self, image: Image.Image, prompt_or_type: str) -> dict:
+    async def process_effect(self, image_bytes: bytes, prompt_or_type: str) -> dict:
         """
-        Applies a real-time effect to the image using Imagen.
+        Applies a real-time effect to the photo: presets in `LOCAL_EFFECTS` are
+        composited locally, anything else is generated with Imagen.
         """
+        if prompt_or_type.lower() in LOCAL_EFFECTS:
+            return await self._composite_effect(prompt_or_type, image_bytes)
+
         if not self.client:
             return {"error": "Client not initialized"}
 
-        # Define prompts for special effects
-        effect_prompts = {
-            "no effect": None,
-            "steam": "Add realistic enhanced steam and hot air rising from the food.",
-            "fresh": "Enhance colors and add a fresh-food simulation with subtle water droplets and vibrant textures.",
-            "glow": "Add a soft cinematic glow to the subject.",
-            "product": "Enhance product details, sharpen branding, and clean up the background lighting."
-        }
-
         # If it's a known type, use the preset prompt, otherwise use it as a custom prompt
-        final_prompt = effect_prompts.get(prompt_or_type.lower(), prompt_or_type)
+        with span("prompt.build", effect_type=prompt_or_type):
+            final_prompt = EFFECT_PROMPTS.get(prompt_or_type.lower(), prompt_or_type)
         
         if not final_prompt:
              return {"effect_type": prompt_or_type, "status": "none", "overlay_url": ""}
 
+        config = {
+            'number_of_images': 1,
+            'include_rai_reason': True,
+        }
+        # Imagen only sees the prompt, so identical prompts can share a result.
+        result = await effect_cache.get_or_create(
+            self.model_id, final_prompt, config,
+            lambda: self._generate_effect(prompt_or_type, final_prompt, config),
+            is_valid=lambda cached: effect_storage.exists(cached["overlay_url"])
+        )
+        if "error" not in result:
+            result["effect_type"] = prompt_or_type
+            effect_storage.touch(result["overlay_url"])
+        return result
+
+    async def _composite_effect(self, prompt_or_type: str, image_bytes: bytes) -> dict:
+        preset = prompt_or_type.lower()
         try:
-            print(f"DEBUG: EditorAgent generating image with prompt: {final_prompt}")
-            response = self.client.models.generate_images(
-                model=self.model_id,
-                prompt=final_prompt,
-                config={
-                    'number_of_images': 1,
-                    'include_rai_reason': True,
-                }
-            )
+            with span("composite", preset=preset, bytes_in=len(image_bytes)) as composite_span:
+                rendered = await cpu_pool.run(composite_effect, preset, image_bytes)
+                composite_span.set(width=rendered.width, height=rendered.height, **rendered.timings_ms)
+        except Exception as e:
+            logger.error("Local effect failed", extra={"effect_type": prompt_or_type, "error": str(e)})
+            return {"error": f"Could not apply {preset}: {str(e)[:80]}"}
+        overlay_url = await effect_storage.save_data(rendered.data, "effect", "jpg")
+        return {"effect_type": prompt_or_type, "status": "applied", "overlay_url": overlay_url}
+
+    async def _generate_effect(self, prompt_or_type: str, final_prompt: str, config: dict) -> dict:
+        try:
+            logger.debug("Generating effect image", extra={"effect_type": prompt_or_type, "prompt": final_prompt})
+            response = await self.generate_images(final_prompt, config=config)
 
             if response.generated_images:
-                print(f"DEBUG: EditorAgent successfully generated image.")
+                logger.debug("Effect image generated", extra={"effect_type": prompt_or_type})
                 generated_image = response.generated_images[0].image
                 
-                # Save to static directory
-                filename = f"effect_{uuid.uuid4().hex}.png"
-                static_path = os.path.join("static", "effects", filename)
-                os.makedirs(os.path.dirname(static_path), exist_ok=True)
-                
-                generated_image.save(static_path)
+                # Save to the indexed, content-addressed effect store
+                overlay_url = await effect_storage.save_image(generated_image, "effect")
                 
                 # Return the URL (backend is on port 8000)
                 # We use a relative path /static/... which the frontend should handle
@@ -61,11 +94,13 @@ class EditorAgent(BaseAgent):
                 return {
                     "effect_type": prompt_or_type,
                     "status": "applied",
-                    "overlay_url": f"/static/effects/{filename}"
+                    "overlay_url": overlay_url
                 }
             else:
                 return {"error": "No image generated by Imagen"}
 
+        except RateLimitExceeded:
+            raise
         except Exception as e:
-            print(f"Imagen Error: {e}")
+            logger.error("Imagen error", extra={"effect_type": prompt_or_type, "error": str(e)})
             return {"error": str(e)}
@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Optional, Type
+from pydantic import BaseModel, ValidationError
+try:
+    from google.genai import types
+except ImportError:
+    types = None
+
+from schemas import AnalysisResponse, BurstModelOutput, ClipModelOutput, SceneModelOutput
+from services.logging_setup import get_logger
+from services.tracing import span
+
+logger = get_logger("agents.generation")
+
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    """
+    Generation settings for one endpoint.
+
+    `response_schema` switches the call to JSON mode with that pydantic model
+    as the schema; `max_output_tokens` and `timeout` bound cost and latency.
+    Both can be overridden with PROFILE_<NAME>_MAX_TOKENS / PROFILE_<NAME>_TIMEOUT.
+    """
+    name: str
+    max_output_tokens: int
+    timeout: float
+    temperature: float = 0.4
+    response_schema: Optional[Type[BaseModel]] = None
+
+    @classmethod
+    def from_env(cls, name: str, max_output_tokens: int, timeout: float, **kwargs) -> "GenerationProfile":
+        prefix = f"PROFILE_{name.upper()}_"
+        return cls(
+            name=name,
+            max_output_tokens=int(os.getenv(prefix + "MAX_TOKENS", str(max_output_tokens))),
+            timeout=float(os.getenv(prefix + "TIMEOUT", str(timeout))),
+            **kwargs,
+        )
+
+    def config(self, system_instruction: str = None):
+        if types is None:
+            return None
+        if self.response_schema is None:
+            return types.GenerateContentConfig(
+                max_output_tokens=self.max_output_tokens,
+                temperature=self.temperature,
+                system_instruction=system_instruction,
+            )
+        return types.GenerateContentConfig(
+            max_output_tokens=self.max_output_tokens,
+            temperature=self.temperature,
+            system_instruction=system_instruction,
+            response_mime_type="application/json",
+            response_schema=self.response_schema,
+        )
+
+
+ANALYZE_PROFILE = GenerationProfile.from_env("analyze", 200, 8.0, response_schema=AnalysisResponse)
+SCENE_PROFILE = GenerationProfile.from_env("scene", 160, 6.0, response_schema=SceneModelOutput)
+CHAT_PROFILE = GenerationProfile.from_env("chat", 160, 15.0, temperature=0.7)
+BURST_PROFILE = GenerationProfile.from_env("burst", 600, 15.0, response_schema=BurstModelOutput)
+CLIP_PROFILE = GenerationProfile.from_env("clip", 900, 25.0, response_schema=ClipModelOutput)
+
+
+def _strip_fences(text: str) -> str:
+    if "```json" in text:
+        return text.split("```json")[-1].split("```")[0].strip()
+    if "```" in text:
+        return text.split("```")[1].strip()
+    return text.strip()
+
+
+class GenerationStats:
+    """Per-profile counters for calls, parse outcomes and output tokens."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiles = {}
+
+    def _counters(self, profile: GenerationProfile) -> dict:
+        counters = self._profiles.get(profile.name)
+        if counters is None:
+            counters = self._profiles[profile.name] = {
+                "calls": 0, "parsed": 0, "parse_fallbacks": 0, "parse_failures": 0,
+                "output_tokens": 0, "truncated": 0,
+            }
+        return counters
+
+    def record_response(self, profile: GenerationProfile, response):
+        usage = getattr(response, "usage_metadata", None)
+        output_tokens = getattr(usage, "candidates_token_count", None) or 0
+        candidates = getattr(response, "candidates", None) or []
+        finish_reason = getattr(candidates[0], "finish_reason", None) if candidates else None
+        with self._lock:
+            counters = self._counters(profile)
+            counters["calls"] += 1
+            counters["output_tokens"] += output_tokens
+            if finish_reason is not None and "MAX_TOKENS" in str(finish_reason):
+                counters["truncated"] += 1
+
+    def record_parse(self, profile: GenerationProfile, outcome: str):
+        with self._lock:
+            self._counters(profile)[outcome] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            result = {}
+            for name, counters in self._profiles.items():
+                calls = counters["calls"] or 1
+                result[name] = dict(counters, avg_output_tokens=round(counters["output_tokens"] / calls, 1))
+            return result
+
+
+generation_stats = GenerationStats()
+
+
+def parse_structured(profile: GenerationProfile, response) -> Optional[BaseModel]:
+    """
+    Validates a JSON-mode response against the profile's schema.
+
+    The fast path hands the raw text straight to pydantic's JSON validator;
+    only if that fails do we strip markdown fences and retry. Returns None
+    (and counts a parse failure) when neither works.
+    """
+    generation_stats.record_response(profile, response)
+    with span("parse", profile=profile.name) as parse_span:
+        outcome, parsed = _validate(profile.response_schema, getattr(response, "text", None) or "")
+        parse_span.set(outcome=outcome)
+    generation_stats.record_parse(profile, outcome)
+    return parsed
+
+
+def _validate(model: Type[BaseModel], text: str):
+    try:
+        return "parsed", model.model_validate_json(text)
+    except ValidationError:
+        pass
+    try:
+        return "parse_fallbacks", model.model_validate(json.loads(_strip_fences(text)))
+    except (ValueError, ValidationError) as e:
+        logger.debug("Response failed validation", extra={"schema": model.__name__, "error": str(e)})
+        return "parse_failures", None
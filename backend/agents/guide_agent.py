@@ -1,61 +1,107 @@
+import io
 import os
-import uuid
+from PIL import Image
 from .base_agent import BaseAgent
+from services.effect_cache import effect_cache
+from services.effect_storage import effect_storage, image_bytes_of
+from services.logging_setup import get_logger
+from services.overlay_engine import EFFECTS
+from services.overlay_loops import overlay_loops
+from services.rate_limiter import RateLimitExceeded
+from services.tracing import span
+
+logger = get_logger("agents.guide")
+
+# Imagen prompts for the specialized videography effects
+VIDEO_EFFECT_PROMPTS = {
+    "no fx": None,
+    "steam_loop": "Dynamic looping steam and heat haze layers for advertising.",
+    "particle_slowmo": "Add slow-motion cinematic particles and dust motes.",
+    "lighting_transition": "Simulate dynamic lighting changes or golden hour transitions."
+}
+
+# Effects rendered as animated loops by `overlay_engine` instead of Imagen.
+LOCAL_VIDEO_EFFECTS = {name.strip().lower() for name in os.getenv("OVERLAY_LOCAL_EFFECTS", ",".join(EFFECTS)).split(",")
+                       if name.strip().lower() in EFFECTS}
 
 class GuideAgent(BaseAgent):
     def __init__(self):
         super().__init__()
-        self.model_id = 'imagen-3.0-generate-001' 
+        self.model_id = os.getenv("GUIDE_MODEL", 'imagen-3.0-generate-001')
 
     async def process(self, context: str) -> dict:
         return await self.process_video_effect(context, "steam_loop")
 
-    async def process_video_effect(self, context: str, prompt_or_type: str) -> dict:
+    async def process_video_effect(self, context: str, prompt_or_type: str, width: int = None,
+                                   height: int = None, fps: int = None) -> dict:
         """
-        Generates/Applies real-time video effects using AI.
+        Generates a video overlay: effects in `LOCAL_VIDEO_EFFECTS` are looping
+        animations from the overlay engine (sized by `width`, `height`, `fps`),
+        anything else is a still generated with Imagen.
         """
+        if prompt_or_type.lower() in LOCAL_VIDEO_EFFECTS:
+            return await self._render_loop(prompt_or_type, width, height, fps)
+
         if not self.client:
             return {"error": "Client not initialized"}
 
-        # Specialized effects for videography
-        video_effects = {
-            "no fx": None,
-            "steam_loop": "Dynamic looping steam and heat haze layers for advertising.",
-            "particle_slowmo": "Add slow-motion cinematic particles and dust motes.",
-            "lighting_transition": "Simulate dynamic lighting changes or golden hour transitions."
-        }
-
-        final_prompt = video_effects.get(prompt_or_type.lower(), prompt_or_type)
+        with span("prompt.build", effect_type=prompt_or_type):
+            final_prompt = VIDEO_EFFECT_PROMPTS.get(prompt_or_type.lower(), prompt_or_type)
 
         if not final_prompt:
              return {"effect_type": prompt_or_type, "veo_overlay_stream": "", "metadata": {}}
 
+        overlay_prompt = final_prompt + " isolated on transparent background, high quality overlay, cinematic."
+        config = {
+            'number_of_images': 1,
+            # Note: transparent background support via Imagen prompts is a technique.
+        }
+        result = await effect_cache.get_or_create(
+            self.model_id, overlay_prompt, config,
+            lambda: self._generate_overlay(prompt_or_type, overlay_prompt, config),
+            is_valid=lambda cached: effect_storage.exists(cached["veo_overlay_stream"])
+        )
+        if "error" not in result:
+            result["effect_type"] = prompt_or_type
+            effect_storage.touch(result["veo_overlay_stream"])
+        return result
+
+    async def _render_loop(self, prompt_or_type: str, width: int, height: int, fps: int) -> dict:
+        effect = prompt_or_type.lower()
+        try:
+            with span("overlay.loop", effect=effect) as loop_span:
+                result = await overlay_loops.get(effect, width, height, fps)
+                metadata = result["metadata"]
+                loop_span.set(width=metadata["width"], height=metadata["height"], frames=metadata["frames"])
+        except Exception as e:
+            logger.error("Overlay loop failed", extra={"effect_type": prompt_or_type, "error": str(e)})
+            return {"error": f"Could not render {effect}: {str(e)[:80]}"}
+        result["effect_type"] = prompt_or_type
+        effect_storage.touch(result["veo_overlay_stream"])
+        return result
+
+    async def _generate_overlay(self, prompt_or_type: str, overlay_prompt: str, config: dict) -> dict:
         try:
             # Using Imagen for high-quality overlays
-            response = self.client.models.generate_images(
-                model=self.model_id,
-                prompt=final_prompt + " isolated on transparent background, high quality overlay, cinematic.",
-                config={
-                    'number_of_images': 1,
-                    # Note: transparent background support via Imagen prompts is a technique.
-                }
-            )
+            logger.debug("Generating video overlay", extra={"effect_type": prompt_or_type, "prompt": overlay_prompt})
+            response = await self.generate_images(overlay_prompt, config=config)
 
             if response.generated_images:
-                generated_image = response.generated_images[0].image
-                filename = f"video_fx_{uuid.uuid4().hex}.png"
-                static_path = os.path.join("static", "effects", filename)
-                os.makedirs(os.path.dirname(static_path), exist_ok=True)
-                generated_image.save(static_path)
+                data = image_bytes_of(response.generated_images[0].image)
+                overlay_url = await effect_storage.save_data(data, "video_fx", "png")
+                with Image.open(io.BytesIO(data)) as image:
+                    width, height = image.size
 
                 return {
                     "effect_type": prompt_or_type,
-                    "veo_overlay_stream": f"/static/effects/{filename}",
-                    "metadata": {"frame_rate": 24, "quality": "4K"}
+                    "veo_overlay_stream": overlay_url,
+                    "metadata": {"renderer": "imagen", "width": width, "height": height, "frames": 1, "loop": False}
                 }
             else:
                 return {"error": "No image generated for video effect"}
 
+        except RateLimitExceeded:
+            raise
         except Exception as e:
-            print(f"Video Effect Error: {e}")
+            logger.error("Video effect error", extra={"effect_type": prompt_or_type, "error": str(e)})
             return {"error": str(e)}
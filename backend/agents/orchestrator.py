@@ -1,27 +1,67 @@
+import os
 from .analyst_agent import AnalystAgent
 from .editor_agent import EditorAgent
 from .guide_agent import GuideAgent
-from PIL import Image
+from .videographer_agent import VideographerAgent
+from .registry import client_registry
+from services.clip_sampler import sample_keyframes
+from services.cpu_pool import cpu_pool
+from services.job_queue import JobStatus, job_queue
+from services.tracing import span
 
 class AgentOrchestrator:
     def __init__(self):
-        self.analyst = AnalystAgent()
-        self.editor = EditorAgent()
-        self.guide = GuideAgent()
+        # Agents are process-wide singletons so every caller shares one client.
+        self.analyst = client_registry.get_agent(AnalystAgent)
+        self.editor = client_registry.get_agent(EditorAgent)
+        self.guide = client_registry.get_agent(GuideAgent)
+        self.videographer = client_registry.get_agent(VideographerAgent)
+        self.jobs = job_queue
 
-    async def analyze_photo(self, image: Image.Image, context: str) -> dict:
-        return await self.analyst.process(image, context)
+    async def analyze_photo(self, image_bytes: bytes, context: str) -> dict:
+        with span("agent.analyst"):
+            return await self.analyst.process(image_bytes, context)
+
+    async def analyze_burst(self, images: list, context: str) -> dict:
+        with span("agent.analyst", frames=len(images)):
+            return await self.analyst.analyze_burst(images, context)
+
+    async def analyze_clip(self, path: str, context: str) -> dict:
+        """Samples keyframes from the clip file at `path` in a worker process, then asks the videographer."""
+        with span("sample", path=os.path.basename(path)) as sample_span:
+            sample = await cpu_pool.run(sample_keyframes, path)
+            sample_span.set(frames=len(sample.frames), duration_s=sample.duration)
+        with span("agent.videographer"):
+            return await self.videographer.analyze_clip(sample, context)
 
     async def edit_photo(self, prompt: str, image_data: bytes) -> dict:
-        return await self.editor.process(prompt, image_data)
+        with span("agent.editor"):
+            return await self.editor.process(prompt, image_data)
 
     async def generate_guide(self, context: str) -> dict:
-        return await self.guide.process(context)
+        with span("agent.guide"):
+            return await self.guide.process(context)
+
+    async def apply_effect(self, image_bytes: bytes, prompt: str) -> dict:
+        """Applies a preset effect locally, or a custom one with Imagen"""
+        with span("agent.editor"):
+            return await self.editor.process_effect(image_bytes, prompt)
+
+    async def apply_video_effect(self, context: str, prompt: str, width: int = None, height: int = None,
+                                 fps: int = None) -> dict:
+        """Renders a looping overlay for a preset video effect, or a custom one with Imagen"""
+        with span("agent.guide"):
+            return await self.guide.process_video_effect(context, prompt, width, height, fps)
+
+    # Job producers: enqueue the generation and return immediately.
+
+    def submit_effect(self, image_bytes: bytes, prompt: str, priority: int = 5) -> JobStatus:
+        return self.jobs.submit("apply_effect", lambda: self.apply_effect(image_bytes, prompt), priority)
 
-    async def apply_effect(self, image: Image.Image, prompt: str) -> dict:
-        """New: Apply real-time Imagen 4 effects"""
-        return await self.editor.process_effect(image, prompt)
+    def submit_video_effect(self, context: str, prompt: str, priority: int = 5, width: int = None,
+                            height: int = None, fps: int = None) -> JobStatus:
+        return self.jobs.submit("video_effect", lambda: self.apply_video_effect(context, prompt, width, height, fps),
+                                priority)
 
-    async def apply_video_effect(self, context: str, prompt: str) -> dict:
-        """New: Apply real-time Veo 3 effects"""
-        return await self.guide.process_video_effect(context, prompt)
+    def submit_guide(self, context: str, priority: int = 5) -> JobStatus:
+        return self.jobs.submit("guide", lambda: self.generate_guide(context), priority)
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import threading
+import time
+try:
+    from google import genai
+except ImportError:
+    genai = None
+
+from services.logging_setup import get_logger
+
+logger = get_logger("agents.registry")
+
+# "fake" swaps in the local stand-in from bench/fake_genai.py for load tests.
+GENAI_BACKEND = os.getenv("GENAI_BACKEND", "google")
+
+
+def _key_label(api_key: str) -> str:
+    """Log-safe label for an API key."""
+    return f"{api_key[:4]}..."
+
+
+def _pool_stats(client) -> dict:
+    """Best-effort view of the httpx connection pools behind a genai.Client."""
+    api_client = getattr(client, "_api_client", None)
+    stats = {}
+    for label, attr in (("sync", "_httpx_client"), ("async", "_async_httpx_client")):
+        http_client = getattr(api_client, attr, None)
+        pool = getattr(getattr(http_client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is None:
+            continue
+        stats[label] = {
+            "connections": len(connections),
+            "idle": sum(1 for c in connections if c.is_idle()),
+            "available": sum(1 for c in connections if c.is_available()),
+        }
+    return stats
+
+
+class ClientRegistry:
+    """
+    Process-wide owner of long-lived model clients and agent instances.
+
+    One genai.Client (and therefore one set of HTTP connection pools) exists per
+    API key, and each agent class is instantiated once, so request handlers
+    never pay for client construction or fresh TLS handshakes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._agents = {}
+        self._models = {}
+        self.client_requests = 0
+        self.clients_created = 0
+        self.warmed = False
+
+    def get_client(self, api_key: str):
+        """Returns the shared client for `api_key`, creating it on first use."""
+        fake = GENAI_BACKEND == "fake"
+        if not api_key or not (genai or fake):
+            return None
+        with self._lock:
+            self.client_requests += 1
+            client = self._clients.get(api_key)
+            if client is None:
+                if fake:
+                    from bench.fake_genai import FakeClient
+                    client = FakeClient(api_key=api_key)
+                    logger.warning("Using fake genai backend", extra={"key": _key_label(api_key)})
+                else:
+                    client = genai.Client(api_key=api_key)
+                self._clients[api_key] = client
+                self.clients_created += 1
+            return client
+
+    def register_model(self, api_key: str, model_id: str):
+        """Records a (key, model) pair in use so warm-up and stats cover it."""
+        if not api_key or not model_id:
+            return
+        with self._lock:
+            self._models.setdefault((api_key, model_id), {"warm": False, "warmup_ms": None, "error": None})
+
+    def get_agent(self, agent_cls):
+        """Returns the shared instance of `agent_cls`."""
+        with self._lock:
+            agent = self._agents.get(agent_cls)
+        if agent is None:
+            agent = agent_cls()
+            with self._lock:
+                agent = self._agents.setdefault(agent_cls, agent)
+            if agent.client:
+                self.register_model(agent.api_key, agent.model_id)
+        return agent
+
+    async def warm_up(self, timeout: float = 10.0):
+        """
+        Opens connections ahead of the first real request with a cheap
+        metadata lookup per registered model.
+        """
+        from .base_agent import invoke_model
+
+        async def warm(api_key, model_id, state):
+            started = time.perf_counter()
+            try:
+                await invoke_model(self._clients[api_key], "get", timeout=timeout, model=model_id)
+                state["warm"] = True
+                state["error"] = None
+            except Exception as e:
+                state["error"] = str(e)[:120]
+                logger.warning("Warm-up failed", extra={"model": model_id, "error": str(e)})
+            state["warmup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+        with self._lock:
+            pending = [(k, m, s) for (k, m), s in self._models.items() if k in self._clients]
+        await asyncio.gather(*(warm(k, m, s) for k, m, s in pending))
+        self.warmed = True
+
+    def readiness(self) -> tuple:
+        """(ready, failing models): ready once warm-up has run and every registered model answered."""
+        with self._lock:
+            failing = [model for (key, model), state in self._models.items()
+                       if key in self._clients and not state["warm"]]
+        return self.warmed and not failing, failing
+
+    async def keep_warming(self, interval: float):
+        """Retries warm-up every `interval` seconds until every model is warm."""
+        while not self.readiness()[0]:
+            await asyncio.sleep(interval)
+            await self.warm_up()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "warmed": self.warmed,
+                "client_requests": self.client_requests,
+                "clients_created": self.clients_created,
+                "clients": [
+                    {"api_key": _key_label(key), "pools": _pool_stats(client)}
+                    for key, client in self._clients.items()
+                ],
+                "models": [
+                    {"api_key": _key_label(key), "model": model, **state}
+                    for (key, model), state in self._models.items()
+                ],
+                "agents": sorted(cls.__name__ for cls in self._agents),
+            }
+
+
+client_registry = ClientRegistry()
@@ -1,24 +1,124 @@
-from .base_agent import BaseAgent
+import os
+from .base_agent import BaseAgent, FallbackReply
+from services.rate_limiter import RateLimitExceeded
+from .generation_profiles import CHAT_PROFILE, CLIP_PROFILE, generation_stats, parse_structured
+from services.clip_sampler import ClipSample, local_segments
+from services.logging_setup import get_logger
 try:
     from google import genai
+    from google.genai import types
 except ImportError:
     genai = None
+    types = None
+
+logger = get_logger("agents.videographer")
 
 class VideographerAgent(BaseAgent):
+    CHAT_PERSONA = """You are an expert AI Cinematographer and Director (Gemini 3).
+The user is recording a video.
+
+Direct the user with professional filmmaking advice:
+- Camera movement (pan, tilt, dolly, truck)
+- Framing (wide, medium, close-up)
+- Lighting for video
+- Acting direction
+
+Commands to recognize:
+- "Action" or "Start" -> respond with action: "start_recording"
+- "Cut" or "Stop" -> respond with action: "stop_recording"
+
+Keep responses concise (1-2 sentences). Act like a professional director on set."""
+
     def __init__(self):
         super().__init__()
-        self.model_id = 'gemini-2.0-flash'
+        self.model_id = os.getenv("VIDEOGRAPHER_MODEL", 'gemini-2.0-flash')
+
+    async def process(self, prompt: str) -> str:
+        return await self.chat_guidance(prompt)
+
+    async def analyze_clip(self, sample: ClipSample, context: str) -> dict:
+        """
+        Per-segment direction for a recorded clip from its sampled keyframes,
+        sent to Gemini together in one request. Falls back to segments built
+        from local keyframe metrics.
+        """
+        result = {
+            "duration_s": sample.duration,
+            "frames_sampled": len(sample.frames),
+            "segments": local_segments(sample),
+            "summary": "Local keyframe review: check the direction for each segment.",
+            "source": "local",
+        }
+        if not self.client or not sample.frames:
+            return result
+
+        prompt = f"""
+        You are 'Gemini 3', an expert AI Cinematographer and Director.
+        The user recorded a {sample.duration:.1f}s clip for: '{context}'.
+        Below are keyframes from it in order, each labelled with its timestamp in seconds.
 
-    async def chat_guidance(self, prompt: str) -> str:
+        Split the clip into segments (start_s, end_s) where the shot changes, and for each give:
+        - framing (e.g. "Medium shot, subject centered")
+        - movement (camera movement between keyframes: steady, pan, tilt, dolly, shaky)
+        - lighting (short status)
+        - direction (one SHORT instruction for the next take, max 12 words)
+        Then a one-sentence summary of the clip.
+        """
+        contents = [prompt]
+        for frame in sample.frames:
+            contents.append(f"t={frame.timestamp:.2f}s")
+            contents.append(types.Part.from_bytes(data=frame.jpeg, mime_type="image/jpeg"))
+        try:
+            response = await self.generate_content(contents, config=CLIP_PROFILE.config(),
+                                                   timeout=CLIP_PROFILE.timeout)
+            parsed = parse_structured(CLIP_PROFILE, response)
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            logger.error("Gemini API error", extra={"context": context, "error": str(e)})
+            return result
+        if parsed is not None and parsed.segments:
+            result.update(segments=[s.model_dump() for s in parsed.segments], summary=parsed.summary,
+                          source="model")
+        return result
+
+    async def chat_guidance(self, prompt, system_instruction: str = None) -> str:
         """Generate conversational videography/cinematography guidance"""
         if not self.client:
             return "Action! I'm Gemini 3, your Video Director. What sort of scene are we shooting?"
         
         try:
-            response = self.client.models.generate_content(
-                model=self.model_id,
-                contents=prompt
+            response = await self.generate_content(
+                prompt,
+                config=CHAT_PROFILE.config(system_instruction),
+                timeout=CHAT_PROFILE.timeout,
             )
+            generation_stats.record_response(CHAT_PROFILE, response)
             return response.text.strip()
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            return FallbackReply(f"Cut! Director's busy: {str(e)[:40]}. Let's go again!")
+
+    async def chat_guidance_stream(self, prompt, system_instruction: str = None):
+        """Streams the same guidance as `chat_guidance`, chunk by chunk."""
+        if not self.client:
+            yield "Action! I'm Gemini 3, your Video Director. What sort of scene are we shooting?"
+            return
+
+        sent = False
+        try:
+            async for chunk in self.generate_content_stream(
+                prompt,
+                config=CHAT_PROFILE.config(system_instruction),
+                timeout=CHAT_PROFILE.timeout,
+            ):
+                sent = True
+                yield chunk
+        except RateLimitExceeded:
+            raise
         except Exception as e:
-            return f"Cut! Director's busy: {str(e)[:40]}. Let's go again!"
+            if sent:
+                # Part of the reply is already out; let the caller end the stream with an error.
+                raise
+            yield FallbackReply(f"Cut! Director's busy: {str(e)[:40]}. Let's go again!")
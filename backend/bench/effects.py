@@ -0,0 +1,117 @@
+"""
+Effect throughput: local compositor vs the Imagen path.
+
+Run from `backend/`:
+
+    # fake Imagen (FAKE_GENAI_IMAGE_MS sets its latency, default 4000 ms)
+    GENAI_BACKEND=fake GOOGLE_API_KEY=fake GEMINI_API_KEY=fake python -m bench.effects --requests 200
+
+    # a real photo, and real Imagen calls (spends quota)
+    python -m bench.effects --image photo.jpg --remote-requests 5
+
+Local requests cycle through the compositor presets on the photo. Remote
+requests send the same presets' Imagen prompts, made unique per request so
+the prompt cache never answers them. Outputs go to a temporary effect store.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from bench.load_test import make_frame, percentile
+
+
+async def run(label: str, call, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await call(i)
+                ok = "error" not in result
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append((time.perf_counter() - started) * 1000)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "path": label,
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+    }
+
+
+async def main_async(args, photo: bytes):
+    from agents.editor_agent import EFFECT_PROMPTS, EditorAgent
+    from agents.registry import client_registry
+    from services.cpu_pool import cpu_pool
+    from services.effect_compositor import PRESETS, composite_effect
+
+    presets = sorted(PRESETS)
+    stages = {}
+    for preset in presets:
+        composite_effect(preset, photo)  # the first call pays for LUT and mask setup
+        stages[preset] = composite_effect(preset, photo).timings_ms
+    print("compositor stages (ms, one process):")
+    for preset, timings in stages.items():
+        print(f"  {preset:<10}" + "  ".join(f"{stage} {ms:.1f}" for stage, ms in timings.items()))
+
+    editor = client_registry.get_agent(EditorAgent)
+    await cpu_pool.warm_up(("services.effect_compositor",))
+    results = [await run(
+        "local", lambda i: editor.process_effect(photo, presets[i % len(presets)]), args.requests, args.concurrency)]
+    if args.remote_requests:
+        results.append(await run(
+            "imagen", lambda i: editor.process_effect(photo, f"{EFFECT_PROMPTS[presets[i % len(presets)]]} #{i}"),
+            args.remote_requests, args.concurrency))
+    cpu_pool.shutdown()
+
+    print(f"{'path':<8}{'n':>6}{'errors':>8}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}")
+    for r in results:
+        print(f"{r['path']:<8}{r['requests']:>6}{r['errors']:>8}{r['throughput_rps']:>9}{r['p50_ms']:>10}{r['p95_ms']:>10}")
+    if len(results) == 2 and results[1]["throughput_rps"] and results[0]["p50_ms"]:
+        local, remote = results
+        print(f"local: {local['throughput_rps'] / remote['throughput_rps']:.0f}x the throughput, "
+              f"{remote['p50_ms'] / local['p50_ms']:.0f}x lower p50 latency "
+              f"(cpu_pool workers: {cpu_pool.workers})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare local effect compositing with Imagen generation.")
+    parser.add_argument("--image", help="JPEG/PNG to apply effects to (default: a synthetic 720p frame)")
+    parser.add_argument("--requests", type=int, default=100, help="Local compositor requests")
+    parser.add_argument("--remote-requests", type=int, default=20, help="Imagen requests (0 to skip)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            photo = f.read()
+    else:
+        photo = make_frame(0, 0, size=(1280, 720))
+    if os.getenv("GENAI_BACKEND") != "fake" and args.remote_requests:
+        print(f"Sending {args.remote_requests} real Imagen requests", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Keep benchmark output out of static/effects; set before the storage singleton is created.
+        os.environ["EFFECT_STORAGE_DIR"] = directory
+        os.environ["EFFECT_INDEX_PATH"] = os.path.join(directory, "index.sqlite3")
+        asyncio.run(main_async(args, photo))
+
+
+if __name__ == "__main__":
+    main()
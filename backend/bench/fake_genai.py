@@ -0,0 +1,227 @@
+"""
+Local stand-in for `google.genai.Client` used by the load tests.
+
+Select it with `GENAI_BACKEND=fake` (any non-empty API key will do). It serves
+`models.generate_content`, `models.generate_content_stream`,
+`models.generate_images` and `models.get`, sync and under `aio`, with
+log-normal latency, random upstream errors and injected 429s, so the API can
+be benchmarked without spending quota.
+"""
+import asyncio
+import io
+import json
+import os
+import random
+import threading
+import time
+import typing
+from types import SimpleNamespace
+
+from PIL import Image
+from pydantic import BaseModel
+
+try:
+    from google.genai import errors as genai_errors
+except ImportError:
+    genai_errors = None
+
+
+CHAT_REPLIES = [
+    "Move a little closer and keep the light on their face.",
+    "Great framing. Hold steady and take the shot!",
+    "Tilt the camera up slightly to clean up the horizon.",
+    "Switch to video mode and pan slowly from left to right.",
+    "The background is busy, try a plain wall behind the subject.",
+]
+
+
+class FakeAPIError(Exception):
+    """Used when google-genai's own error classes are unavailable."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeGenaiConfig:
+    """Latency and failure settings, read from `FAKE_GENAI_*` variables."""
+
+    def __init__(self):
+        self.content_ms = float(os.getenv("FAKE_GENAI_CONTENT_MS", "700"))
+        self.image_ms = float(os.getenv("FAKE_GENAI_IMAGE_MS", "4000"))
+        self.get_ms = float(os.getenv("FAKE_GENAI_GET_MS", "50"))
+        self.sigma = float(os.getenv("FAKE_GENAI_LATENCY_SIGMA", "0.5"))
+        self.error_rate = float(os.getenv("FAKE_GENAI_ERROR_RATE", "0.01"))
+        self.rate_limit_rate = float(os.getenv("FAKE_GENAI_429_RATE", "0.0"))
+        self.image_size = int(os.getenv("FAKE_GENAI_IMAGE_SIZE", "512"))
+        seed = os.getenv("FAKE_GENAI_SEED")
+        self.seed = int(seed) if seed else None
+
+
+def _sample_value(annotation, rng: random.Random, name: str = ""):
+    """A plausible value for one schema field."""
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        return _sample_value(args[0], rng, name) if args else None
+    if origin is list:
+        return [_sample_value(typing.get_args(annotation)[0], rng, name) for _ in range(rng.randint(1, 4))]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return _sample_model(annotation, rng)
+    if annotation is bool:
+        return rng.random() < 0.4
+    if annotation is int:
+        if "index" in name:
+            return rng.randint(0, 3)
+        return rng.randint(1, 10) if "score" in name else rng.randint(0, 100)
+    if annotation is float:
+        return round(rng.uniform(1.0, 2.0) if "zoom" in name else rng.uniform(-1.0, 1.0), 2)
+    if name == "lighting":
+        return rng.choice(["Poor", "Fair", "Good", "Excellent"])
+    return rng.choice(CHAT_REPLIES)
+
+
+def _sample_model(model, rng: random.Random) -> dict:
+    return {name: _sample_value(field.annotation, rng, name) for name, field in model.model_fields.items()}
+
+
+def _config_value(config, key):
+    if isinstance(config, dict):
+        return config.get(key)
+    return getattr(config, key, None)
+
+
+class _FakeModels:
+    def __init__(self, client):
+        self._client = client
+
+    def generate_content(self, model, contents, config=None, **kwargs):
+        time.sleep(self._client.latency("generate_content"))
+        return self._client.content_response(model, contents, config)
+
+    def generate_content_stream(self, model, contents, config=None, **kwargs):
+        response = self._client.content_response(model, contents, config)
+        chunks = self._client.chunk(response.text)
+        delay = self._client.latency("generate_content") / max(len(chunks), 1)
+        for chunk in chunks:
+            time.sleep(delay)
+            yield SimpleNamespace(text=chunk, usage_metadata=None)
+
+    def generate_images(self, model, prompt, config=None, **kwargs):
+        time.sleep(self._client.latency("generate_images"))
+        return self._client.image_response(model, prompt, config)
+
+    def get(self, model, **kwargs):
+        time.sleep(self._client.latency("get"))
+        return SimpleNamespace(name=model)
+
+
+class _FakeAsyncModels:
+    def __init__(self, client):
+        self._client = client
+
+    async def generate_content(self, model, contents, config=None, **kwargs):
+        await asyncio.sleep(self._client.latency("generate_content"))
+        return self._client.content_response(model, contents, config)
+
+    async def generate_content_stream(self, model, contents, config=None, **kwargs):
+        # Like the SDK: awaiting the call yields an async iterator of chunks.
+        response = self._client.content_response(model, contents, config)
+        chunks = self._client.chunk(response.text)
+        delay = self._client.latency("generate_content") / max(len(chunks), 1)
+
+        async def stream():
+            for chunk in chunks:
+                await asyncio.sleep(delay)
+                yield SimpleNamespace(text=chunk, usage_metadata=None)
+        return stream()
+
+    async def generate_images(self, model, prompt, config=None, **kwargs):
+        await asyncio.sleep(self._client.latency("generate_images"))
+        # PIL drawing is cheap but not free; keep it off the event loop like real decode work.
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._client.image_response, model, prompt, config)
+
+    async def get(self, model, **kwargs):
+        await asyncio.sleep(self._client.latency("get"))
+        return SimpleNamespace(name=model)
+
+
+class FakeClient:
+    """Drop-in for the parts of `genai.Client` the agents use."""
+
+    def __init__(self, api_key: str = None, config: FakeGenaiConfig = None):
+        self.api_key = api_key
+        self.config = config or FakeGenaiConfig()
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self.models = _FakeModels(self)
+        self.aio = SimpleNamespace(models=_FakeAsyncModels(self))
+        self.calls = {}
+
+    def latency(self, method: str) -> float:
+        """Draws a log-normal latency (seconds) and possibly raises an injected failure."""
+        median_ms = {
+            "generate_content": self.config.content_ms,
+            "generate_images": self.config.image_ms,
+        }.get(method, self.config.get_ms)
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            roll = self._rng.random()
+            delay = median_ms / 1000 * self._rng.lognormvariate(0, self.config.sigma)
+        if method != "get":
+            if roll < self.config.rate_limit_rate:
+                raise self._error(429, "RESOURCE_EXHAUSTED")
+            if roll < self.config.rate_limit_rate + self.config.error_rate:
+                raise self._error(500, "INTERNAL")
+        return delay
+
+    @staticmethod
+    def _error(code: int, status: str) -> Exception:
+        message = f"Injected by fake genai backend ({status})"
+        if genai_errors is not None:
+            body = {"error": {"code": code, "message": message, "status": status}}
+            cls = genai_errors.ClientError if code < 500 else genai_errors.ServerError
+            return cls(code, body)
+        return FakeAPIError(code, message)
+
+    def content_response(self, model, contents, config):
+        schema = _config_value(config, "response_schema")
+        with self._lock:
+            if isinstance(schema, type) and issubclass(schema, BaseModel):
+                text = json.dumps(_sample_model(schema, self._rng))
+            else:
+                text = self._rng.choice(CHAT_REPLIES)
+        prompt_tokens = 258 + len(str(contents)) // 4
+        output_tokens = len(text) // 4 + 1
+        return SimpleNamespace(
+            text=text,
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=output_tokens,
+                total_token_count=prompt_tokens + output_tokens,
+            ),
+        )
+
+    @staticmethod
+    def chunk(text: str, words: int = 3) -> list:
+        parts = text.split(" ")
+        return [" ".join(parts[i:i + words]) + (" " if i + words < len(parts) else "")
+                for i in range(0, len(parts), words)]
+
+    def image_response(self, model, prompt, config):
+        count = _config_value(config, "number_of_images") or 1
+        size = self.config.image_size
+        images = []
+        for _ in range(count):
+            with self._lock:
+                color = tuple(self._rng.randrange(256) for _ in range(3)) + (160,)
+            image = Image.new("RGBA", (size, size), color)
+            buffer = io.BytesIO()
+            image.save(buffer, format="PNG")
+            # Same shape as google-genai: generated_images[i].image.image_bytes
+            images.append(SimpleNamespace(
+                image=SimpleNamespace(image_bytes=buffer.getvalue(), mime_type="image/png"),
+                rai_filtered_reason=None,
+            ))
+        return SimpleNamespace(generated_images=images)
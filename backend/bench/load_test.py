@@ -0,0 +1,276 @@
+"""
+Load generator for the backend API.
+
+Simulates N camera sessions each polling `/analyze/scene` every few seconds,
+plus Poisson chat and effect traffic, and reports per-endpoint p50/p95/p99,
+throughput and the server's event-loop lag (from `/metrics`).
+
+Run from `backend/`:
+
+    # in-process against the fake model backend (no quota spent)
+    GENAI_BACKEND=fake GOOGLE_API_KEY=fake GEMINI_API_KEY=fake python -m bench.load_test --sessions 50
+
+    # against a running server
+    python -m bench.load_test --url http://localhost:8000 --sessions 20 --duration 120
+"""
+import argparse
+import asyncio
+import io
+import json
+import random
+import re
+import sys
+import time
+
+import httpx
+from PIL import Image, ImageDraw
+
+EFFECT_TYPES = ["steam", "fresh", "glow", "product"]
+CHAT_MESSAGES = [
+    "How should I frame this dish?",
+    "Is the lighting good enough?",
+    "Give me a tip for a product shot",
+    "Should I record a video instead?",
+]
+CONTEXTS = ["Professional Profile", "Food Photography", "Product Photography", "Wedding"]
+
+
+def make_frame(seed: int, step: int, size=(640, 480)) -> bytes:
+    """A synthetic camera frame; the subject drifts a little between polls."""
+    rng = random.Random(seed)
+    image = Image.new("RGB", size, tuple(rng.randrange(40, 200) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    x = size[0] // 3 + (step * 7) % 60
+    y = size[1] // 3 + rng.randrange(-20, 20)
+    draw.ellipse([x, y, x + 160, y + 160], fill=tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.statuses = {}
+
+    def record(self, endpoint: str, status, seconds: float):
+        self.samples.setdefault(endpoint, []).append(seconds)
+        counts = self.statuses.setdefault(endpoint, {})
+        counts[str(status)] = counts.get(str(status), 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        report = {}
+        for endpoint, values in sorted(self.samples.items()):
+            values = sorted(values)
+            report[endpoint] = {
+                "requests": len(values),
+                "throughput_rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+                "p99_ms": round(percentile(values, 99) * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1),
+                "statuses": self.statuses[endpoint],
+            }
+        return report
+
+
+async def timed(client: httpx.AsyncClient, recorder: Recorder, endpoint: str, method: str, url: str, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    recorder.record(endpoint, status, time.perf_counter() - started)
+
+
+async def timed_stream(client: httpx.AsyncClient, recorder: Recorder, url: str, body: dict):
+    """Records time to the first SSE token (as `<url> ttft`) and to the end of the stream."""
+    started = time.perf_counter()
+    first = None
+    try:
+        async with client.stream("POST", url, json=body) as response:
+            status = response.status_code
+            async for line in response.aiter_lines():
+                if first is None and line.startswith("event: token"):
+                    first = time.perf_counter() - started
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    if first is not None:
+        recorder.record(f"{url} ttft", status, first)
+    recorder.record(url, status, time.perf_counter() - started)
+
+
+async def camera_session(client, recorder, index: int, interval: float, deadline: float):
+    """One phone polling /analyze/scene, starting at a random phase."""
+    session_id = f"load-{index}"
+    context = CONTEXTS[index % len(CONTEXTS)]
+    await asyncio.sleep(random.uniform(0, interval))
+    step = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        frame = make_frame(index, step)
+        await timed(client, recorder, "/analyze/scene", "POST", "/analyze/scene",
+                    files={"file": ("frame.jpg", frame, "image/jpeg")},
+                    data={"context": context, "session_id": session_id})
+        step += 1
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+
+async def poisson_traffic(rate: float, deadline: float, send):
+    """Fires `send()` as a Poisson process of `rate` requests per second."""
+    if rate <= 0:
+        return
+    pending = set()
+    while True:
+        await asyncio.sleep(random.expovariate(rate))
+        if time.perf_counter() >= deadline:
+            break
+        task = asyncio.create_task(send())
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.wait(pending)
+
+
+def parse_loop_lag(metrics_text: str) -> dict:
+    """Cumulative event-loop lag histogram buckets, sum and count from /metrics."""
+    buckets = {}
+    for bound, value in re.findall(r'^event_loop_lag_seconds_bucket\{le="([^"]+)"\} (\S+)$', metrics_text, re.M):
+        buckets[bound] = float(value)
+    total = re.search(r"^event_loop_lag_seconds_sum (\S+)$", metrics_text, re.M)
+    count = re.search(r"^event_loop_lag_seconds_count (\S+)$", metrics_text, re.M)
+    return {
+        "buckets": buckets,
+        "sum": float(total.group(1)) if total else 0.0,
+        "count": float(count.group(1)) if count else 0.0,
+    }
+
+
+def loop_lag_delta(before: dict, after: dict) -> dict:
+    count = after["count"] - before["count"]
+    if count <= 0:
+        return {"samples": 0}
+    mean = (after["sum"] - before["sum"]) / count
+
+    def bucket_quantile(q):
+        # Upper bound of the first bucket holding the q-th sample.
+        for bound, cumulative in after["buckets"].items():
+            if cumulative - before["buckets"].get(bound, 0) >= q * count:
+                return bound
+        return "+Inf"
+
+    return {
+        "samples": int(count),
+        "mean_ms": round(mean * 1000, 2),
+        "p95_le_s": bucket_quantile(0.95),
+        "p99_le_s": bucket_quantile(0.99),
+    }
+
+
+async def run(args) -> dict:
+    if args.url:
+        transport = None
+        base_url = args.url
+        lifespan = None
+    else:
+        import main
+        # Unhandled app errors become 500s, as they would behind a real server.
+        transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+        base_url = "http://loadtest"
+        lifespan = main.app.router.lifespan_context(main.app)
+        await lifespan.__aenter__()
+
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.sessions + 50, max_keepalive_connections=args.sessions + 50)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, transport=transport, timeout=args.timeout,
+                                     limits=limits, verify=False) as client:
+            lag_before = parse_loop_lag((await client.get("/metrics")).text)
+            started = time.perf_counter()
+            deadline = started + args.duration
+            effect_frame = make_frame(0, 0)
+
+            async def chat():
+                body = {"message": random.choice(CHAT_MESSAGES), "context": random.choice(CONTEXTS)}
+                if args.stream_chat:
+                    await timed_stream(client, recorder, "/chat/stream", body)
+                else:
+                    await timed(client, recorder, "/chat", "POST", "/chat", json=body)
+
+            async def effect():
+                await timed(client, recorder, "/apply_effect", "POST", "/apply_effect",
+                            files={"file": ("frame.jpg", effect_frame, "image/jpeg")},
+                            data={"effect_type": random.choice(EFFECT_TYPES)})
+
+            await asyncio.gather(
+                *(camera_session(client, recorder, i, args.interval, deadline) for i in range(args.sessions)),
+                poisson_traffic(args.chat_rate, deadline, chat),
+                poisson_traffic(args.effect_rate, deadline, effect),
+            )
+            elapsed = time.perf_counter() - started
+            lag_after = parse_loop_lag((await client.get("/metrics")).text)
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    total = sum(len(v) for v in recorder.samples.values())
+    return {
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "elapsed_s": round(elapsed, 2),
+        "total_requests": total,
+        "throughput_rps": round(total / elapsed, 2),
+        "endpoints": recorder.summary(elapsed),
+        "event_loop_lag": loop_lag_delta(lag_before, lag_after),
+    }
+
+
+def print_report(report: dict):
+    print(f"{report['total_requests']} requests in {report['elapsed_s']}s "
+          f"({report['throughput_rps']} req/s)")
+    print(f"{'endpoint':<22}{'n':>7}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  statuses")
+    for endpoint, stats in report["endpoints"].items():
+        print(f"{endpoint:<22}{stats['requests']:>7}{stats['throughput_rps']:>8}"
+              f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}{stats['max_ms']:>9}  "
+              f"{stats['statuses']}")
+    print(f"event loop lag: {report['event_loop_lag']}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Load test the photography agent API.")
+    parser.add_argument("--url", help="Base URL of a running server; omit to run the app in-process")
+    parser.add_argument("--sessions", type=int, default=20, help="Simulated camera sessions")
+    parser.add_argument("--interval", type=float, default=3.0, help="Seconds between scene polls per session")
+    parser.add_argument("--chat-rate", type=float, default=0.5, help="Chat requests per second")
+    parser.add_argument("--effect-rate", type=float, default=0.1, help="Effect requests per second")
+    parser.add_argument("--stream-chat", action="store_true",
+                        help="Use /chat/stream and also report time to first token "
+                             "(use with --url; the in-process transport buffers whole responses)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Test length in seconds")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request client timeout")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--max-p95-ms", type=float,
+                        help="Exit non-zero if any endpoint's p95 exceeds this (for CI gates)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.max_p95_ms is not None:
+        slow = {e: s["p95_ms"] for e, s in report["endpoints"].items() if s["p95_ms"] > args.max_p95_ms}
+        if slow:
+            print(f"p95 over {args.max_p95_ms} ms: {slow}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
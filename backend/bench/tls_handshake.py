@@ -0,0 +1,199 @@
+"""
+TLS handshake benchmark: RSA-2048 vs ECDSA P-256 certificates, full vs resumed.
+
+Run from `backend/`:
+
+    # throwaway local servers with serve.py's TLS settings, one per key type
+    python -m bench.tls_handshake --iterations 300
+
+    # against a running server (whatever certificate it has)
+    python -m bench.tls_handshake --url https://192.168.1.118:8000
+
+Each connection is timed from the ClientHello to the end of the handshake; the
+client then reads the first bytes (HTTP/2 SETTINGS, or the answer to a HEAD
+request) so TLS 1.3 session tickets arrive before the next connection. The
+loopback numbers are CPU cost only; over Wi-Fi or cellular each round trip
+that resumption saves adds to them.
+Local runs also report the server's own CPU time per handshake, which is what
+limits how many new phone connections a worker can accept per second.
+"""
+import argparse
+import os
+import socket
+import ssl
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from bench.load_test import percentile
+from generate_certs import build_cert
+from serve import tune_tls
+
+KEY_TYPES = {"ecdsa": "ecdsa-p256", "rsa": "rsa-2048"}
+TLS_VERSIONS = {"1.2": ssl.TLSVersion.TLSv1_2, "1.3": ssl.TLSVersion.TLSv1_3}
+
+
+class HandshakeServer:
+    """Accepts connections one at a time, handshakes, sends one byte (as an h2 server sends SETTINGS) and closes."""
+
+    def __init__(self, context: ssl.SSLContext):
+        self.context = context
+        self.socket = socket.create_server(("127.0.0.1", 0))
+        self.port = self.socket.getsockname()[1]
+        self.cpu_ms = []
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                conn, _ = self.socket.accept()
+            except OSError:
+                return
+            try:
+                with self.context.wrap_socket(conn, server_side=True, do_handshake_on_connect=False) as tls:
+                    started = time.thread_time()
+                    tls.do_handshake()
+                    self.cpu_ms.append((time.thread_time() - started) * 1000)
+                    tls.sendall(b"x")
+            except (ssl.SSLError, OSError):
+                conn.close()
+
+    def close(self):
+        self.socket.close()
+
+
+def connect(host: str, port: int, context: ssl.SSLContext, server_hostname: str, session=None) -> tuple:
+    """(milliseconds, reused, session, alpn, cipher) for one connection."""
+    with socket.create_connection((host, port), timeout=10) as raw:
+        raw.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        started = time.perf_counter()
+        with context.wrap_socket(raw, server_hostname=server_hostname, session=session) as tls:
+            elapsed = (time.perf_counter() - started) * 1000
+            alpn = tls.selected_alpn_protocol()
+            if alpn != "h2":
+                tls.sendall(f"HEAD / HTTP/1.1\r\nHost: {server_hostname}\r\nConnection: close\r\n\r\n".encode())
+            tls.recv(1)
+            return elapsed, tls.session_reused, tls.session, alpn, tls.cipher()[0]
+
+
+def client_context(version: str, cafile: str = None) -> ssl.SSLContext:
+    context = ssl.create_default_context(cafile=cafile)
+    if cafile is None:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    context.minimum_version = context.maximum_version = TLS_VERSIONS[version]
+    context.set_alpn_protocols(["h2", "http/1.1"])
+    return context
+
+
+def measure(host: str, port: int, context: ssl.SSLContext, server_hostname: str, iterations: int,
+            resume: bool, server: HandshakeServer = None) -> dict:
+    session = None
+    if resume:
+        session = connect(host, port, context, server_hostname)[2]
+    for _ in range(3):
+        connect(host, port, context, server_hostname, session)
+    if server is not None:
+        server.cpu_ms.clear()
+    times, reused = [], 0
+    for _ in range(iterations):
+        elapsed, was_reused, new_session, alpn, cipher = connect(host, port, context, server_hostname, session)
+        times.append(elapsed)
+        reused += was_reused
+        if resume:
+            session = new_session
+    times.sort()
+    server_ms = sorted(server.cpu_ms) if server is not None else []
+    return {
+        "n": iterations,
+        "p50_ms": round(percentile(times, 50), 3),
+        "p95_ms": round(percentile(times, 95), 3),
+        "server_cpu_ms": round(percentile(server_ms, 50), 3) if server_ms else None,
+        "resumed": f"{reused}/{iterations}",
+        "alpn": alpn,
+        "cipher": cipher,
+    }
+
+
+def print_row(label: str, version: str, mode: str, result: dict):
+    server = f"{result['server_cpu_ms']:.3f}" if result["server_cpu_ms"] is not None else "-"
+    print(f"{label:<12}{version:>5}  {mode:<9}{result['n']:>6}{result['p50_ms']:>9.3f}{result['p95_ms']:>9.3f}"
+          f"{server:>11}{result['resumed']:>10}  {result['alpn'] or '-'}")
+
+
+def run_local(args) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for key_type, label in KEY_TYPES.items():
+            key_pem, cert_pem = build_cert("127.0.0.1", key_type)
+            certfile, keyfile = os.path.join(directory, f"{key_type}.crt"), os.path.join(directory, f"{key_type}.key")
+            with open(certfile, "wb") as f:
+                f.write(cert_pem)
+            with open(keyfile, "wb") as f:
+                f.write(key_pem)
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            context.set_alpn_protocols(["h2", "http/1.1"])
+            server = HandshakeServer(tune_tls(context))
+            try:
+                for version in args.tls:
+                    client = client_context(version, cafile=certfile)
+                    for mode in ("full", "resumed"):
+                        result = measure("127.0.0.1", server.port, client, "localhost", args.iterations,
+                                         mode == "resumed", server)
+                        results[(label, version, mode)] = result
+                        print_row(label, version, mode, result)
+            finally:
+                server.close()
+    return results
+
+
+def run_remote(args) -> dict:
+    parts = urlsplit(args.url if "://" in args.url else "https://" + args.url)
+    host, port = parts.hostname, parts.port or 443
+    results = {}
+    for version in args.tls:
+        client = client_context(version, cafile=args.cafile)
+        for mode in ("full", "resumed"):
+            try:
+                result = measure(host, port, client, host, args.iterations, mode == "resumed")
+            except (ssl.SSLError, OSError) as e:
+                print(f"TLS {version} {mode}: {e}", file=sys.stderr)
+                continue
+            results[(host, version, mode)] = result
+            print_row(host, version, mode, result)
+    return results
+
+
+def summarize(results: dict):
+    for version in sorted({v for _, v, _ in results}):
+        rsa = results.get(("rsa-2048", version, "full"))
+        ecdsa = results.get(("ecdsa-p256", version, "full"))
+        if rsa and ecdsa and ecdsa["server_cpu_ms"]:
+            print(f"TLS {version}: full ECDSA handshake is {rsa['server_cpu_ms'] / ecdsa['server_cpu_ms']:.1f}x "
+                  f"cheaper for the server and {rsa['p50_ms'] / ecdsa['p50_ms']:.1f}x faster end to end")
+        for label in sorted({k for k, v, _ in results if v == version}):
+            full, resumed = results.get((label, version, "full")), results.get((label, version, "resumed"))
+            if full and resumed and resumed["p50_ms"]:
+                print(f"TLS {version} {label}: resumption is {full['p50_ms'] / resumed['p50_ms']:.1f}x faster "
+                      f"({resumed['resumed']} resumed)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare TLS handshake cost by key type and resumption.")
+    parser.add_argument("--url", help="https://host:port of a running server; omit to benchmark local servers")
+    parser.add_argument("--cafile", help="Verify the remote certificate against this file (default: no verification)")
+    parser.add_argument("--iterations", type=int, default=200, help="Connections per row")
+    parser.add_argument("--tls", nargs="+", choices=sorted(TLS_VERSIONS), default=["1.3", "1.2"])
+    args = parser.parse_args()
+
+    print(f"{'key':<12}{'tls':>5}  {'mode':<9}{'n':>6}{'p50 ms':>9}{'p95 ms':>9}{'server ms':>11}{'resumed':>10}  alpn")
+    results = run_remote(args) if args.url else run_local(args)
+    summarize(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,38 @@
+"""
+Self-signed certificate for serving the backend over HTTPS on the LAN.
+
+    python generate_certs.py --ip 192.168.1.118
+
+Keys are ECDSA P-256 by default: the server's handshake signature is far
+cheaper than with RSA-2048, and the certificate is smaller on the wire. Pass
+`--rsa` for an RSA-2048 key (e.g. to compare with `bench/tls_handshake.py`).
+"""
+import argparse
 import ipaddress
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from cryptography import x509
 from cryptography.x509.oid import NameOID
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
 from cryptography.hazmat.primitives import serialization
 
-def generate_self_signed_cert(ip_address="192.168.1.118"):
-    key = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=2048,
-    )
-    
+
+def generate_key(key_type: str = "ecdsa"):
+    if key_type == "rsa":
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return ec.generate_private_key(ec.SECP256R1())
+
+
+def build_cert(ip_address: str = "192.168.1.118", key_type: str = "ecdsa", days: int = 365) -> tuple:
+    """(key_pem, cert_pem) for a certificate valid for `ip_address`, 127.0.0.1 and localhost."""
+    key = generate_key(key_type)
     subject = issuer = x509.Name([
         x509.NameAttribute(NameOID.COMMON_NAME, ip_address),
     ])
-    
+    # In the order given: IPv4 and IPv6 addresses don't compare, so they can't be sorted.
+    addresses = dict.fromkeys([ipaddress.ip_address(ip_address), ipaddress.ip_address("127.0.0.1")])
+    now = datetime.now(timezone.utc)
+
     cert = x509.CertificateBuilder().subject_name(
         subject
     ).issuer_name(
@@ -25,27 +42,40 @@ def generate_self_signed_cert(ip_address="192.168.1.118"):
     ).serial_number(
         x509.random_serial_number()
     ).not_valid_before(
-        datetime.utcnow()
+        now
     ).not_valid_after(
-        datetime.utcnow() + timedelta(days=365)
+        now + timedelta(days=days)
     ).add_extension(
-        x509.SubjectAlternativeName([x509.IPAddress(ipaddress.IPv4Address(ip_address))]),
+        x509.SubjectAlternativeName([x509.DNSName("localhost")] + [x509.IPAddress(a) for a in addresses]),
         critical=False,
     ).sign(key, hashes.SHA256())
-    
+
+    key_pem = key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+    return key_pem, cert.public_bytes(serialization.Encoding.PEM)
+
+
+def generate_self_signed_cert(ip_address="192.168.1.118", key_type="ecdsa", days=365):
+    key_pem, cert_pem = build_cert(ip_address, key_type, days)
+
     # Write key
     with open("key.pem", "wb") as f:
-        f.write(key.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.TraditionalOpenSSL,
-            encryption_algorithm=serialization.NoEncryption(),
-        ))
-        
+        f.write(key_pem)
+
     # Write cert
     with open("cert.pem", "wb") as f:
-        f.write(cert.public_bytes(serialization.Encoding.PEM))
-        
-    print(f"Generated cert.pem and key.pem for {ip_address}")
+        f.write(cert_pem)
+
+    print(f"Generated {'RSA-2048' if key_type == 'rsa' else 'ECDSA P-256'} cert.pem and key.pem for {ip_address}")
+
 
 if __name__ == "__main__":
-    generate_self_signed_cert()
+    parser = argparse.ArgumentParser(description="Generate a self-signed certificate for the backend.")
+    parser.add_argument("--ip", default="192.168.1.118", help="LAN address the phone connects to")
+    parser.add_argument("--rsa", action="store_true", help="RSA-2048 instead of ECDSA P-256")
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+    generate_self_signed_cert(args.ip, "rsa" if args.rsa else "ecdsa", args.days)
@@ -1,14 +1,90 @@
-import io
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
 from typing import List, Optional
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 import os
-from pydantic import BaseModel, Field
-from PIL import Image
+from pydantic import BaseModel
 from agents.orchestrator import AgentOrchestrator
+from schemas import AnalysisResponse, BurstAnalysisResponse, ClipAnalysisResponse, SceneAnalysisResponse
+from agents.base_agent import ClientDisconnected, FallbackReply, cancel_on_disconnect, chat_contents
+from agents.registry import client_registry
+from agents.generation_profiles import generation_stats
+from services.frame_preprocessor import frame_preprocessor
+from services.effect_cache import effect_cache
+from services.effect_storage import effect_storage
+from services.overlay_engine import OVERLAY_MAX_EDGE
+from services.overlay_loops import overlay_loops
+from services.static_files import ImmutableStaticFiles
+from services.burst import BURST_MAX_FRAMES
+from services.cpu_pool import cpu_pool
+from services.clip_uploads import UploadError, clip_uploads
+from services import clip_sampler
+from services.rate_limiter import RateLimitExceeded, rate_limiter, retry_after_header
+from services.metrics import MetricsMiddleware, monitor_event_loop, registry as metrics_registry
+from services.logging_setup import configure_logging, get_logger, shutdown_logging
+from services.tracing import TracingMiddleware, trace_store
+from services.chat_sessions import chat_sessions
+from services.chat_actions import MarkerStripper, StreamingActionDetector, detect_action, strip_marker
+
+configure_logging()
+logger = get_logger("api")
 
-app = FastAPI(title="Gemini 3 Photography Agent API (Multi-Agent)")
+# Initialize Orchestrator
+orchestrator = AgentOrchestrator()
+
+# Seconds between warm-up retries while a model is unreachable; /ready stays 503 until all are warm.
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "15"))
+# Seconds queued and running generation jobs get to finish on shutdown.
+JOB_DRAIN_TIMEOUT = float(os.getenv("JOB_DRAIN_TIMEOUT", "30"))
+
+async def precompute_overlay_loops(cpu_pool_ready: asyncio.Task):
+    await cpu_pool_ready
+    await overlay_loops.precompute()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts the background services, and on shutdown stops them in dependency
+    order: queued jobs drain while the CPU pool, effect store and logging
+    still work, and logs are flushed last.
+    """
+    app.state.draining = False
+    # Pay TLS/connection setup before the first user request does.
+    await client_registry.warm_up()
+    warm_retry = asyncio.create_task(client_registry.keep_warming(WARMUP_RETRY_INTERVAL))
+    loop_monitor = asyncio.create_task(monitor_event_loop())
+    effect_storage.start_janitor()
+    clip_uploads.start_janitor()
+    # In the background: spawning workers and importing NumPy takes a moment.
+    cpu_pool_warm_up = asyncio.create_task(cpu_pool.warm_up(
+        ("services.burst", "services.clip_sampler", "services.effect_compositor", "services.overlay_engine")))
+    overlay_precompute = asyncio.create_task(precompute_overlay_loops(cpu_pool_warm_up))
+    orchestrator.jobs.start()
+    try:
+        yield
+    finally:
+        app.state.draining = True
+        await orchestrator.jobs.stop(drain_timeout=JOB_DRAIN_TIMEOUT)
+        for task in (overlay_precompute, cpu_pool_warm_up, warm_retry, loop_monitor):
+            task.cancel()
+        cpu_pool.shutdown()
+        effect_storage.stop_janitor()
+        clip_uploads.stop_janitor()
+        shutdown_logging()
+
+app = FastAPI(title="Gemini 3 Photography Agent API (Multi-Agent)", lifespan=lifespan)
+app.state.draining = False
+
+# Per-route latency, upload size and in-flight gauges for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Per-request trace id (X-Trace-Id) and spans, exported at /traces
+app.add_middleware(TracingMiddleware)
 
 # CORS Configuration
 app.add_middleware(
@@ -17,28 +93,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id"],
 )
 
-# Initialize Orchestrator
-orchestrator = AgentOrchestrator()
-
 # Create static directory for effects
 static_dir = os.path.join(os.path.dirname(__file__), "static")
 os.makedirs(os.path.join(static_dir, "effects"), exist_ok=True)
+os.makedirs(effect_storage.root, exist_ok=True)
+# Effect files are content-addressed, so they are served as immutable (strong ETag, cached for a year).
+app.mount("/static/effects", ImmutableStaticFiles(directory=effect_storage.root), name="effects")
 app.mount("/static", StaticFiles(directory=static_dir), name="static")
 
-class TechnicalAdjustments(BaseModel):
-    zoom_level: float = 1.0
-    exposure_offset: float = 0.0
-    torch_on: bool = False
-
-class AnalysisResponse(BaseModel):
-    composition_score: int
-    suggestion: str
-    lighting: str
-    is_ready_to_shoot: bool
-    technical_adjustments: TechnicalAdjustments = Field(default_factory=TechnicalAdjustments)
-
 class EditResponse(BaseModel):
     edited_image_url: str
 
@@ -49,31 +114,210 @@ class EffectResponse(BaseModel):
     effect_type: str
     status: str
     overlay_url: str
+    # Every stored variant ("webp", "preview.webp", "preview.png") for clients that pick their own.
+    variants: dict = {}
 
 class VideoEffectResponse(BaseModel):
     effect_type: str
     veo_overlay_stream: str
     metadata: dict
+    variants: dict = {}
+
+# Keys of effect results that hold an overlay URL.
+OVERLAY_KEYS = ("overlay_url", "veo_overlay_stream")
+
+def negotiate_overlay(result: dict, request: Request, screen_width: Optional[int] = None) -> dict:
+    """
+    Copy of an effect result whose overlay URL points at the variant suited
+    to the client: WebP if `Accept` allows it, the preview for small slots.
+    The slot width comes from `screen_width` or the `Sec-CH-Width`/`Width`
+    client hint, in device pixels.
+    """
+    key = next((k for k in OVERLAY_KEYS if result.get(k)), None)
+    if key is None:
+        return result
+    if screen_width is None:
+        hint = request.headers.get("sec-ch-width") or request.headers.get("width")
+        screen_width = int(hint) if hint and hint.isdigit() else None
+    url = result[key]
+    return {
+        **result,
+        key: effect_storage.pick_variant(url, request.headers.get("accept", ""), screen_width),
+        "variants": effect_storage.variant_urls(url),
+    }
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_handler(request: Request, exc: ClientDisconnected):
+    # Nobody is listening any more; 499 mirrors the nginx convention for logs.
+    return JSONResponse(status_code=499, content={"detail": "Client disconnected"})
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "model": exc.model_id},
+        headers={"Retry-After": retry_after_header(exc)},
+    )
 
 @app.get("/")
 async def root():
     return {"message": "Gemini 3 Multi-Agent System is running"}
 
+@app.get("/health")
+async def health():
+    """Liveness: the worker's event loop is answering."""
+    return {"status": "ok", "pid": os.getpid()}
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once every model client is warm, 503 before that and while draining."""
+    warm, failing = client_registry.readiness()
+    if app.state.draining or not warm:
+        status = "draining" if app.state.draining else "warming"
+        return JSONResponse(status_code=503, content={"status": status, "failing_models": failing})
+    return {"status": "ready", "pid": os.getpid()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of request, model-call, image and event-loop metrics."""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/traces")
+async def list_traces(limit: int = 100, min_duration_ms: float = 0, trace_id: Optional[str] = None):
+    """Most recent finished traces, newest first, as JSON for offline analysis."""
+    return trace_store.export(limit=limit, min_duration_ms=min_duration_ms, trace_id=trace_id)
+
+@app.get("/stats/clients")
+async def client_stats():
+    return client_registry.stats()
+
+@app.get("/stats/generation")
+async def generation_profile_stats():
+    return generation_stats.stats()
+
+@app.get("/stats/cpu_pool")
+async def cpu_pool_stats():
+    return cpu_pool.stats()
+
+@app.get("/stats/clips")
+def clip_upload_stats():
+    return clip_uploads.stats()
+
+@app.get("/stats/chat_sessions")
+async def chat_session_stats():
+    return chat_sessions.stats()
+
+@app.get("/stats/rate_limits")
+async def rate_limit_stats():
+    return rate_limiter.stats()
+
+@app.get("/stats/frames")
+async def frame_stats():
+    return frame_preprocessor.stats()
+
+@app.get("/stats/effect_cache")
+async def effect_cache_stats():
+    return effect_cache.stats()
+
+@app.get("/stats/overlay_loops")
+async def overlay_loop_stats():
+    return overlay_loops.stats()
+
+@app.get("/stats/effect_storage")
+def effect_storage_stats():
+    return effect_storage.stats()
+
+@app.get("/effects")
+def list_effects(offset: int = 0, limit: int = 50, kind: Optional[str] = None):
+    """Paginated listing of stored effects, newest first."""
+    return effect_storage.list(offset=max(offset, 0), limit=min(max(limit, 1), 200), kind=kind)
+
 @app.post("/analyze", response_model=AnalysisResponse)
 async def analyze_image(
+    request: Request,
     context: str = Form(...),
     file: UploadFile = File(...)
 ):
     try:
         contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
-        
-        result = await orchestrator.analyze_photo(image, context)
+        # Decoding and downscaling happen off the event loop inside the agent.
+        result = await cancel_on_disconnect(request, orchestrator.analyze_photo(contents, context))
         return AnalysisResponse(**result)
 
+    except (ClientDisconnected, RateLimitExceeded):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/analyze/burst", response_model=BurstAnalysisResponse)
+async def analyze_burst(
+    request: Request,
+    context: str = Form(...),
+    files: List[UploadFile] = File(...)
+):
+    """Scores a burst of captures in one model call and returns the index of the best frame."""
+    if len(files) > BURST_MAX_FRAMES:
+        raise HTTPException(status_code=400, detail=f"At most {BURST_MAX_FRAMES} frames per burst")
+    try:
+        images = [await file.read() for file in files]
+        result = await cancel_on_disconnect(request, orchestrator.analyze_burst(images, context))
+        return BurstAnalysisResponse(**result)
+
+    except (ClientDisconnected, RateLimitExceeded):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Recorded clips: resumable uploads streamed to disk, then keyframe analysis
+class ClipUploadRequest(BaseModel):
+    size: int
+    filename: str = ""
+    content_type: str = ""
+
+@app.exception_handler(UploadError)
+async def upload_error_handler(request: Request, exc: UploadError):
+    headers = {"Upload-Offset": str(exc.offset)} if exc.offset is not None else None
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc), "offset": exc.offset},
+                        headers=headers)
+
+@app.post("/clips", status_code=201)
+def create_clip_upload(body: ClipUploadRequest):
+    """Starts a resumable upload; send the bytes with PUT /clips/{upload_id}?offset=..."""
+    return clip_uploads.create(body.size, body.filename, body.content_type)
+
+@app.get("/clips/{upload_id}")
+def clip_upload_status(upload_id: str):
+    """Current offset of an upload, to resume from after a dropped connection."""
+    return clip_uploads.status(upload_id)
+
+@app.put("/clips/{upload_id}")
+async def upload_clip_part(upload_id: str, offset: int, request: Request):
+    """Appends the raw request body at `offset` (must equal the current offset)."""
+    return await clip_uploads.append(upload_id, offset, request.stream())
+
+async def _analyze_clip(request: Request, upload_id: str, context: str) -> ClipAnalysisResponse:
+    if clip_sampler.av is None:
+        raise HTTPException(status_code=503, detail="Clip analysis is unavailable: PyAV is not installed")
+    path = clip_uploads.path(upload_id)
+    try:
+        result = await cancel_on_disconnect(request, orchestrator.analyze_clip(path, context))
+        return ClipAnalysisResponse(upload_id=upload_id, **result)
+    except (ClientDisconnected, RateLimitExceeded):
+        raise
+    except Exception as e:
+        logger.error("Clip analysis failed", extra={"upload_id": upload_id, "error": str(e)})
+        raise HTTPException(status_code=422, detail=f"Could not analyze clip: {str(e)[:80]}")
+
+@app.post("/clips/{upload_id}/analyze", response_model=ClipAnalysisResponse)
+async def analyze_uploaded_clip(request: Request, upload_id: str, context: str = Form("Video")):
+    return await _analyze_clip(request, upload_id, context)
+
+@app.post("/analyze/clip", response_model=ClipAnalysisResponse)
+async def analyze_clip(request: Request, context: str = Form("Video"), file: UploadFile = File(...)):
+    """One-shot variant for short clips: the multipart file is copied to disk in chunks, then analyzed."""
+    upload_id = await clip_uploads.save_upload_file(file)
+    return await _analyze_clip(request, upload_id, context)
+
 @app.post("/edit", response_model=EditResponse)
 async def edit_image(
     prompt: str = Form(...),
@@ -88,37 +332,51 @@ async def edit_image(
 
 @app.post("/apply_effect", response_model=EffectResponse)
 async def apply_effect(
+    request: Request,
     effect_type: str = Form(...),
     custom_prompt: Optional[str] = Form(None),
+    screen_width: Optional[int] = Form(None),
     file: UploadFile = File(...)
 ):
-    print(f"DEBUG: Received apply_effect request. Type: {effect_type}, Custom: {custom_prompt}")
+    logger.debug("apply_effect request", extra={"effect_type": effect_type, "custom_prompt": custom_prompt})
     try:
         contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
         prompt = custom_prompt if custom_prompt else effect_type
-        print(f"DEBUG: Processing effect with prompt: {prompt}")
-        result = await orchestrator.apply_effect(image, prompt)
-        print(f"DEBUG: Effect result result: {result}")
-        return EffectResponse(**result)
+        result = await cancel_on_disconnect(request, orchestrator.apply_effect(contents, prompt))
+        logger.debug("apply_effect result", extra={"result": result})
+        if "error" in result:
+            raise HTTPException(status_code=500, detail=result["error"])
+        return EffectResponse(**negotiate_overlay(result, request, screen_width))
+    except (ClientDisconnected, RateLimitExceeded, HTTPException):
+        raise
     except Exception as e:
-        print(f"DEBUG: Error in apply_effect: {e}")
+        logger.error("Error in apply_effect", extra={"error": str(e)})
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/video_effect", response_model=VideoEffectResponse)
 async def apply_video_effect(
+    request: Request,
     effect_type: str = Form(...),
     custom_prompt: Optional[str] = Form(None),
-    context: str = Form("advertising")
+    context: str = Form("advertising"),
+    screen_width: Optional[int] = Form(None),
+    overlay_width: Optional[int] = Form(None, ge=16, le=OVERLAY_MAX_EDGE),
+    overlay_height: Optional[int] = Form(None, ge=16, le=OVERLAY_MAX_EDGE),
+    fps: Optional[int] = Form(None, ge=5, le=30)
 ):
-    print(f"DEBUG: Received video_effect request. Type: {effect_type}, Custom: {custom_prompt}")
+    logger.debug("video_effect request", extra={"effect_type": effect_type, "custom_prompt": custom_prompt})
     try:
         prompt = custom_prompt if custom_prompt else effect_type
-        result = await orchestrator.apply_video_effect(context, prompt)
-        print(f"DEBUG: Video effect result: {result}")
-        return VideoEffectResponse(**result)
+        result = await cancel_on_disconnect(
+            request, orchestrator.apply_video_effect(context, prompt, overlay_width, overlay_height, fps))
+        logger.debug("video_effect result", extra={"result": result})
+        if "error" in result:
+            raise HTTPException(status_code=500, detail=result["error"])
+        return VideoEffectResponse(**negotiate_overlay(result, request, screen_width))
+    except (ClientDisconnected, RateLimitExceeded, HTTPException):
+        raise
     except Exception as e:
-        print(f"DEBUG: Error in video_effect: {e}")
+        logger.error("Error in video_effect", extra={"error": str(e)})
         raise HTTPException(status_code=500, detail=str(e))
 
 class ChatMessage(BaseModel):
@@ -127,155 +385,358 @@ class ChatMessage(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
+    # Only needed for the first turn of a session; later turns send session_id.
     history: List[ChatMessage] = []
     context: str = "Professional Profile"
+    session_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     text: str
-    action: str = None
+    action: Optional[str] = None
+    session_id: Optional[str] = None
+
+def start_chat_turn(request: ChatRequest):
+    """
+    Picks the agent for the chat context and loads the caller's session.
+
+    Returns (agent, session, system_instruction, contents). The persona is
+    sent as a fixed system instruction and the session's stored turns as
+    multi-turn contents, so clients only send their new message.
+    """
+    # Determine functionality based on context/mode (simple heuristic for now)
+    is_video_mode = "video" in request.context.lower() or "cinematographer" in request.context.lower()
+    agent = orchestrator.videographer if is_video_mode else orchestrator.analyst
+
+    # A client-supplied history only seeds sessions the server doesn't know (yet).
+    seed = [("user" if msg.role == "user" else "model", msg.content) for msg in request.history]
+    session = chat_sessions.get_or_create(request.session_id, seed)
+    system_instruction = agent.chat_system_instruction(request.context)
+    return agent, session, system_instruction, chat_contents(session.history(), request.message)
+
+def finish_chat_turn(session, message: str, reply: str, fallback: bool = False):
+    # A failed model call's canned reply would be sent back as history on every later turn.
+    if fallback:
+        return
+    chat_sessions.append(session, "user", message)
+    chat_sessions.append(session, "model", reply)
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request):
     """Handle conversational AI photography coaching"""
     try:
-        # Build conversation context
-        conversation = "\n".join([
-            f"{'User' if msg.role == 'user' else 'AI'}: {msg.content}"
-            for msg in request.history[-5:]  # Last 5 messages for context
-        ])
-        
-        # Determine functionality based on context/mode (simple heuristic for now)
-        is_video_mode = "video" in request.context.lower() or "cinematographer" in request.context.lower()
-
-        if is_video_mode:
-            from agents.videographer_agent import VideographerAgent
-            agent = VideographerAgent()
-            
-            system_prompt = f"""You are an expert AI Cinematographer and Director (Gemini 3).
-The user is recording a video in the context of: {request.context}.
-
-Direct the user with professional filmmaking advice:
-- Camera movement (pan, tilt, dolly, truck)
-- Framing (wide, medium, close-up)
-- Lighting for video
-- Acting direction
-
-Commands to recognize:
-- "Action" or "Start" -> respond with action: "start_recording"
-- "Cut" or "Stop" -> respond with action: "stop_recording"
-
-Keep responses concise (1-2 sentences). Act like a professional director on set.
-
-Previous conversation:
-{conversation}
-
-User: {request.message}
-Director AI:"""
-
-        else:
-            # Default to Photographer
-            from agents.analyst_agent import AnalystAgent
-            agent = AnalystAgent()
-            
-            system_prompt = f"""You are an expert AI photography coach helping users take better photos in the context of: {request.context}.
-
-Be conversational, encouraging, and helpful. Give specific actionable advice about:
-- Lighting, composition, posing
-- When to take a photo (respond with action: "capture_photo")
-- What adjustments to make
-
-Keep responses concise (2-3 sentences). When you think it's the right moment to capture a photo, include the word CAPTURE in your response.
+        agent, session, system_instruction, contents = start_chat_turn(request)
 
-Previous conversation:
-{conversation}
-
-User: {request.message}
-AI:"""
-        
         # Generate conversational response
-        response_text = await agent.chat_guidance(system_prompt)
+        response_text = await cancel_on_disconnect(
+            http_request, agent.chat_guidance(contents, system_instruction=system_instruction))
         
+        fallback = isinstance(response_text, FallbackReply)
+
         # Detect actions
-        action = None
-        if "start_recording" in response_text.lower() or "action" in response_text.lower():
-             action = "start_recording"
-        elif "stop_recording" in response_text.lower() or "cut" in response_text.lower():
-             action = "stop_recording"
-        elif "capture" in response_text.lower() or "take a photo" in response_text.lower():
-             action = "capture_photo"
+        action = detect_action(response_text)
         
         # Clean up response text if needed (removing keywords might be excessive if they are part of natural speech, keeping it simple)
-        response_text = response_text.replace("CAPTURE", "").strip()
+        response_text = strip_marker(response_text).strip()
+        finish_chat_turn(session, request.message, response_text, fallback)
         
-        return ChatResponse(text=response_text, action=action)
+        return ChatResponse(text=response_text, action=action, session_id=session.session_id)
         
+    except (ClientDisconnected, RateLimitExceeded):
+        raise
     except Exception as e:
-        return ChatResponse(text="I'm having trouble right now. Could you rephrase that?", action=None)
+        return ChatResponse(text="I'm having trouble right now. Could you rephrase that?", action=None,
+                            session_id=request.session_id)
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Streaming /chat as server-sent events, so speech can start on the first words.
+
+    Events: `token` {"text"} per chunk, `action` {"action"} as soon as an
+    action keyword appears, then `done` with the full ChatResponse (or
+    `error` {"detail"} if the model fails mid-reply). A rate-limited model
+    answers 429 before the stream starts.
+    """
+    agent, session, system_instruction, contents = start_chat_turn(request)
+    chunks = agent.chat_guidance_stream(contents, system_instruction=system_instruction)
+    # Wait for the first chunk before sending headers so quota errors are real 429s.
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = ""
+
+    async def events():
+        detector = StreamingActionDetector()
+        stripper = MarkerStripper()
+        parts = []
+        fallback = False
+
+        def emit(chunk):
+            nonlocal fallback
+            fallback = fallback or isinstance(chunk, FallbackReply)
+            out = []
+            action = detector.feed(chunk)
+            text = stripper.feed(chunk)
+            if text:
+                parts.append(text)
+                out.append(_sse("token", {"text": text}))
+            if action:
+                out.append(_sse("action", {"action": action}))
+            return out
+
+        try:
+            for event in emit(first):
+                yield event
+            async for chunk in chunks:
+                for event in emit(chunk):
+                    yield event
+        except Exception as e:
+            logger.error("Error in chat stream", extra={"error": str(e)})
+            yield _sse("error", {"detail": "I'm having trouble right now. Could you rephrase that?"})
+            return
+        finally:
+            await chunks.aclose()
+        tail = stripper.flush()
+        if tail:
+            parts.append(tail)
+            yield _sse("token", {"text": tail})
+        reply = "".join(parts).strip()
+        finish_chat_turn(session, request.message, reply, fallback)
+        yield _sse("done", ChatResponse(text=reply, action=detector.action, session_id=session.session_id).model_dump())
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @app.post("/guide", response_model=GuideResponse)
 async def generate_guide(
+    request: Request,
     context: str = Form(...)
 ):
     try:
-        result = await orchestrator.generate_guide(context)
+        result = await cancel_on_disconnect(request, orchestrator.generate_guide(context))
         return GuideResponse(**result)
+    except (ClientDisconnected, RateLimitExceeded):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Asynchronous generation jobs
+from services.job_queue import JobStatus, QueueFull
+
+@app.exception_handler(QueueFull)
+async def queue_full_handler(request: Request, exc: QueueFull):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.post("/jobs/apply_effect", response_model=JobStatus, status_code=202)
+async def submit_effect_job(
+    effect_type: str = Form(...),
+    custom_prompt: Optional[str] = Form(None),
+    priority: int = Form(5, ge=0, le=9),
+    file: UploadFile = File(...)
+):
+    contents = await file.read()
+    prompt = custom_prompt if custom_prompt else effect_type
+    return orchestrator.submit_effect(contents, prompt, priority)
+
+@app.post("/jobs/video_effect", response_model=JobStatus, status_code=202)
+async def submit_video_effect_job(
+    effect_type: str = Form(...),
+    custom_prompt: Optional[str] = Form(None),
+    context: str = Form("advertising"),
+    priority: int = Form(5, ge=0, le=9),
+    overlay_width: Optional[int] = Form(None, ge=16, le=OVERLAY_MAX_EDGE),
+    overlay_height: Optional[int] = Form(None, ge=16, le=OVERLAY_MAX_EDGE),
+    fps: Optional[int] = Form(None, ge=5, le=30)
+):
+    prompt = custom_prompt if custom_prompt else effect_type
+    return orchestrator.submit_video_effect(context, prompt, priority, overlay_width, overlay_height, fps)
+
+@app.post("/jobs/guide", response_model=JobStatus, status_code=202)
+async def submit_guide_job(
+    context: str = Form(...),
+    priority: int = Form(5, ge=0, le=9)
+):
+    return orchestrator.submit_guide(context, priority)
+
+def _negotiated_job(status: JobStatus, request: Request, screen_width: Optional[int]) -> JobStatus:
+    if not status.result:
+        return status
+    return status.model_copy(update={"result": negotiate_overlay(status.result, request, screen_width)})
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str, request: Request, screen_width: Optional[int] = None):
+    status = orchestrator.jobs.get(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return _negotiated_job(status, request, screen_width)
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job(job_id: str, request: Request, screen_width: Optional[int] = None):
+    """Server-sent events: one `status` event per state change, ending at succeeded/failed."""
+    if orchestrator.jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+
+    async def events():
+        async for status in orchestrator.jobs.watch(job_id):
+            status = _negotiated_job(status, request, screen_width)
+            yield f"event: {status.state.value}\ndata: {status.model_dump_json()}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/stats/jobs")
+async def job_stats():
+    return orchestrator.jobs.stats()
+
 # Scene Analysis for Proactive Guidance
 from services.scene_analyzer import scene_analyzer
+from services.frame_cache import frame_cache
+from services.scene_quality import measure_timings, scene_gate
 
-class SceneAnalysisResponse(BaseModel):
-    composition_score: int
-    lighting: str
-    suggestion: str
-    is_ready_to_shoot: bool
+@app.get("/stats/scene_cache")
+async def scene_cache_stats(session_id: Optional[str] = None):
+    stats = frame_cache.stats()
+    if session_id:
+        stats["session"] = frame_cache.session_stats(session_id)
+    return stats
+
+@app.get("/stats/scene_quality")
+async def scene_quality_stats():
+    return {"timings": measure_timings.stats(), "gate": scene_gate.stats()}
 
 @app.post("/analyze/scene", response_model=SceneAnalysisResponse)
 async def analyze_scene(
+    request: Request,
     context: str = Form(...),
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    session_id: Optional[str] = Form(None)
 ):
     """Real-time scene analysis for proactive photography guidance"""
     try:
         contents = await file.read()
-        result = await scene_analyzer.analyze_scene(contents, context)
+        result = await cancel_on_disconnect(request, scene_analyzer.analyze_scene(contents, context, session_id))
         return SceneAnalysisResponse(
             composition_score=result["composition_score"],
             lighting=result["lighting"],
             suggestion=result["suggestion"],
             is_ready_to_shoot=result["is_ready_to_shoot"]
         )
+    except (ClientDisconnected, RateLimitExceeded):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Live guidance over a persistent socket
+from services.live_session import LiveFrame, LatestFrameSlot, live_latency
+
+@app.get("/stats/live")
+async def live_stats():
+    return live_latency.stats()
+
+@app.websocket("/ws/scene")
+async def scene_stream(
+    websocket: WebSocket,
+    context: str = "General",
+    mode: str = "scene",
+    session_id: Optional[str] = None
+):
+    """
+    Live guidance stream. The client sends JPEG frames as binary messages and
+    may send a JSON text message {"context": ..., "mode": "scene"|"analyze"}
+    to switch settings. Each result is pushed as
+    {"type": mode, "data": <SceneAnalysisResponse|AnalysisResponse>,
+     "latency_ms": ..., "frames_dropped": ...}.
+
+    At most one analysis runs per socket; frames arriving meanwhile replace
+    each other so only the newest is analyzed next.
+    """
+    await websocket.accept()
+    slot = LatestFrameSlot()
+    live_latency.session_opened()
+
+    async def analyze_frames():
+        while True:
+            frame = await slot.get()
+            if frame is None:
+                return
+            # One trace per analyzed frame; the socket itself is long-lived.
+            trace, token = trace_store.start(f"WS /ws/scene {frame.mode}")
+            try:
+                if frame.mode == "analyze":
+                    result = await orchestrator.analyze_photo(frame.data, frame.context)
+                    data = AnalysisResponse(**result).model_dump()
+                else:
+                    result = await scene_analyzer.analyze_scene(frame.data, frame.context, session_id)
+                    data = SceneAnalysisResponse(**result).model_dump()
+                latency_ms = (time.perf_counter() - frame.received_at) * 1000
+                live_latency.record(latency_ms)
+                await websocket.send_json({
+                    "type": frame.mode,
+                    "data": data,
+                    "latency_ms": round(latency_ms, 1),
+                    "frames_dropped": slot.dropped,
+                })
+            except WebSocketDisconnect:
+                return
+            except RateLimitExceeded as e:
+                try:
+                    await websocket.send_json({"type": "throttled", "detail": str(e), "retry_after": e.retry_after})
+                except Exception:
+                    return
+            except Exception as e:
+                try:
+                    await websocket.send_json({"type": "error", "detail": str(e)})
+                except Exception:
+                    return
+            finally:
+                trace_store.finish(trace, token, route="/ws/scene", session_id=session_id)
+
+    worker = asyncio.create_task(analyze_frames())
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                slot.put(LiveFrame(message["bytes"], context, mode, time.perf_counter()))
+            elif message.get("text"):
+                try:
+                    settings = json.loads(message["text"])
+                except ValueError:
+                    continue
+                if not isinstance(settings, dict):
+                    continue
+                if isinstance(settings.get("context"), str):
+                    context = settings["context"]
+                if settings.get("mode") in ("scene", "analyze"):
+                    mode = settings["mode"]
+    finally:
+        slot.close()
+        worker.cancel()
+        live_latency.session_closed(slot)
+
 # Mode Management Endpoints
 from services.mode_controller import mode_controller, AppMode, ModeState
 
+# Plain `def`: the SQLite backend blocks briefly, so these run in the threadpool.
 @app.post("/mode/set", response_model=ModeState)
-async def set_mode(mode: AppMode):
-    return mode_controller.set_mode(mode)
+def set_mode(mode: AppMode, session_id: Optional[str] = None):
+    return mode_controller.set_mode(mode, session_id)
 
 @app.get("/mode/current", response_model=ModeState)
-async def get_mode():
-    return mode_controller.get_state()
+def get_mode(session_id: Optional[str] = None):
+    return mode_controller.get_state(session_id)
+
+@app.get("/stats/mode")
+def mode_stats():
+    return mode_controller.stats()
 
 if __name__ == "__main__":
-    import uvicorn
-    import os
-
-    # Check for SSL certs in frontend directory (common for this project structure)
-    cert_path = "../frontend/cert.pem"
-    key_path = "../frontend/key.pem"
-    
-    # Fallback to current directory
-    if not os.path.exists(cert_path):
-        cert_path = "cert.pem"
-        key_path = "key.pem"
-
-    if os.path.exists(cert_path) and os.path.exists(key_path):
-        print(f"Starting secure backend on https://0.0.0.0:8000 using certs from {cert_path}")
-        uvicorn.run(app, host="0.0.0.0", port=8000, ssl_keyfile=key_path, ssl_certfile=cert_path)
-    else:
-        print("Warning: No SSL certificates found. Starting in HTTP mode. Camera access may be blocked on mobile.")
-        uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Single worker by default; see serve.py for workers, TLS and draining options.
+    import serve
+    serve.main()
@@ -0,0 +1,76 @@
+from typing import Optional
+from pydantic import BaseModel, Field
+
+# Response models shared by the API layer and the agents that ask Gemini for
+# structured output in the same shape.
+
+class TechnicalAdjustments(BaseModel):
+    zoom_level: float = 1.0
+    exposure_offset: float = 0.0
+    torch_on: bool = False
+
+class AnalysisResponse(BaseModel):
+    composition_score: int
+    suggestion: str
+    lighting: str
+    is_ready_to_shoot: bool
+    technical_adjustments: TechnicalAdjustments = Field(default_factory=TechnicalAdjustments)
+
+class SceneAnalysisResponse(BaseModel):
+    composition_score: int
+    lighting: str
+    suggestion: str
+    is_ready_to_shoot: bool
+
+class SceneModelOutput(SceneAnalysisResponse):
+    """What SceneAnalyzer asks Gemini for: the public response plus detail fields."""
+    subject_position: str = ""
+    background_quality: str = ""
+
+class BurstFrameScore(BaseModel):
+    index: int
+    composition_score: int
+    suggestion: str
+
+class BurstModelOutput(BaseModel):
+    """What AnalystAgent asks Gemini for when comparing the frames of a burst."""
+    frames: list[BurstFrameScore]
+    best_index: int
+    reason: str
+
+class BurstFrameResult(BaseModel):
+    index: int
+    composition_score: int
+    lighting: str
+    suggestion: str
+    # "model" if Gemini scored the frame, "local" if it was screened out or the call failed.
+    source: str
+    rejected: Optional[str] = None
+
+class BurstAnalysisResponse(BaseModel):
+    frames: list[BurstFrameResult]
+    best_index: int
+    reason: str
+    model_frames: int
+
+class ClipSegment(BaseModel):
+    start_s: float
+    end_s: float
+    framing: str
+    movement: str
+    lighting: str
+    direction: str
+
+class ClipModelOutput(BaseModel):
+    """What VideographerAgent asks Gemini for about a recorded clip's keyframes."""
+    segments: list[ClipSegment]
+    summary: str
+
+class ClipAnalysisResponse(BaseModel):
+    upload_id: str
+    duration_s: float
+    frames_sampled: int
+    segments: list[ClipSegment]
+    summary: str
+    # "model" or "local" (keyframe metrics only, when no model answer is available).
+    source: str
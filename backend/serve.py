@@ -0,0 +1,156 @@
+"""
+Production launcher for the backend.
+
+    python serve.py --workers 4
+
+Each worker is a separate process that imports `main` itself. Model clients,
+caches, job workers and the event-loop monitor are therefore built after the
+process starts, never inherited from a parent. uvloop and httptools are used
+when installed (`pip install "uvicorn[standard]"`). `--http2` negotiates HTTP/2
+over TLS (ALPN) so a phone multiplexes its analysis, chat and effect requests
+on one connection; it needs `pip install zttp`.
+
+TLS contexts issue several session tickets per handshake, so reconnects and
+parallel connections resume instead of repeating the certificate exchange.
+Generate an ECDSA certificate with `generate_certs.py` for a cheaper full
+handshake; `bench/tls_handshake.py` measures both.
+
+Workers share nothing but the SQLite files (mode state with
+`MODE_STORE=sqlite`, the effect index) and the effect directory. Generation
+jobs, chat sessions and the scene cache and gate live in the worker that
+created them, so with `--workers` above 1 a `GET /jobs/{id}`, a job event
+stream or a chat `session_id` only works when it reaches that same worker:
+put a proxy with sticky sessions in front, or run one worker per port.
+
+On SIGTERM or Ctrl+C each worker stops accepting connections. In-flight
+requests get up to `--grace` seconds to finish, then queued and running
+generation jobs get up to `JOB_DRAIN_TIMEOUT` more. Point load balancers and
+orchestrators at `GET /ready`, and at `GET /health` for liveness.
+"""
+import argparse
+import importlib.util
+import os
+import ssl
+import sys
+
+import uvicorn
+
+from services.logging_setup import configure_logging, get_logger
+
+logger = get_logger("serve")
+
+# TLS 1.3 session tickets sent after each full handshake. Each resumption uses
+# one up, so a client opening parallel connections needs several.
+TLS_SESSION_TICKETS = int(os.getenv("TLS_SESSION_TICKETS", "4"))
+# Forward-secret suites for TLS 1.2 clients; they cover ECDSA and RSA keys alike.
+TLS12_CIPHERS = "ECDHE+AESGCM:ECDHE+CHACHA20"
+
+
+def find_certs():
+    """(certfile, keyfile) from the frontend directory or the backend directory, or (None, None)."""
+    # Check for SSL certs in frontend directory (common for this project structure)
+    for cert_path, key_path in (("../frontend/cert.pem", "../frontend/key.pem"), ("cert.pem", "key.pem")):
+        if os.path.exists(cert_path) and os.path.exists(key_path):
+            return cert_path, key_path
+    return None, None
+
+
+def tune_tls(context: ssl.SSLContext) -> ssl.SSLContext:
+    """Session resumption on, compression off, TLS 1.2 or newer."""
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.options |= ssl.OP_NO_COMPRESSION
+    context.options &= ~ssl.OP_NO_TICKET
+    context.num_tickets = TLS_SESSION_TICKETS
+    context.set_ciphers(TLS12_CIPHERS)
+    return context
+
+
+def tls_context(config, default_factory) -> ssl.SSLContext:
+    """uvicorn `ssl_context_factory`: its default context (certificate, ALPN) with `tune_tls` applied."""
+    return tune_tls(default_factory())
+
+
+def cert_key_type(certfile: str) -> str:
+    from cryptography import x509
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+    with open(certfile, "rb") as f:
+        key = x509.load_pem_x509_certificate(f.read()).public_key()
+    if isinstance(key, ec.EllipticCurvePublicKey):
+        return f"ecdsa-{key.curve.name}"
+    if isinstance(key, rsa.RSAPublicKey):
+        return f"rsa-{key.key_size}"
+    return type(key).__name__
+
+
+def event_loop_choice() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_choice() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the photography agent API.")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")),
+                        help="Worker processes (default WEB_CONCURRENCY or 1)")
+    parser.add_argument("--grace", type=float, default=float(os.getenv("SHUTDOWN_GRACE_SECONDS", "30")),
+                        help="Seconds in-flight requests may take to finish after SIGTERM")
+    parser.add_argument("--no-tls", action="store_true", help="Serve plain HTTP even if certificates exist")
+    parser.add_argument("--certfile", default=os.getenv("SSL_CERTFILE"), help="Default: cert.pem found by find_certs()")
+    parser.add_argument("--keyfile", default=os.getenv("SSL_KEYFILE"))
+    parser.add_argument("--http2", action="store_true", default=os.getenv("HTTP2", "") not in ("", "0", "false"),
+                        help="Offer HTTP/2 alongside HTTP/1.1 (needs `pip install zttp`; default HTTP2 env)")
+    args = parser.parse_args()
+
+    configure_logging()
+    if args.no_tls:
+        certfile, keyfile = None, None
+    elif args.certfile:
+        certfile, keyfile = args.certfile, args.keyfile
+    else:
+        certfile, keyfile = find_certs()
+    options = {
+        "host": args.host,
+        "port": args.port,
+        "workers": args.workers,
+        "loop": event_loop_choice(),
+        "http": http_choice(),
+        "timeout_graceful_shutdown": args.grace,
+        # Our own JSON logging is configured in each worker by main.py.
+        "log_config": None,
+    }
+    if args.http2:
+        if importlib.util.find_spec("zttp") is None:
+            sys.exit("--http2 needs the zttp package: pip install zttp")
+        # One protocol class answers both: ALPN picks h2 or http/1.1 per TLS connection,
+        # and plain connections starting with the HTTP/2 preface get h2c.
+        options.update(http="zttp", http2=True)
+    scheme = "http"
+    cert_key = cert_key_type(certfile) if certfile else None
+    if certfile:
+        options.update(ssl_certfile=certfile, ssl_keyfile=keyfile, ssl_context_factory=tls_context)
+        scheme = "https"
+        if cert_key.startswith("rsa"):
+            logger.warning("Serving an RSA certificate; run generate_certs.py for a faster ECDSA handshake.")
+    else:
+        logger.warning("No SSL certificates found. Starting in HTTP mode. Camera access may be blocked on mobile.")
+
+    if args.workers > 1:
+        logger.warning("Jobs, chat sessions and the scene cache are per worker; route each client to one "
+                       "worker (sticky sessions) or their job ids and session ids will 404 or lose history.",
+                       extra={"workers": args.workers})
+
+    logger.info("Starting backend",
+                extra={"url": f"{scheme}://{args.host}:{args.port}", "workers": args.workers,
+                       "loop": options["loop"], "http": options["http"], "http2": args.http2,
+                       "cert_path": certfile, "cert_key": cert_key})
+    # An import string, so every worker process imports the app on its own.
+    uvicorn.run("main:app", **options)
+
+
+if __name__ == "__main__":
+    main()
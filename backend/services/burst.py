@@ -0,0 +1,55 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from services.frame_preprocessor import PreparedFrame, frame_preprocessor
+from services.scene_quality import SceneMetrics, measure, scene_quality
+
+# Frames per burst the endpoint accepts, and how many survivors go to the model.
+BURST_MAX_FRAMES = int(os.getenv("BURST_MAX_FRAMES", "12"))
+BURST_MAX_MODEL_FRAMES = int(os.getenv("BURST_MAX_MODEL_FRAMES", "6"))
+
+
+@dataclass
+class ScreenedFrame:
+    """One burst frame after local screening; `prepared` is set only for survivors."""
+    index: int
+    local: dict
+    metrics: Optional[SceneMetrics] = None
+    rejected: Optional[str] = None
+    prepared: Optional[PreparedFrame] = None
+
+
+def rejection_reason(m: SceneMetrics) -> Optional[str]:
+    """Why a frame is not worth showing the model, or None if it is."""
+    if m.exposure < 0.2 or m.dark_clip > 0.25:
+        return "too_dark"
+    if m.exposure > 0.8 or m.bright_clip > 0.2:
+        return "too_bright"
+    if m.sharpness < scene_quality.sharpness_min * 0.5:
+        return "blurry"
+    return None
+
+
+def screen_frame(item: tuple) -> ScreenedFrame:
+    """
+    Measures one `(index, image_bytes)` frame and, if it passes, shrinks it for
+    upload. Runs in a `cpu_pool` worker process.
+    """
+    index, image_bytes = item
+    try:
+        metrics = measure(image_bytes)
+    except Exception:
+        return ScreenedFrame(index=index, local={"composition_score": 0, "lighting": "Poor",
+                                                  "suggestion": "Could not read this frame."},
+                             rejected="unreadable")
+    local = scene_quality.score(metrics)
+    frame = ScreenedFrame(index=index, local=local, metrics=metrics, rejected=rejection_reason(metrics))
+    if frame.rejected is None:
+        frame.prepared = frame_preprocessor.prepare(image_bytes)
+    return frame
+
+
+def local_score(frame: ScreenedFrame) -> int:
+    """The local 1-10 score on the 0-100 scale `/analyze` uses."""
+    return frame.local["composition_score"] * 10
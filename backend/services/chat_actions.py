@@ -0,0 +1,111 @@
+from typing import Optional
+
+# Checked in order; the first keyword found decides the action.
+ACTION_KEYWORDS = (
+    ("start_recording", ("start_recording", "action")),
+    ("stop_recording", ("stop_recording", "cut")),
+    ("capture_photo", ("capture", "take a photo")),
+)
+# Marker the photography prompt asks the model to include; never spoken.
+CAPTURE_MARKER = "CAPTURE"
+
+
+def detect_action(text: str) -> Optional[str]:
+    """Camera action implied by a complete reply (used by the non-streaming /chat)."""
+    lowered = text.lower()
+    for action, keywords in ACTION_KEYWORDS:
+        if any(keyword in lowered for keyword in keywords):
+            return action
+    return None
+
+
+class StreamingActionDetector:
+    """
+    Detects the reply's action while it streams in.
+
+    The first keyword to appear fires its action at once, since waiting for
+    the whole reply to apply `detect_action`'s precedence would defeat the
+    point of streaming. Keywords split across chunks are still found.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._scanned = 0
+        self._longest = max(len(k) for _, keywords in ACTION_KEYWORDS for k in keywords)
+        self.action = None
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """Returns the action the first time one is detected, else None."""
+        if self.action is not None:
+            return None
+        self._text += chunk.lower()
+        window = self._text[max(0, self._scanned - self._longest + 1):]
+        self._scanned = len(self._text)
+        best = None
+        for action, keywords in ACTION_KEYWORDS:
+            for keyword in keywords:
+                position = window.find(keyword)
+                if position >= 0 and (best is None or position < best[0]):
+                    best = (position, action)
+        if best is not None:
+            self.action = best[1]
+        return self.action
+
+
+class MarkerStripper:
+    """
+    Removes `CAPTURE_MARKER` from streamed text, whatever the chunking.
+
+    Text is reduced a character at a time on a stack, popping the marker
+    whenever it forms, so markers formed by removing another ("CAP" + marker
+    + "TURE") go too. Each held character records how far back a later
+    removal could still reach from it; everything before that point is
+    released, so only a possible start of the marker is ever held back.
+    """
+
+    def __init__(self, marker: str = CAPTURE_MARKER):
+        self.marker = marker
+        # KMP failure table: longest proper prefix of marker[:i + 1] that is also its suffix.
+        self._fail = [0] * len(marker)
+        k = 0
+        for i in range(1, len(marker)):
+            while k and marker[i] != marker[k]:
+                k = self._fail[k - 1]
+            if marker[i] == marker[k]:
+                k += 1
+            self._fail[i] = k
+        self._held = []  # (char, matched marker length, earliest position a removal could reach)
+        self._released = 0
+
+    def feed(self, chunk: str) -> str:
+        for char in chunk:
+            state = self._held[-1][1] if self._held else 0
+            while state and self.marker[state] != char:
+                state = self._fail[state - 1]
+            if self.marker[state] == char:
+                state += 1
+            if state == len(self.marker):
+                del self._held[len(self._held) - state + 1:]
+                continue
+            position = self._released + len(self._held)
+            # Popping the partial match exposes the character before it, and whatever that one can reach.
+            exposed = self._held[max(0, len(self._held) - state):]
+            reach = min([position - state + 1] + [held[2] for held in exposed])
+            self._held.append((char, state, reach))
+        keep = self._held[-1][2] - self._released if self._held else 0
+        text = "".join(held[0] for held in self._held[:keep])
+        del self._held[:keep]
+        self._released += keep
+        return text
+
+    def flush(self) -> str:
+        text = "".join(held[0] for held in self._held)
+        self._released += len(self._held)
+        self._held = []
+        return text
+
+
+def strip_marker(text: str, marker: str = CAPTURE_MARKER) -> str:
+    """`text` without `marker`; the same reduction `MarkerStripper` applies to a stream."""
+    stripper = MarkerStripper(marker)
+    return stripper.feed(text) + stripper.flush()
@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Optional
+
+# Per-turn bookkeeping overhead counted against the memory cap, in bytes.
+TURN_OVERHEAD = 64
+
+
+class ChatSession:
+    """Rolling conversation for one client: the last `max_turns` user/model turns."""
+
+    __slots__ = ("session_id", "persona", "context", "turns", "size", "created_at", "last_used")
+
+    def __init__(self, session_id: str, max_turns: int):
+        self.session_id = session_id
+        self.persona = None
+        self.context = None
+        self.turns = deque(maxlen=max_turns)
+        self.size = 0
+        self.created_at = self.last_used = time.monotonic()
+
+    def history(self) -> list:
+        """(role, text) pairs, oldest first; role is "user" or "model"."""
+        return list(self.turns)
+
+
+class ChatSessionStore:
+    """
+    In-process chat sessions with TTL, LRU eviction and a total byte cap.
+
+    Clients send only their new message plus `session_id`; the server keeps
+    the rolling history. A client `history` is used once, to seed a session
+    that is new or has expired.
+    """
+
+    def __init__(self, ttl: float = None, max_sessions: int = None, max_bytes: int = None, max_turns: int = None):
+        self.ttl = ttl or float(os.getenv("CHAT_SESSION_TTL", "1800"))
+        self.max_sessions = max_sessions or int(os.getenv("CHAT_SESSION_MAX", "1000"))
+        self.max_bytes = max_bytes or int(os.getenv("CHAT_SESSION_MAX_BYTES", str(8 * 1024 * 1024)))
+        self.max_turns = max_turns or int(os.getenv("CHAT_HISTORY_TURNS", "10"))
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self.created = 0
+        self.resumed = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def get_or_create(self, session_id: Optional[str] = None, seed: list = ()) -> ChatSession:
+        """Returns the live session for `session_id`, or a new one seeded with `seed` (role, text) turns."""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id) if session_id else None
+            if session is not None and now - session.last_used > self.ttl:
+                self._drop(session_id)
+                self.expired += 1
+                session = None
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                session.last_used = now
+                self.resumed += 1
+                return session
+
+            session = ChatSession(session_id or uuid.uuid4().hex, self.max_turns)
+            self._sessions[session.session_id] = session
+            self.created += 1
+            for role, text in list(seed)[-self.max_turns:]:
+                self._append(session, role, text)
+            self._enforce_limits(keep=session.session_id)
+            return session
+
+    def append(self, session: ChatSession, role: str, text: str):
+        with self._lock:
+            if self._sessions.get(session.session_id) is not session:
+                return  # evicted while the reply was generating
+            self._append(session, role, text)
+            session.last_used = time.monotonic()
+            self._enforce_limits(keep=session.session_id)
+
+    def _append(self, session: ChatSession, role: str, text: str):
+        if len(session.turns) == session.turns.maxlen:
+            _, dropped = session.turns[0]
+            session.size -= len(dropped) + TURN_OVERHEAD
+            self._bytes -= len(dropped) + TURN_OVERHEAD
+        session.turns.append((role, text))
+        session.size += len(text) + TURN_OVERHEAD
+        self._bytes += len(text) + TURN_OVERHEAD
+
+    def _drop(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.size
+
+    def _enforce_limits(self, keep: str):
+        now = time.monotonic()
+        # Expired sessions sit at the LRU end; clear them first.
+        while self._sessions:
+            oldest_id, oldest = next(iter(self._sessions.items()))
+            if oldest_id == keep or now - oldest.last_used <= self.ttl:
+                break
+            self._drop(oldest_id)
+            self.expired += 1
+        while len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes:
+            oldest_id = next(iter(self._sessions))
+            if oldest_id == keep:
+                break
+            self._drop(oldest_id)
+            self.evicted += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "max_turns": self.max_turns,
+                "ttl": self.ttl,
+                "created": self.created,
+                "resumed": self.resumed,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+
+chat_sessions = ChatSessionStore()
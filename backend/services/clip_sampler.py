@@ -0,0 +1,127 @@
+import io
+import os
+from dataclasses import dataclass, field
+from typing import Optional
+
+from PIL import Image
+
+from services.frame_cache import hamming_distance
+from services.scene_quality import SceneMetrics, measure, scene_quality
+
+try:
+    import av
+except ImportError:
+    av = None
+
+# Keyframes sent to the model per clip, and their longest edge.
+CLIP_SAMPLE_FRAMES = int(os.getenv("CLIP_SAMPLE_FRAMES", "8"))
+CLIP_FRAME_EDGE = int(os.getenv("CLIP_FRAME_EDGE", "512"))
+CLIP_FRAME_QUALITY = int(os.getenv("CLIP_FRAME_QUALITY", "80"))
+
+
+@dataclass
+class SampledFrame:
+    timestamp: float
+    jpeg: bytes
+    metrics: Optional[SceneMetrics] = None
+
+
+@dataclass
+class ClipSample:
+    duration: float
+    width: int
+    height: int
+    codec: str
+    frames: list = field(default_factory=list)
+
+
+def _encode(image: Image.Image) -> bytes:
+    image.thumbnail((CLIP_FRAME_EDGE, CLIP_FRAME_EDGE), Image.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=CLIP_FRAME_QUALITY)
+    return buffer.getvalue()
+
+
+def sample_keyframes(path: str, count: int = None) -> ClipSample:
+    """
+    Decodes about `count` evenly spaced keyframes of the clip at `path`.
+
+    For each target time the demuxer seeks to the nearest earlier keyframe and
+    only that one frame is decoded, so memory use doesn't grow with clip length.
+    Runs in a `cpu_pool` worker process.
+    """
+    if av is None:
+        raise RuntimeError("Clip analysis needs PyAV (pip install av)")
+    count = count or CLIP_SAMPLE_FRAMES
+    with av.open(path) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        if stream.duration is not None and stream.time_base is not None:
+            duration = float(stream.duration * stream.time_base)
+        else:
+            duration = (container.duration or 0) / av.time_base
+        sample = ClipSample(duration=round(duration, 3), width=stream.codec_context.width,
+                            height=stream.codec_context.height, codec=stream.codec_context.name)
+        start = float(stream.start_time * stream.time_base) if stream.start_time is not None else 0.0
+
+        targets = [start + duration * (i + 0.5) / count for i in range(count)]
+        seen = set()
+        for target in targets:
+            container.seek(int(target / stream.time_base), stream=stream, backward=True, any_frame=False)
+            frame = next(container.decode(stream), None)
+            if frame is None or frame.time in seen:
+                continue
+            seen.add(frame.time)
+            sample.frames.append(_sampled(frame, start))
+
+        if len(sample.frames) < min(count, 2):
+            # Too few keyframes (long GOP): walk the clip once, keeping one frame
+            # per target and discarding the rest as they are decoded.
+            sample.frames = []
+            container.seek(0, stream=stream)
+            pending = iter(targets)
+            target = next(pending, None)
+            for frame in container.decode(stream):
+                if target is None:
+                    break
+                if frame.time is not None and frame.time >= target:
+                    sample.frames.append(_sampled(frame, start))
+                    target = next(pending, None)
+    sample.frames.sort(key=lambda f: f.timestamp)
+    return sample
+
+
+def _sampled(frame, start: float) -> SampledFrame:
+    jpeg = _encode(frame.to_image())
+    return SampledFrame(timestamp=round((frame.time or start) - start, 2), jpeg=jpeg, metrics=measure(jpeg))
+
+
+def describe_movement(previous: Optional[SceneMetrics], current: SceneMetrics) -> str:
+    """Camera movement between two keyframes, judged by how far the perceptual hash moved."""
+    if previous is None:
+        return "Opening shot"
+    distance = hamming_distance(previous.phash, current.phash)
+    if distance <= 6:
+        return "Steady"
+    if distance <= 20:
+        return "Moving"
+    return "Cut or fast move"
+
+
+def local_segments(sample: ClipSample) -> list:
+    """One segment per keyframe, from local metrics alone."""
+    segments = []
+    previous = None
+    for i, frame in enumerate(sample.frames):
+        end = sample.frames[i + 1].timestamp if i + 1 < len(sample.frames) else sample.duration
+        local = scene_quality.score(frame.metrics)
+        segments.append({
+            "start_s": frame.timestamp,
+            "end_s": round(max(end, frame.timestamp), 2),
+            "framing": local["details"]["subject_position"],
+            "movement": describe_movement(previous, frame.metrics),
+            "lighting": local["lighting"],
+            "direction": local["suggestion"],
+        })
+        previous = frame.metrics
+    return segments
@@ -0,0 +1,222 @@
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: uploads are only guarded within one process
+    fcntl = None
+
+from services.logging_setup import get_logger
+
+logger = get_logger("clip_uploads")
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadError(Exception):
+    """A rejected upload request; `status_code` is the HTTP status to answer with."""
+
+    def __init__(self, status_code: int, message: str, offset: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+
+class ClipUploadStore:
+    """
+    Resumable clip uploads written straight to disk.
+
+    Each upload is `<id>.part` plus a `<id>.json` sidecar holding the declared
+    size. The current offset is simply the part file's length, so a client
+    whose connection dropped asks for it and resumes from there, and any
+    worker process can continue an upload another one started: writers take
+    an exclusive `flock` on the part file, so a second request for the same
+    upload, in any worker, gets 409. Bodies are copied in `CLIP_CHUNK_BYTES`
+    pieces; no clip is ever held in memory.
+    """
+
+    def __init__(self, directory: str = None, max_bytes: int = None, chunk_bytes: int = None, ttl: float = None):
+        self.directory = directory or os.getenv("CLIP_UPLOAD_DIR", "uploads/clips")
+        self.max_bytes = max_bytes or int(os.getenv("CLIP_MAX_BYTES", str(500 * 1024 * 1024)))
+        self.chunk_bytes = chunk_bytes or int(os.getenv("CLIP_CHUNK_BYTES", str(1024 * 1024)))
+        self.ttl = ttl or float(os.getenv("CLIP_UPLOAD_TTL", "3600"))
+        self.janitor_interval = float(os.getenv("CLIP_JANITOR_INTERVAL", "300"))
+        self._locks = {}
+        self._janitor = None
+        self.bytes_received = 0
+
+    def _paths(self, upload_id: str) -> tuple:
+        if not _UPLOAD_ID.match(upload_id or ""):
+            raise UploadError(404, "Unknown upload")
+        base = os.path.join(self.directory, upload_id)
+        return base + ".part", base + ".json"
+
+    def create(self, size: int, filename: str = "", content_type: str = "") -> dict:
+        if size <= 0:
+            raise UploadError(400, "size must be positive")
+        if size > self.max_bytes:
+            raise UploadError(413, f"Clip exceeds {self.max_bytes} bytes")
+        os.makedirs(self.directory, exist_ok=True)
+        upload_id = uuid.uuid4().hex
+        part, meta = self._paths(upload_id)
+        with open(meta, "w") as f:
+            json.dump({"size": size, "filename": filename, "content_type": content_type, "created": time.time()}, f)
+        open(part, "wb").close()
+        return self.status(upload_id)
+
+    def status(self, upload_id: str) -> dict:
+        part, meta = self._paths(upload_id)
+        try:
+            with open(meta) as f:
+                info = json.load(f)
+            offset = os.path.getsize(part)
+        except FileNotFoundError:
+            raise UploadError(404, "Unknown upload")
+        return {"upload_id": upload_id, "size": info["size"], "offset": offset, "complete": offset == info["size"]}
+
+    def path(self, upload_id: str) -> str:
+        """Path of a completed upload."""
+        status = self.status(upload_id)
+        if not status["complete"]:
+            raise UploadError(409, "Upload is incomplete", status["offset"])
+        return self._paths(upload_id)[0]
+
+    async def append(self, upload_id: str, offset: int, chunks) -> dict:
+        """
+        Writes the async iterator of byte `chunks` at `offset`, which must be
+        the current end of the upload.
+        """
+        status = self.status(upload_id)
+        lock = self._locks.setdefault(upload_id, asyncio.Lock())
+        if lock.locked():
+            raise UploadError(409, "Upload already in progress", status["offset"])
+        try:
+            async with lock:
+                return await self._write(upload_id, offset, chunks)
+        finally:
+            self._locks.pop(upload_id, None)
+
+    async def _write(self, upload_id: str, offset: int, chunks) -> dict:
+        status = self.status(upload_id)
+        part = self._paths(upload_id)[0]
+        loop = asyncio.get_running_loop()
+        f = await loop.run_in_executor(None, open, part, "ab")
+        buffer = bytearray()
+        written = status["offset"]
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    raise UploadError(409, "Upload already in progress", status["offset"])
+            # Only now is the length stable: another worker may have appended before we got the lock.
+            written = status["offset"] = os.fstat(f.fileno()).st_size
+            if offset != written:
+                raise UploadError(409, "Offset mismatch", written)
+            async for chunk in chunks:
+                if written + len(buffer) + len(chunk) > status["size"]:
+                    raise UploadError(413, "Body runs past the declared size", written)
+                buffer += chunk
+                if len(buffer) >= self.chunk_bytes:
+                    await loop.run_in_executor(None, f.write, bytes(buffer))
+                    written += len(buffer)
+                    buffer.clear()
+        finally:
+            # Whatever arrived before a disconnect stays; the client resumes from there.
+            if buffer:
+                await loop.run_in_executor(None, f.write, bytes(buffer))
+                written += len(buffer)
+            await loop.run_in_executor(None, f.close)
+            self.bytes_received += written - status["offset"]
+        return self.status(upload_id)
+
+    async def save_upload_file(self, file, declared_size: int = None) -> str:
+        """Copies a multipart `UploadFile` into a new completed upload chunk by chunk; returns its id."""
+        size = declared_size or file.size or self.max_bytes
+        upload_id = self.create(min(size, self.max_bytes))["upload_id"]
+
+        async def chunks():
+            while True:
+                chunk = await file.read(self.chunk_bytes)
+                if not chunk:
+                    return
+                yield chunk
+
+        try:
+            status = await self.append(upload_id, 0, chunks())
+        except UploadError:
+            self.delete(upload_id)
+            raise
+        if not status["complete"]:
+            # No size was known up front; what arrived is the whole clip.
+            part, meta = self._paths(upload_id)
+            with open(meta) as f:
+                info = json.load(f)
+            info["size"] = status["offset"]
+            with open(meta, "w") as f:
+                json.dump(info, f)
+        return upload_id
+
+    def delete(self, upload_id: str):
+        for path in self._paths(upload_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def prune(self):
+        """Removes uploads untouched for `ttl` seconds."""
+        cutoff = time.time() - self.ttl
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name.endswith(".json") and _UPLOAD_ID.match(name[:-5]):
+                upload_id = name[:-5]
+                part = self._paths(upload_id)[0]
+                try:
+                    last = max(os.path.getmtime(part), os.path.getmtime(os.path.join(self.directory, name)))
+                except FileNotFoundError:
+                    last = 0
+                if last < cutoff:
+                    self.delete(upload_id)
+                    logger.info("Pruned stale clip upload", extra={"upload_id": upload_id})
+
+    async def _run_janitor(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.prune)
+            except Exception:
+                logger.exception("Clip upload janitor error")
+            await asyncio.sleep(self.janitor_interval)
+
+    def start_janitor(self):
+        if self._janitor is None:
+            self._janitor = asyncio.create_task(self._run_janitor())
+
+    def stop_janitor(self):
+        if self._janitor is not None:
+            self._janitor.cancel()
+            self._janitor = None
+
+    def stats(self) -> dict:
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(".part")]
+        except FileNotFoundError:
+            names = []
+        return {
+            "uploads": len(names),
+            "bytes_on_disk": sum(os.path.getsize(os.path.join(self.directory, n)) for n in names),
+            "bytes_received": self.bytes_received,
+            "max_bytes": self.max_bytes,
+        }
+
+
+clip_uploads = ClipUploadStore()
@@ -0,0 +1,109 @@
+import asyncio
+import importlib
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from services.logging_setup import get_logger
+
+logger = get_logger("cpu_pool")
+
+
+def _ignore_interrupt():
+    # Ctrl+C reaches the whole process group; the server shuts the pool down itself.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _preload(modules: tuple) -> int:
+    for name in modules:
+        importlib.import_module(name)
+    return os.getpid()
+
+
+class CpuPool:
+    """
+    Process pool for image work that should use every core.
+
+    Pillow releases the GIL while decoding, but the NumPy-and-Python parts of
+    frame screening don't, so a burst of frames would otherwise queue up
+    behind one core. Workers are spawned (not forked) so they never inherit
+    the server's threads or locks. `CPU_POOL_WORKERS=0` runs jobs on the
+    frame-preprocessing threads instead.
+    """
+
+    def __init__(self, workers: int = None):
+        self.workers = workers if workers is not None else int(os.getenv("CPU_POOL_WORKERS", str(os.cpu_count() or 2)))
+        self._executor = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self.tasks = 0
+        self.total_ms = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._closed:
+                # Recreating it here would leave worker processes running after the app stops.
+                raise RuntimeError("CPU pool is shut down")
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"),
+                                                     initializer=_ignore_interrupt)
+            return self._executor
+
+    async def run(self, fn, *args):
+        """Runs the module-level function `fn(*args)` in a worker process."""
+        started = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                from services.frame_preprocessor import frame_preprocessor
+                return await frame_preprocessor.run(fn, *args)
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._get_executor(), fn, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM on a huge image); start a fresh pool for the next call.
+                logger.warning("CPU pool broken, restarting")
+                with self._lock:
+                    self._executor = None
+                raise
+        finally:
+            self.tasks += 1
+            self.total_ms += (time.perf_counter() - started) * 1000
+
+    async def warm_up(self, modules: tuple = ()):
+        """Starts the workers and imports `modules` in them, so the first real job isn't paying for it."""
+        if self.workers <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        started = time.perf_counter()
+        pids = await asyncio.gather(*(loop.run_in_executor(executor, _preload, modules) for _ in range(self.workers)))
+        logger.info("CPU pool ready", extra={"workers": len(set(pids)),
+                                             "ms": round((time.perf_counter() - started) * 1000, 1)})
+
+    async def map(self, fn, items: list) -> list:
+        return await asyncio.gather(*(self.run(fn, item) for item in items))
+
+    def shutdown(self):
+        """Stops the workers for good; later jobs raise instead of starting a new pool."""
+        with self._lock:
+            self._closed = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "started": self._executor is not None,
+            "closed": self._closed,
+            "tasks": self.tasks,
+            "avg_ms": round(self.total_ms / self.tasks, 2) if self.tasks else None,
+        }
+
+
+cpu_pool = CpuPool()
@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """One upstream generation shared by every request waiting on it."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class EffectResultCache:
+    """
+    Caches generated effect results by (model_id, final prompt, config).
+
+    Imagen never sees the user's photo, so identical requests produce
+    interchangeable results. Each key keeps up to `variants` results, filled
+    one generation at a time, and then rotates through them until they expire.
+    Concurrent misses for the same key share one upstream call (single-flight).
+    """
+
+    def __init__(self, ttl: float = None, variants: int = None, max_keys: int = None):
+        self.ttl = ttl or float(os.getenv("EFFECT_CACHE_TTL", "3600"))
+        self.variants = variants or int(os.getenv("EFFECT_CACHE_VARIANTS", "3"))
+        self.max_keys = max_keys or int(os.getenv("EFFECT_CACHE_MAX_KEYS", "256"))
+        self._entries = OrderedDict()
+        self._cursor = {}
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(model_id: str, prompt: str, config: dict) -> str:
+        payload = json.dumps([model_id, prompt, config], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def get_or_create(self, model_id: str, prompt: str, config: dict, factory, is_valid=None) -> dict:
+        """
+        Returns a cached result for the key, or awaits `factory()` to make one.
+
+        `factory` is a zero-argument coroutine function. Results containing an
+        "error" key are returned but never cached. `is_valid`, if given, is
+        called on cached results and drops those it rejects (e.g. evicted files).
+        """
+        key = self.make_key(model_id, prompt, config)
+        variants = self._live_variants(key, is_valid)
+
+        if len(variants) >= self.variants:
+            self.hits += 1
+            return self._next_variant(key, variants)
+
+        flight = self._inflight.get(key)
+        if flight is not None:
+            if variants:
+                # Another request is already filling a slot; don't wait for it.
+                self.hits += 1
+                return self._next_variant(key, variants)
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._inflight[key] = flight
+            flight.task.add_done_callback(lambda task: self._finish(key, task))
+
+        flight.waiters += 1
+        try:
+            return dict(await asyncio.shield(flight.task))
+        finally:
+            flight.waiters -= 1
+            # Only abandon the upstream call once nobody is waiting for it.
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        result = task.result()
+        if not result or "error" in result:
+            return
+        self._entries.setdefault(key, []).append((time.monotonic() + self.ttl, result))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_keys:
+            evicted, _ = self._entries.popitem(last=False)
+            self._cursor.pop(evicted, None)
+
+    def _live_variants(self, key: str, is_valid=None) -> list:
+        variants = self._entries.get(key)
+        if not variants:
+            return []
+        now = time.monotonic()
+        live = [v for v in variants if v[0] > now and (is_valid is None or is_valid(v[1]))]
+        if len(live) != len(variants):
+            self.expirations += len(variants) - len(live)
+            if live:
+                self._entries[key] = live
+            else:
+                del self._entries[key]
+                self._cursor.pop(key, None)
+        return live
+
+    def _next_variant(self, key: str, variants: list) -> dict:
+        self._entries.move_to_end(key)
+        cursor = self._cursor.get(key, 0) % len(variants)
+        self._cursor[key] = cursor + 1
+        return dict(variants[cursor][1])
+
+    def stats(self) -> dict:
+        return {
+            "keys": len(self._entries),
+            "variants_per_key": self.variants,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "expirations": self.expirations,
+            "in_flight": len(self._inflight),
+        }
+
+
+effect_cache = EffectResultCache()
@@ -0,0 +1,178 @@
+import io
+import os
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageChops, ImageFilter, ImageOps
+
+# Longest edge of the rendered photo (the camera uploads 720p) and its JPEG quality.
+EFFECT_LOCAL_MAX_EDGE = int(os.getenv("EFFECT_LOCAL_MAX_EDGE", "1280"))
+EFFECT_LOCAL_QUALITY = int(os.getenv("EFFECT_LOCAL_QUALITY", "90"))
+# Blurs and masks are computed on an image this many times smaller, then scaled back up.
+MASK_REDUCE = 4
+LUMA = np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+
+
+@dataclass
+class CompositedImage:
+    """A preset rendered onto the user's photo."""
+    data: bytes
+    width: int
+    height: int
+    mime_type: str = "image/jpeg"
+    timings_ms: dict = field(default_factory=dict)
+
+
+def _decode(image_bytes: bytes) -> Image.Image:
+    image = Image.open(io.BytesIO(image_bytes))
+    scale = EFFECT_LOCAL_MAX_EDGE / max(image.size)
+    if scale < 1:
+        # Draft mode only scales down while both sides stay at least this size.
+        image.draft("RGB", (int(image.width * scale), int(image.height * scale)))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if max(image.size) > EFFECT_LOCAL_MAX_EDGE:
+        image.thumbnail((EFFECT_LOCAL_MAX_EDGE, EFFECT_LOCAL_MAX_EDGE), Image.BILINEAR)
+    return image
+
+
+def _smoothstep(edge0: float, edge1: float, x: np.ndarray) -> np.ndarray:
+    t = np.clip((x - edge0) / (edge1 - edge0), 0.0, 1.0)
+    return t * t * (3 - 2 * t)
+
+
+def _mask(values: np.ndarray, size: tuple) -> Image.Image:
+    """A 0..1 float mask as a full-size "L" image."""
+    return Image.fromarray((values * 255 + 0.5).astype(np.uint8)).resize(size, Image.BILINEAR)
+
+
+def _blurred(image: Image.Image, radius: float) -> Image.Image:
+    """Gaussian blur with `radius` as a fraction of the longest edge, at 1/`MASK_REDUCE` size."""
+    small = image.reduce(MASK_REDUCE)
+    return small.filter(ImageFilter.GaussianBlur(max(1.0, radius * max(small.size))))
+
+
+def _lut(fn) -> list:
+    return [int(np.clip(fn(i / 255.0), 0.0, 1.0) * 255 + 0.5) for i in range(256)]
+
+
+def _saturation(small: np.ndarray) -> np.ndarray:
+    r, g, b = small[..., 0], small[..., 1], small[..., 2]
+    return np.maximum(np.maximum(r, g), b) - np.minimum(np.minimum(r, g), b)
+
+
+def vibrance(image: Image.Image, amount: float) -> Image.Image:
+    """Saturation boost weighted towards muted areas, so skin and already-bright colours don't clip."""
+    saturated = Image.blend(image.convert("L").convert("RGB"), image, 1 + amount)
+    small = np.asarray(image.reduce(MASK_REDUCE), dtype=np.float32) * (1 / 255.0)
+    return Image.composite(saturated, image, _mask(1 - _saturation(small), image.size))
+
+
+def clarity(image: Image.Image, blurred: Image.Image, amount: float) -> Image.Image:
+    """Local contrast: adds back the detail the blur removed, in the midtones only."""
+    boosted = Image.blend(blurred.resize(image.size, Image.BILINEAR), image, 1 + amount)
+    midtones = image.convert("L").point(_lut(lambda l: 4 * l * (1 - l)))
+    return Image.composite(boosted, image, midtones)
+
+
+def bloom(image: Image.Image, blurred: Image.Image, threshold: float, strength: float,
+          tint=(1.0, 0.96, 0.88)) -> Image.Image:
+    """Screen-blends the blurred highlights back over the image as a warm glow."""
+    luma = blurred.convert("L")
+    highlights = [luma.point(_lut(lambda l, t=t: _smoothstep(threshold, 1.0, l) * strength * t)) for t in tint]
+    glow = ImageChops.multiply(blurred, Image.merge("RGB", highlights))
+    return ImageChops.screen(image, glow.resize(image.size, Image.BILINEAR))
+
+
+@lru_cache(maxsize=8)
+def _vignette_mask(size: tuple, strength: float) -> Image.Image:
+    width, height = size[0] // MASK_REDUCE, size[1] // MASK_REDUCE
+    y, x = np.ogrid[-1:1:height * 1j, -1:1:width * 1j]
+    radius = np.sqrt(x ** 2 + y ** 2) / np.sqrt(2)
+    falloff = _mask(1 - strength * _smoothstep(0.45, 1.0, radius), size)
+    return Image.merge("RGB", [falloff] * 3)
+
+
+def vignette(image: Image.Image, strength: float) -> Image.Image:
+    return ImageChops.multiply(image, _vignette_mask(image.size, strength))
+
+
+def clean_background(image: Image.Image, tolerance: float = 0.12) -> Image.Image:
+    """
+    Evens out the backdrop: pixels close to the border's median luminance and
+    low in saturation are pulled to a clean white (or black, for dark
+    backdrops) through a feathered luminance mask. The subject, which differs
+    from the border in brightness or colour, is left alone.
+    """
+    small = np.asarray(image.reduce(MASK_REDUCE), dtype=np.float32) * (1 / 255.0)
+    luma = small @ LUMA
+    band = max(2, min(luma.shape) // 20)
+    border = np.concatenate([luma[:band].ravel(), luma[-band:].ravel(),
+                             luma[:, :band].ravel(), luma[:, -band:].ravel()])
+    backdrop = float(np.median(border))
+    mask = (1 - _smoothstep(tolerance, 2 * tolerance, np.abs(luma - backdrop))) * (1 - _smoothstep(0.12, 0.3, _saturation(small)))
+    # Feather the mask so the cutout edge doesn't show.
+    mask = _mask(mask, mask.shape[::-1]).filter(ImageFilter.GaussianBlur(2)).resize(image.size, Image.BILINEAR)
+    clean = Image.new("RGB", image.size, (245, 245, 245) if backdrop >= 0.45 else (10, 10, 10))
+    return Image.composite(clean, image, mask)
+
+
+def _glow(image: Image.Image) -> Image.Image:
+    soft = _blurred(image, 0.04)
+    image = bloom(image, soft, threshold=0.5, strength=0.7)
+    image = Image.blend(image, soft.resize(image.size, Image.BILINEAR), 0.12)
+    return vignette(image, 0.3)
+
+
+def _fresh(image: Image.Image) -> Image.Image:
+    image = clarity(image, _blurred(image, 0.01), 0.6)
+    return vibrance(image, 0.5).point(_lut(lambda v: v * 1.03) * 3)
+
+
+def _product(image: Image.Image) -> Image.Image:
+    image = clean_background(image)
+    image = clarity(image, _blurred(image, 0.004), 0.8)
+    return vibrance(image, 0.15)
+
+
+# Presets reproduced locally; every other effect goes to Imagen.
+PRESETS = {
+    "glow": _glow,
+    "fresh": _fresh,
+    "product": _product,
+}
+
+
+def composite_effect(preset: str, image_bytes: bytes) -> CompositedImage:
+    """
+    Renders `preset` onto the photo in `image_bytes`. Runs in a `cpu_pool`
+    worker process.
+
+    Full-size pixels only go through Pillow's C blend, screen and composite
+    operations; the smooth masks that steer them (highlights, vignette,
+    backdrop) are computed with NumPy at 1/`MASK_REDUCE` scale.
+    """
+    timings = {}
+    started = last = time.perf_counter()
+
+    def mark(stage):
+        nonlocal last
+        now = time.perf_counter()
+        timings[stage] = round((now - last) * 1000, 3)
+        last = now
+
+    image = _decode(image_bytes)
+    mark("decode")
+
+    image = PRESETS[preset](image)
+    mark("filter")
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=EFFECT_LOCAL_QUALITY)
+    mark("encode")
+
+    timings["total"] = round((time.perf_counter() - started) * 1000, 3)
+    return CompositedImage(data=buffer.getvalue(), width=image.width, height=image.height, timings_ms=timings)
@@ -0,0 +1,298 @@
+import asyncio
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+
+from PIL import Image
+
+from services.logging_setup import get_logger
+from services.tracing import span
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+URL_PREFIX = "/static/effects/"
+
+logger = get_logger("effect_storage")
+
+
+# Variant suffixes written next to each stored PNG (see `EffectStorage.encode_variants`).
+VARIANTS = ("webp", "preview.webp", "preview.png")
+
+
+def variant_filename(filename: str, variant: str) -> str:
+    """`effect_<hash>.png` -> `effect_<hash>.<variant>`."""
+    return f"{filename.rsplit('.', 1)[0]}.{variant}"
+
+
+def image_bytes_of(image) -> bytes:
+    """PNG bytes for a generated image (google-genai `types.Image` or PIL)."""
+    data = getattr(image, "image_bytes", None)
+    if data:
+        return data
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class EffectStorage:
+    """
+    Content-addressed store for generated effect images.
+
+    Files live under `static/effects/` (so the existing `/static` mount keeps
+    serving them) and are named by the SHA-256 of their bytes. A SQLite index
+    tracks size, creation time and last access; a background janitor evicts by
+    age and keeps the directory under a byte budget without scanning it.
+
+    Each PNG gets WebP and downscaled preview siblings (see `VARIANTS`) when
+    it is saved; the index row's size covers all of them, and they are
+    evicted together.
+    """
+
+    def __init__(self, root: str = None, index_path: str = None, max_bytes: int = None,
+                 max_age: float = None, janitor_interval: float = None):
+        self.root = root or os.getenv("EFFECT_STORAGE_DIR", os.path.join(BACKEND_DIR, "static", "effects"))
+        self.index_path = index_path or os.getenv("EFFECT_INDEX_PATH", os.path.join(BACKEND_DIR, "effects_index.sqlite3"))
+        self.max_bytes = max_bytes or int(os.getenv("EFFECT_STORAGE_MAX_BYTES", str(1024 ** 3)))
+        self.max_age = max_age or float(os.getenv("EFFECT_STORAGE_MAX_AGE", str(7 * 24 * 3600)))
+        self.janitor_interval = janitor_interval or float(os.getenv("EFFECT_JANITOR_INTERVAL", "300"))
+        self.preview_edge = int(os.getenv("EFFECT_PREVIEW_EDGE", "512"))
+        self.webp_quality = int(os.getenv("EFFECT_WEBP_QUALITY", "85"))
+        self._lock = threading.Lock()
+        self._db = None
+        self._pending_access = {}
+        self._janitor = None
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(self.root, exist_ok=True)
+            self._db = sqlite3.connect(self.index_path, check_same_thread=False, timeout=10)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS effects ("
+                " filename TEXT PRIMARY KEY, kind TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS effects_last_access ON effects (last_access)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS effects_created_at ON effects (created_at)")
+            self._db.commit()
+            self._adopt_existing_files()
+        return self._db
+
+    def _adopt_existing_files(self):
+        """Indexes files written before the index existed (one-time scan)."""
+        if self._db.execute("SELECT 1 FROM effects LIMIT 1").fetchone():
+            return
+        rows = []
+        for entry in os.scandir(self.root):
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                rows.append((entry.name, entry.name.rsplit("_", 1)[0], stat.st_size, stat.st_mtime, stat.st_mtime))
+        self._db.executemany("INSERT OR IGNORE INTO effects VALUES (?, ?, ?, ?, ?)", rows)
+        self._db.commit()
+
+    @staticmethod
+    def filename_of(url: str) -> str:
+        return url[len(URL_PREFIX):] if url and url.startswith(URL_PREFIX) else ""
+
+    def encode_variants(self, data: bytes) -> dict:
+        """WebP (alpha kept) and preview encodings of a PNG, keyed by `VARIANTS` suffix."""
+        with Image.open(io.BytesIO(data)) as image:
+            image = image.convert("RGBA")
+            variants = {"webp": self._encode(image, "WEBP")}
+            if max(image.size) > self.preview_edge:
+                preview = image.copy()
+                preview.thumbnail((self.preview_edge, self.preview_edge), Image.LANCZOS)
+                variants["preview.webp"] = self._encode(preview, "WEBP")
+                variants["preview.png"] = self._encode(preview, "PNG")
+        return variants
+
+    def _encode(self, image: Image.Image, fmt: str) -> bytes:
+        buffer = io.BytesIO()
+        if fmt == "WEBP":
+            image.save(buffer, format="WEBP", quality=self.webp_quality, method=4)
+        else:
+            image.save(buffer, format=fmt, optimize=True)
+        return buffer.getvalue()
+
+    def _write(self, path: str, data: bytes):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def save_bytes(self, data: bytes, kind: str, ext: str = "png", variants: dict = None) -> str:
+        """
+        Stores `data` (and, for PNGs, its variants) under its content hash and
+        returns its /static URL. Precomputed `variants`, keyed by `VARIANTS`
+        suffix, are stored as given instead of being encoded from `data`.
+        """
+        filename = f"{kind}_{hashlib.sha256(data).hexdigest()[:32]}.{ext}"
+        path = os.path.join(self.root, filename)
+        now = time.time()
+        if variants is None:
+            variants = {}
+            if ext == "png" and not os.path.exists(path):
+                # Encoding is the slow part; keep it outside the index lock.
+                try:
+                    variants = self.encode_variants(data)
+                except Exception as e:
+                    logger.warning("Effect variant encoding failed", extra={"effect_file": filename, "error": str(e)})
+        with self._lock:
+            db = self._conn()
+            if not os.path.exists(path):
+                for variant, variant_data in variants.items():
+                    self._write(os.path.join(self.root, variant_filename(filename, variant)), variant_data)
+                # The original goes last: once it exists, its variants do too.
+                self._write(path, data)
+            size = len(data) + sum(len(v) for v in variants.values())
+            db.execute(
+                "INSERT INTO effects VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(filename) DO UPDATE SET last_access = excluded.last_access",
+                (filename, kind, size, now, now),
+            )
+            db.commit()
+        return URL_PREFIX + filename
+
+    async def save_image(self, image, kind: str) -> str:
+        """Encodes and stores a generated image off the event loop."""
+        loop = asyncio.get_running_loop()
+        with span("save", kind=kind):
+            return await loop.run_in_executor(None, lambda: self.save_bytes(image_bytes_of(image), kind))
+
+    async def save_data(self, data: bytes, kind: str, ext: str, variants: dict = None) -> str:
+        """Stores already-encoded bytes (and any precomputed variants) off the event loop."""
+        loop = asyncio.get_running_loop()
+        with span("save", kind=kind):
+            return await loop.run_in_executor(None, self.save_bytes, data, kind, ext, variants)
+
+    def variant_urls(self, url: str) -> dict:
+        """URLs of the stored variants of `url` (files saved before variants existed have none)."""
+        filename = self.filename_of(url)
+        if not filename:
+            return {}
+        names = {variant: variant_filename(filename, variant) for variant in VARIANTS}
+        return {variant: URL_PREFIX + name for variant, name in names.items()
+                if os.path.exists(os.path.join(self.root, name))}
+
+    def pick_variant(self, url: str, accept: str = "", width: int = None) -> str:
+        """
+        The variant of `url` to hand a client: WebP if its `Accept` header
+        allows it, the preview if it will draw the overlay at most
+        `preview_edge` device pixels wide. Falls back to the original PNG.
+        """
+        variants = self.variant_urls(url)
+        webp = "image/webp" in (accept or "")
+        if width and width <= self.preview_edge:
+            preview = variants.get("preview.webp" if webp else "preview.png")
+            if preview:
+                return preview
+        if webp and "webp" in variants:
+            return variants["webp"]
+        return url
+
+    def exists(self, url: str) -> bool:
+        filename = self.filename_of(url)
+        return bool(filename) and os.path.exists(os.path.join(self.root, filename))
+
+    def touch(self, url: str):
+        """Records an access; written to the index by the next janitor pass."""
+        filename = self.filename_of(url)
+        if filename:
+            self._pending_access[filename] = time.time()
+
+    def list(self, offset: int = 0, limit: int = 50, kind: str = None) -> dict:
+        """Newest-first page of stored effects, read from the index only."""
+        where, args = ("WHERE kind = ?", (kind,)) if kind else ("", ())
+        with self._lock:
+            db = self._conn()
+            total = db.execute(f"SELECT COUNT(*) FROM effects {where}", args).fetchone()[0]
+            rows = db.execute(
+                f"SELECT filename, kind, size, created_at, last_access FROM effects {where}"
+                " ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                args + (limit, offset),
+            ).fetchall()
+        return {
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "items": [
+                {"url": URL_PREFIX + name, "kind": k, "size": size, "created_at": created, "last_access": accessed}
+                for name, k, size, created, accessed in rows
+            ],
+        }
+
+    def evict(self) -> int:
+        """Flushes pending accesses, then removes expired and least-recently-used files."""
+        now = time.time()
+        pending, self._pending_access = self._pending_access, {}
+        with self._lock:
+            db = self._conn()
+            db.executemany(
+                "UPDATE effects SET last_access = MAX(last_access, ?) WHERE filename = ?",
+                [(accessed, name) for name, accessed in pending.items()],
+            )
+            victims = db.execute(
+                "SELECT filename, size FROM effects WHERE last_access < ?", (now - self.max_age,)
+            ).fetchall()
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM effects").fetchone()[0]
+            total -= sum(size for _, size in victims)
+            if total > self.max_bytes:
+                expired = {name for name, _ in victims}
+                for name, size in db.execute("SELECT filename, size FROM effects ORDER BY last_access"):
+                    if total <= self.max_bytes:
+                        break
+                    if name not in expired:
+                        victims.append((name, size))
+                        total -= size
+            for name, size in victims:
+                for path in [name] + [variant_filename(name, v) for v in VARIANTS]:
+                    try:
+                        os.remove(os.path.join(self.root, path))
+                    except FileNotFoundError:
+                        pass
+                self.evicted_files += 1
+                self.evicted_bytes += size
+            db.executemany("DELETE FROM effects WHERE filename = ?", [(name,) for name, _ in victims])
+            db.commit()
+        return len(victims)
+
+    async def _run_janitor(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                evicted = await loop.run_in_executor(None, self.evict)
+                if evicted:
+                    logger.info("Effect janitor evicted files", extra={"evicted": evicted})
+            except Exception:
+                logger.exception("Effect janitor error")
+            await asyncio.sleep(self.janitor_interval)
+
+    def start_janitor(self):
+        if self._janitor is None:
+            self._janitor = asyncio.create_task(self._run_janitor())
+
+    def stop_janitor(self):
+        if self._janitor is not None:
+            self._janitor.cancel()
+            self._janitor = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            db = self._conn()
+            count, total = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM effects").fetchone()
+        return {
+            "files": count,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "max_age": self.max_age,
+            "pending_accesses": len(self._pending_access),
+            "evicted_files": self.evicted_files,
+            "evicted_bytes": self.evicted_bytes,
+        }
+
+
+effect_storage = EffectStorage()
@@ -0,0 +1,162 @@
+import copy
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from PIL import Image
+
+HASH_SIZE = 8
+
+
+def perceptual_hash(image_bytes: bytes) -> int:
+    """
+    64-bit difference hash (dHash) of a frame.
+
+    JPEGs are decoded in draft mode straight to a tiny grayscale image, so this
+    costs a small fraction of a full decode.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    image.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+    return dhash(image.convert("L"))
+
+
+def dhash(image: Image.Image) -> int:
+    """dHash of an already decoded grayscale image."""
+    pixels = list(image.resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR).getdata())
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | int(pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class _Entry:
+    __slots__ = ("result", "size", "expires_at")
+
+    def __init__(self, result: dict, size: int, expires_at: float):
+        self.result = result
+        self.size = size
+        self.expires_at = expires_at
+
+
+class FrameCache:
+    """
+    LRU cache of scene analyses keyed by (context, perceptual hash).
+
+    A lookup hits when a cached frame for the same context is within
+    `tolerance` bits of the new frame's hash, so a camera held still returns
+    the previous analysis instead of paying for another model round trip.
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None,
+                 ttl: float = None, tolerance: int = None, max_sessions: int = 1024):
+        self.max_entries = max_entries or int(os.getenv("SCENE_CACHE_MAX_ENTRIES", "512"))
+        self.max_bytes = max_bytes or int(os.getenv("SCENE_CACHE_MAX_BYTES", str(2 * 1024 * 1024)))
+        self.ttl = ttl or float(os.getenv("SCENE_CACHE_TTL", "15"))
+        self.tolerance = tolerance if tolerance is not None else int(os.getenv("SCENE_CACHE_TOLERANCE", "6"))
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._by_context = {}
+        self._bytes = 0
+        self._sessions = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, context: str, phash: int, session_id: Optional[str] = None) -> Optional[dict]:
+        now = time.monotonic()
+        with self._lock:
+            key = self._match(context, phash, now)
+            if key is None:
+                self.misses += 1
+                self._count_session(session_id, "misses")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self._count_session(session_id, "hits")
+            result = self._entries[key].result
+        return copy.deepcopy(result)
+
+    def put(self, context: str, phash: int, result: dict):
+        size = len(json.dumps(result, default=str)) + 200
+        with self._lock:
+            key = (context, phash)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(copy.deepcopy(result), size, time.monotonic() + self.ttl)
+            self._by_context.setdefault(context, set()).add(phash)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _match(self, context, phash, now):
+        if (context, phash) in self._entries:
+            candidates = [phash]
+        else:
+            candidates = [h for h in self._by_context.get(context, ()) if hamming_distance(h, phash) <= self.tolerance]
+        best = None
+        best_distance = None
+        for candidate in candidates:
+            key = (context, candidate)
+            if self._entries[key].expires_at <= now:
+                self._remove(key)
+                self.expirations += 1
+                continue
+            distance = hamming_distance(candidate, phash)
+            if best is None or distance < best_distance:
+                best, best_distance = key, distance
+        return best
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        hashes = self._by_context.get(key[0])
+        if hashes is not None:
+            hashes.discard(key[1])
+            if not hashes:
+                del self._by_context[key[0]]
+
+    def _count_session(self, session_id, field):
+        if not session_id:
+            return
+        counters = self._sessions.get(session_id)
+        if counters is None:
+            counters = self._sessions[session_id] = {"hits": 0, "misses": 0}
+            if len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        counters[field] += 1
+
+    def session_stats(self, session_id: str) -> dict:
+        with self._lock:
+            return dict(self._sessions.get(session_id, {"hits": 0, "misses": 0}))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "tracked_sessions": len(self._sessions),
+            }
+
+
+frame_cache = FrameCache()
@@ -0,0 +1,159 @@
+import asyncio
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from PIL import Image, ImageOps
+from services.metrics import IMAGE_BYTES, IMAGE_STAGE_SECONDS
+from services.tracing import span
+
+EXIF_ORIENTATION = 0x0112
+
+
+@dataclass
+class PreparedFrame:
+    """A camera frame ready to be attached to a model request."""
+    data: bytes
+    width: int
+    height: int
+    original_bytes: int
+    passthrough: bool
+    mime_type: str = "image/jpeg"
+    timings_ms: dict = field(default_factory=dict)
+
+
+class FramePreprocessor:
+    """
+    Shrinks camera frames before they are uploaded to Gemini.
+
+    Large JPEGs are decoded in draft mode (DCT scaling, so a 12 MP frame is
+    never fully decoded), rotated per EXIF, bounded to `max_edge` and
+    re-encoded. Frames that are already small JPEGs are passed through as-is.
+    """
+
+    def __init__(self, max_edge: int = None, quality: int = None,
+                 passthrough_bytes: int = None, workers: int = None):
+        self.max_edge = max_edge or int(os.getenv("FRAME_MAX_EDGE", "1024"))
+        self.quality = quality or int(os.getenv("FRAME_JPEG_QUALITY", "80"))
+        self.passthrough_bytes = passthrough_bytes or int(os.getenv("FRAME_PASSTHROUGH_BYTES", "250000"))
+        self.workers = workers or int(os.getenv("FRAME_PREPROCESS_WORKERS", "4"))
+        self._executor = None
+        self._lock = threading.Lock()
+        self._frames = 0
+        self._passthrough = 0
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._stage_totals_ms = {}
+        self._last_timings_ms = {}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="frame-prep")
+        return self._executor
+
+    async def run(self, fn, *args):
+        """Runs CPU-bound image work on the preprocessing pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), fn, *args)
+
+    async def prepare_async(self, image_bytes: bytes) -> PreparedFrame:
+        with span("decode", bytes_in=len(image_bytes)) as decode_span:
+            frame = await self.run(self.prepare, image_bytes)
+            decode_span.set(bytes_out=len(frame.data), passthrough=frame.passthrough)
+        return frame
+
+    def prepare(self, image_bytes: bytes) -> PreparedFrame:
+        timings = {}
+        started = last = time.perf_counter()
+
+        def mark(stage):
+            nonlocal last
+            now = time.perf_counter()
+            timings[stage] = round((now - last) * 1000, 3)
+            last = now
+
+        # Image.open only parses the header; nothing is decoded yet.
+        image = Image.open(io.BytesIO(image_bytes))
+        orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+        mark("open")
+
+        if (image.format == "JPEG" and orientation == 1
+                and max(image.size) <= self.max_edge
+                and len(image_bytes) <= self.passthrough_bytes):
+            timings["total"] = round((time.perf_counter() - started) * 1000, 3)
+            frame = PreparedFrame(
+                data=image_bytes,
+                width=image.width,
+                height=image.height,
+                original_bytes=len(image_bytes),
+                passthrough=True,
+                timings_ms=timings,
+            )
+            self._record(frame)
+            return frame
+
+        if image.format == "JPEG":
+            image.draft("RGB", (self.max_edge, self.max_edge))
+        image.load()
+        mark("decode")
+
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        mark("orient")
+
+        if max(image.size) > self.max_edge:
+            image.thumbnail((self.max_edge, self.max_edge), Image.BICUBIC)
+        mark("resize")
+
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=self.quality)
+        mark("encode")
+
+        timings["total"] = round((time.perf_counter() - started) * 1000, 3)
+        frame = PreparedFrame(
+            data=buffer.getvalue(),
+            width=image.width,
+            height=image.height,
+            original_bytes=len(image_bytes),
+            passthrough=False,
+            timings_ms=timings,
+        )
+        self._record(frame)
+        return frame
+
+    def _record(self, frame: PreparedFrame):
+        with self._lock:
+            self._frames += 1
+            self._passthrough += int(frame.passthrough)
+            self._bytes_in += frame.original_bytes
+            self._bytes_out += len(frame.data)
+            for stage, ms in frame.timings_ms.items():
+                total, count = self._stage_totals_ms.get(stage, (0.0, 0))
+                self._stage_totals_ms[stage] = (total + ms, count + 1)
+            self._last_timings_ms = frame.timings_ms
+        for stage, ms in frame.timings_ms.items():
+            IMAGE_STAGE_SECONDS.observe(ms / 1000, stage=stage)
+        IMAGE_BYTES.observe(frame.original_bytes, direction="in")
+        IMAGE_BYTES.observe(len(frame.data), direction="out")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_edge": self.max_edge,
+                "quality": self.quality,
+                "frames": self._frames,
+                "passthrough": self._passthrough,
+                "bytes_in": self._bytes_in,
+                "bytes_out": self._bytes_out,
+                "avg_stage_ms": {
+                    stage: round(total / count, 3)
+                    for stage, (total, count) in self._stage_totals_ms.items()
+                },
+                "last_timings_ms": dict(self._last_timings_ms),
+            }
+
+
+frame_preprocessor = FramePreprocessor()
@@ -0,0 +1,216 @@
+import asyncio
+import itertools
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from enum import Enum
+from typing import Optional
+from pydantic import BaseModel
+
+from services.logging_setup import get_logger
+from services.tracing import current_trace_id, trace_store
+
+logger = get_logger("job_queue")
+
+
+class JobState(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+TERMINAL_STATES = (JobState.SUCCEEDED, JobState.FAILED)
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    kind: str
+    state: JobState = JobState.QUEUED
+    priority: int
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    trace_id: Optional[str] = None
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at its depth limit or draining."""
+
+    def __init__(self, retry_after: int, message: str = "Generation queue is full"):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Job:
+    def __init__(self, status: JobStatus, factory):
+        self.status = status
+        self.factory = factory
+        self.changed = asyncio.Event()
+
+    def notify(self):
+        # Wake current watchers and give later ones a fresh event to wait on.
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class JobQueue:
+    """
+    Bounded priority queue of generation jobs run by a fixed pool of workers.
+
+    Lower `priority` values run first. Jobs are coroutine factories returning
+    the same dicts the synchronous endpoints return; a dict with an "error"
+    key marks the job failed. Finished jobs are kept for `retention` seconds
+    so clients can still fetch their result.
+    """
+
+    def __init__(self, workers: int = None, max_depth: int = None, retention: float = None,
+                 max_jobs: int = 10000):
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "4"))
+        self.max_depth = max_depth or int(os.getenv("JOB_QUEUE_MAX_DEPTH", "100"))
+        self.retention = retention or float(os.getenv("JOB_RETENTION", "600"))
+        self.max_jobs = max_jobs
+        self._queue = None
+        self._tasks = []
+        self._jobs = OrderedDict()
+        # Finished job ids in finishing order, so pruning never walks past live jobs.
+        self._finished = deque()
+        self._sequence = itertools.count()
+        self._running = 0
+        self.draining = False
+        self._avg_run_seconds = 5.0
+        self.submitted = 0
+        self.rejected = 0
+        self.succeeded = 0
+        self.failed = 0
+
+    def start(self):
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def stop(self, drain_timeout: float = 0):
+        """Stops the workers, first letting queued and running jobs finish for up to `drain_timeout` seconds."""
+        self.draining = True
+        if self._queue is not None and drain_timeout > 0:
+            try:
+                await asyncio.wait_for(self._queue.join(), drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Job queue drain timed out",
+                               extra={"queued": self._queue.qsize(), "running": self._running})
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def submit(self, kind: str, factory, priority: int = 5) -> JobStatus:
+        """Enqueues `factory` (a zero-argument coroutine function) and returns its status at once."""
+        if self._queue is None:
+            self.start()
+        if self.draining:
+            raise QueueFull(self._retry_after(), "Server is shutting down")
+        if self._queue.qsize() >= self.max_depth:
+            self.rejected += 1
+            raise QueueFull(self._retry_after())
+        self._prune()
+        # Workers run outside the request's context, so carry its trace id over
+        # and record the job as a second trace under the same id.
+        status = JobStatus(job_id=uuid.uuid4().hex, kind=kind, priority=priority, created_at=time.time(),
+                           trace_id=current_trace_id())
+        self._jobs[status.job_id] = _Job(status, factory)
+        self._queue.put_nowait((priority, next(self._sequence), status.job_id))
+        self.submitted += 1
+        return status
+
+    def get(self, job_id: str) -> Optional[JobStatus]:
+        job = self._jobs.get(job_id)
+        return job.status if job else None
+
+    async def watch(self, job_id: str):
+        """Yields the job's status now and after every change, ending at a terminal state."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+        while True:
+            changed = job.changed
+            yield job.status
+            if job.status.state in TERMINAL_STATES:
+                return
+            await changed.wait()
+
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            try:
+                if job is not None:
+                    await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: _Job):
+        status = job.status
+        status.state = JobState.RUNNING
+        status.started_at = time.time()
+        job.notify()
+        self._running += 1
+        trace, token = trace_store.start(f"job {status.kind}", status.trace_id)
+        trace.attrs["queued_ms"] = round((status.started_at - status.created_at) * 1000, 3)
+        try:
+            result = await job.factory()
+            if isinstance(result, dict) and "error" in result:
+                status.state = JobState.FAILED
+                status.error = str(result["error"])
+            else:
+                status.state = JobState.SUCCEEDED
+                status.result = result
+        except Exception as e:
+            status.state = JobState.FAILED
+            status.error = str(e)
+            logger.exception("Job failed", extra={"job_id": status.job_id, "kind": status.kind})
+        finally:
+            trace_store.finish(trace, token, job_id=status.job_id, state=status.state.value)
+            self._running -= 1
+            status.finished_at = time.time()
+            if status.state == JobState.SUCCEEDED:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            # Exponential moving average, used for Retry-After hints.
+            elapsed = status.finished_at - status.started_at
+            self._avg_run_seconds = 0.8 * self._avg_run_seconds + 0.2 * elapsed
+            job.factory = None
+            self._finished.append(status.job_id)
+            job.notify()
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        while self._finished:
+            status = self._jobs[self._finished[0]].status
+            if status.finished_at >= cutoff and len(self._jobs) <= self.max_jobs:
+                break
+            del self._jobs[self._finished.popleft()]
+
+    def _retry_after(self) -> int:
+        backlog = self._queue.qsize() + self._running
+        return max(1, int(backlog * self._avg_run_seconds / max(self.workers, 1)))
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "running": self._running,
+            "max_depth": self.max_depth,
+            "tracked_jobs": len(self._jobs),
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "avg_run_seconds": round(self._avg_run_seconds, 2),
+        }
+
+
+job_queue = JobQueue()
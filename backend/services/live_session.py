@@ -0,0 +1,99 @@
+import asyncio
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class LiveFrame:
+    """A frame received on a live guidance socket."""
+    data: bytes
+    context: str
+    mode: str
+    received_at: float
+
+
+class LatestFrameSlot:
+    """
+    Single-slot mailbox between the socket reader and the analysis loop.
+
+    Putting a frame while another is still waiting replaces it, so the
+    analyzer always works on the newest frame and stale ones are dropped
+    instead of queueing up behind a slow model call.
+    """
+
+    def __init__(self):
+        self._frame: Optional[LiveFrame] = None
+        self._event = asyncio.Event()
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame: LiveFrame):
+        self.received += 1
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = frame
+        self._event.set()
+
+    async def get(self) -> Optional[LiveFrame]:
+        """Waits for the next frame; returns None once the slot is closed."""
+        await self._event.wait()
+        self._event.clear()
+        frame, self._frame = self._frame, None
+        return None if self._closed else frame
+
+    def close(self):
+        self._closed = True
+        self._event.set()
+
+
+class LatencyTracker:
+    """Rolling window of receipt-to-push latencies across all live sessions."""
+
+    def __init__(self, window: int = 2048):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self.sessions_opened = 0
+        self.active_sessions = 0
+        self.frames_received = 0
+        self.frames_dropped = 0
+        self.results_sent = 0
+
+    def session_opened(self):
+        with self._lock:
+            self.sessions_opened += 1
+            self.active_sessions += 1
+
+    def session_closed(self, slot: LatestFrameSlot):
+        with self._lock:
+            self.active_sessions -= 1
+            self.frames_received += slot.received
+            self.frames_dropped += slot.dropped
+
+    def record(self, latency_ms: float):
+        with self._lock:
+            self.results_sent += 1
+            self._samples.append(latency_ms)
+
+    def stats(self) -> dict:
+        with self._lock:
+            samples = sorted(self._samples)
+            stats = {
+                "sessions_opened": self.sessions_opened,
+                "active_sessions": self.active_sessions,
+                "frames_received": self.frames_received,
+                "frames_dropped": self.frames_dropped,
+                "results_sent": self.results_sent,
+            }
+        if samples:
+            stats["latency_ms"] = {
+                "p50": round(samples[len(samples) // 2], 1),
+                "p95": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 1),
+                "max": round(samples[-1], 1),
+            }
+        return stats
+
+
+live_latency = LatencyTracker()
@@ -0,0 +1,112 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+from services.tracing import current_trace_id, trace_store
+
+# Attributes every LogRecord has; anything else was passed via `extra=` and is
+# emitted as a structured field.
+_RESERVED = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime", "trace_id"}
+
+_listener = None
+
+
+class TraceIdFilter(logging.Filter):
+    """Stamps records with the current trace id while still on the caller's context."""
+
+    def filter(self, record):
+        record.trace_id = current_trace_id()
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Resolve the message and traceback now (args may not be thread-safe
+        # to format later) but keep the record's structured fields.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, trace_id and any `extra` fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str = None):
+    """
+    Routes the "app" logger through a QueueHandler so request handlers only
+    enqueue records; a QueueListener thread formats and writes them to stderr.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    records = queue.SimpleQueue()
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter())
+    handlers = [stream]
+    trace_path = os.getenv("TRACE_EXPORT_PATH")
+    if trace_path:
+        traces = logging.FileHandler(trace_path)
+        traces.setFormatter(JsonFormatter())
+        traces.addFilter(lambda record: record.name == "app.traces")
+        stream.addFilter(lambda record: record.name != "app.traces")
+        handlers.append(traces)
+        trace_store.exporters.append(_export_trace)
+        # Exported traces are data, not diagnostics: keep them regardless of LOG_LEVEL.
+        logging.getLogger("app.traces").setLevel(logging.INFO)
+
+    queue_handler = _QueueHandler(records)
+    queue_handler.addFilter(TraceIdFilter())
+    root = logging.getLogger("app")
+    root.setLevel(level)
+    root.handlers = [queue_handler]
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Flushes queued records and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"app.{name}")
+
+
+def _export_trace(trace):
+    # Goes through the same queue, so the file write happens on the listener thread.
+    logging.getLogger("app.traces").info("trace", extra={"trace": trace.to_dict()})
@@ -0,0 +1,236 @@
+import asyncio
+import threading
+import time
+
+# Latency buckets in seconds, from cache hits to slow Imagen generations.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value) -> list:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def _render_value(self, key, value) -> list:
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', bound))} {cumulative}")
+        lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', '+Inf'))} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()) -> Gauge:
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("route", "method", "status"))
+REQUESTS_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled")
+UPLOAD_BYTES = registry.histogram(
+    "http_upload_bytes", "Request body size by route", ("route",), SIZE_BUCKETS)
+MODEL_CALL_LATENCY = registry.histogram(
+    "model_call_duration_seconds", "Upstream model call latency", ("model", "method"))
+MODEL_CALL_ERRORS = registry.counter(
+    "model_call_errors_total", "Upstream model call failures", ("model", "method", "error"))
+MODEL_CALLS_IN_FLIGHT = registry.gauge(
+    "model_calls_in_flight", "Upstream model calls currently awaiting a response", ("model",))
+MODEL_TIME_TO_FIRST_TOKEN = registry.histogram(
+    "model_time_to_first_token_seconds", "Delay from a streaming call's start to its first chunk", ("model",))
+IMAGE_STAGE_SECONDS = registry.histogram(
+    "image_preprocess_stage_seconds", "Frame decode/resize/encode time by stage", ("stage",))
+IMAGE_BYTES = registry.histogram(
+    "image_preprocess_bytes", "Frame size before and after preprocessing", ("direction",), SIZE_BUCKETS)
+SCENE_CACHE_LOOKUPS = registry.counter(
+    "scene_cache_lookups_total", "Scene analysis cache lookups", ("result",))
+SCENE_GATE_DECISIONS = registry.counter(
+    "scene_gate_decisions_total", "Local scene-quality gate outcomes (escalation reason or local/reuse)", ("decision",))
+EVENT_LOOP_LAG = registry.histogram(
+    "event_loop_lag_seconds", "Delay between a scheduled wake-up and when the loop ran it",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+EVENT_LOOP_LAG_LAST = registry.gauge(
+    "event_loop_lag_last_seconds", "Most recent event loop lag sample")
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route latency, upload size and in-flight requests.
+
+    Routes are labelled by their template (e.g. `/jobs/{job_id}`), not the raw
+    path, to keep label cardinality bounded; mounts are labelled by prefix.
+    """
+
+    def __init__(self, app, mount_prefixes=("/static",)):
+        self.app = app
+        self.mount_prefixes = mount_prefixes
+
+    def _route_label(self, scope) -> str:
+        route = scope.get("route")
+        if route is not None and getattr(route, "path", None):
+            return route.path
+        path = scope.get("path", "")
+        for prefix in self.mount_prefixes:
+            if path.startswith(prefix + "/"):
+                return prefix
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = self._route_label(scope)
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - started, route=route, method=scope["method"], status=status["code"])
+            for name, value in scope.get("headers", ()):
+                if name == b"content-length":
+                    UPLOAD_BYTES.observe(int(value), route=route)
+                    break
+
+
+async def monitor_event_loop(interval: float = 0.5):
+    """Samples event-loop lag: how late a sleep(interval) wakes up."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - started - interval)
+        EVENT_LOOP_LAG.observe(lag)
+        EVENT_LOOP_LAG_LAST.set(lag)
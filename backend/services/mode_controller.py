@@ -1,6 +1,23 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from enum import Enum
+from typing import Optional
+
 from pydantic import BaseModel
 
+from services.logging_setup import get_logger
+
+logger = get_logger("mode")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Clients that don't send a session id share this one (the old global behaviour).
+DEFAULT_SESSION = "default"
+
+
 class AppMode(str, Enum):
     PHOTOGRAPHY = "photography"
     VIDEOGRAPHY = "videography"
@@ -10,22 +27,164 @@ class ModeState(BaseModel):
     is_recording: bool = False
     active_features: list[str] = []
 
+
+def features_for(mode: AppMode) -> list[str]:
+    if mode == AppMode.PHOTOGRAPHY:
+        return ["scene_analysis", "composition_guide", "shutter_control"]
+    return ["video_stabilization", "audio_monitoring", "continuous_focus"]
+
+
+def default_state() -> ModeState:
+    return ModeState(current_mode=AppMode.PHOTOGRAPHY, active_features=features_for(AppMode.PHOTOGRAPHY))
+
+
+class MemoryModeStore:
+    """Per-process dict of session states with idle expiry and an LRU cap."""
+
+    name = "memory"
+
+    def __init__(self, ttl: float, max_sessions: int):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._states = OrderedDict()  # session_id -> (ModeState, last_used)
+        self.evicted = 0
+
+    def get(self, session_id: str) -> Optional[ModeState]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._states.get(session_id)
+            if entry is None:
+                return None
+            if now - entry[1] > self.ttl:
+                del self._states[session_id]
+                self.evicted += 1
+                return None
+            self._states[session_id] = (entry[0], now)
+            self._states.move_to_end(session_id)
+            return entry[0].model_copy(deep=True)
+
+    def put(self, session_id: str, state: ModeState):
+        now = time.monotonic()
+        with self._lock:
+            self._states[session_id] = (state.model_copy(deep=True), now)
+            self._states.move_to_end(session_id)
+            self._evict(now)
+
+    def _evict(self, now: float):
+        while self._states:
+            oldest_id, (_, last_used) = next(iter(self._states.items()))
+            if len(self._states) <= self.max_sessions and now - last_used <= self.ttl:
+                break
+            del self._states[oldest_id]
+            self.evicted += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"sessions": len(self._states), "evicted": self.evicted}
+
+
+class SQLiteModeStore:
+    """
+    Session states in a local SQLite file, shared by every worker process.
+
+    WAL mode lets readers in other workers proceed while one writes. Lookups
+    go through the primary key; idle rows are deleted at most once every
+    `sweep_interval` seconds by whichever worker writes next.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, ttl: float, max_sessions: int, sweep_interval: float = 30.0):
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        # Refreshing last_used on every read would turn reads into writes.
+        self.touch_interval = min(60.0, ttl / 10)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS mode_state ("
+            " session_id TEXT PRIMARY KEY, state TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS mode_state_last_used ON mode_state (last_used)")
+        self._last_sweep = 0.0
+        self.evicted = 0
+
+    def get(self, session_id: str) -> Optional[ModeState]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, last_used FROM mode_state WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                return None
+            if now - row[1] > self.touch_interval:
+                self._conn.execute("UPDATE mode_state SET last_used = ? WHERE session_id = ?", (now, session_id))
+        return ModeState.model_validate_json(row[0])
+
+    def put(self, session_id: str, state: ModeState):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO mode_state (session_id, state, last_used) VALUES (?, ?, ?)"
+                " ON CONFLICT(session_id) DO UPDATE SET state = excluded.state, last_used = excluded.last_used",
+                (session_id, state.model_dump_json(), now),
+            )
+            if now - self._last_sweep > self.sweep_interval:
+                self._last_sweep = now
+                self._sweep(now)
+
+    def _sweep(self, now: float):
+        deleted = self._conn.execute("DELETE FROM mode_state WHERE last_used < ?", (now - self.ttl,)).rowcount
+        overflow = self._conn.execute("SELECT COUNT(*) FROM mode_state").fetchone()[0] - self.max_sessions
+        if overflow > 0:
+            deleted += self._conn.execute(
+                "DELETE FROM mode_state WHERE session_id IN"
+                " (SELECT session_id FROM mode_state ORDER BY last_used LIMIT ?)", (overflow,)
+            ).rowcount
+        self.evicted += deleted
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = self._conn.execute("SELECT COUNT(*) FROM mode_state").fetchone()[0]
+        return {"sessions": sessions, "evicted": self.evicted, "path": self.path}
+
+
+def create_store():
+    """Backend from `MODE_STORE`: "memory" (default, per process) or "sqlite" (shared across workers)."""
+    ttl = float(os.getenv("MODE_SESSION_TTL", "3600"))
+    max_sessions = int(os.getenv("MODE_SESSION_MAX", "10000"))
+    backend = os.getenv("MODE_STORE", "memory").lower()
+    if backend == "sqlite":
+        # Anchored to the backend directory, so workers started from anywhere share one file.
+        path = os.getenv("MODE_STORE_PATH", os.path.join(BACKEND_DIR, "mode_state.db"))
+        logger.info("Mode state stored in SQLite", extra={"path": path})
+        return SQLiteModeStore(path, ttl, max_sessions)
+    if backend != "memory":
+        logger.warning("Unknown MODE_STORE, using memory", extra={"backend": backend})
+    return MemoryModeStore(ttl, max_sessions)
+
+
 class ModeController:
-    def __init__(self):
-        self._state = ModeState(current_mode=AppMode.PHOTOGRAPHY)
-
-    def set_mode(self, mode: AppMode) -> ModeState:
-        self._state.current_mode = mode
-        self._update_features()
-        return self._state
-
-    def get_state(self) -> ModeState:
-        return self._state
-
-    def _update_features(self):
-        if self._state.current_mode == AppMode.PHOTOGRAPHY:
-            self._state.active_features = ["scene_analysis", "composition_guide", "shutter_control"]
-        else:
-            self._state.active_features = ["video_stabilization", "audio_monitoring", "continuous_focus"]
+    def __init__(self, store=None):
+        self.store = store or create_store()
+
+    def set_mode(self, mode: AppMode, session_id: Optional[str] = None) -> ModeState:
+        session_id = session_id or DEFAULT_SESSION
+        state = self.store.get(session_id) or default_state()
+        state.current_mode = mode
+        state.active_features = features_for(mode)
+        self.store.put(session_id, state)
+        return state
+
+    def get_state(self, session_id: Optional[str] = None) -> ModeState:
+        return self.store.get(session_id or DEFAULT_SESSION) or default_state()
+
+    def stats(self) -> dict:
+        return {"backend": self.store.name, **self.store.stats()}
 
 mode_controller = ModeController()
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import time
+
+from services.cpu_pool import cpu_pool
+from services.effect_cache import EffectResultCache
+from services.effect_storage import effect_storage
+from services.logging_setup import get_logger
+from services.overlay_engine import LOOP_FPS, LOOP_SIZES, OVERLAY_LOOP_SECONDS, loop_size, render_loop
+
+logger = get_logger("overlay_loops")
+
+# Effects rendered at the default size on startup. Off by default: each render
+# holds a CPU pool worker for a few seconds while real requests wait behind it.
+OVERLAY_PRECOMPUTE = [e.strip() for e in os.getenv("OVERLAY_PRECOMPUTE", "").split(",") if e.strip()]
+
+
+class OverlayLoopCache:
+    """
+    Rendered overlay loops by (effect, width, height, fps).
+
+    A loop is deterministic for its key, so it is rendered once and every
+    later request gets the stored URL. Concurrent requests for a loop that
+    is still rendering share that render. Entries whose files were evicted
+    from the effect store are rendered again.
+    """
+
+    def __init__(self):
+        self._results = EffectResultCache(ttl=float(os.getenv("OVERLAY_LOOP_TTL", "86400")), variants=1,
+                                          max_keys=int(os.getenv("OVERLAY_LOOP_MAX_KEYS", "64")))
+        self.renders = 0
+        self.render_ms = 0.0
+        self.bytes_rendered = 0
+
+    async def get(self, effect: str, width: int = None, height: int = None, fps: int = None) -> dict:
+        """The stored loop for `effect` at (roughly) the requested size, rendering it on a miss."""
+        width, height, fps = loop_size(width, height, fps)
+        config = {"width": width, "height": height, "fps": fps, "seconds": OVERLAY_LOOP_SECONDS}
+        return await self._results.get_or_create(
+            "overlay_engine", effect, config,
+            lambda: self._render(effect, width, height, fps),
+            is_valid=lambda cached: effect_storage.exists(cached["veo_overlay_stream"])
+        )
+
+    async def _render(self, effect: str, width: int, height: int, fps: int) -> dict:
+        started = time.perf_counter()
+        loop = await cpu_pool.run(render_loop, effect, width, height, fps)
+        # APNG is the original; the animated WebP is stored as its "webp" variant.
+        url = await effect_storage.save_data(loop.apng, "video_fx", "png", variants={"webp": loop.webp})
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.renders += 1
+        self.render_ms += elapsed_ms
+        self.bytes_rendered += len(loop.apng) + len(loop.webp)
+        logger.info("Overlay loop rendered", extra={"effect_type": effect, "size": f"{width}x{height}", "fps": fps,
+                                                    "ms": round(elapsed_ms, 1), "stages_ms": loop.timings_ms})
+        return {"effect_type": effect, "veo_overlay_stream": url, "metadata": loop.metadata()}
+
+    async def precompute(self, effects: list = None):
+        """
+        Renders the default-size loops one after another. Each render still
+        occupies one CPU pool worker while it runs, so on a small pool this
+        competes with the first requests; that is why it is opt-in.
+        """
+        for effect in OVERLAY_PRECOMPUTE if effects is None else effects:
+            try:
+                await self.get(effect)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Overlay loop precompute failed", extra={"effect_type": effect, "error": str(e)})
+
+    def stats(self) -> dict:
+        return {
+            **self._results.stats(),
+            "renders": self.renders,
+            "avg_render_ms": round(self.render_ms / self.renders, 1) if self.renders else 0.0,
+            "bytes_rendered": self.bytes_rendered,
+            "default_size": dict(zip(("width", "height", "fps"), loop_size())),
+            "sizes": [f"{w}x{h}" for w, h in LOOP_SIZES],
+            "fps_steps": list(LOOP_FPS),
+            "loop_seconds": OVERLAY_LOOP_SECONDS,
+        }
+
+
+overlay_loops = OverlayLoopCache()
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+
+
+class RateLimitExceeded(Exception):
+    """Raised instead of calling upstream when a model's quota would be exceeded."""
+
+    def __init__(self, model_id: str, retry_after: float, reason: str = "rate limit"):
+        super().__init__(f"{model_id}: {reason}, retry after {retry_after:.1f}s")
+        self.model_id = model_id
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `per_minute / 60` per second."""
+
+    def __init__(self, per_minute: float, burst: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def debit(self, amount: float):
+        """Adjusts for actual usage; the balance may go negative."""
+        self.tokens -= amount
+
+    def block(self, seconds: float, now: float):
+        self.tokens = min(self.tokens, 0.0)
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class ModelLimiter:
+    """Requests-per-minute and tokens-per-minute admission for one model."""
+
+    def __init__(self, model_id: str, rpm: float, tpm: float, max_wait: float, max_waiters: int):
+        self.model_id = model_id
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_wait = max_wait
+        self.max_waiters = max_waiters
+        self.waiters = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.upstream_429 = 0
+        self._lock = threading.Lock()
+
+    def _try_admit(self, tokens: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            wait = 0.0
+            if self.requests:
+                wait = max(wait, self.requests.wait_time(1, now))
+            if self.tokens:
+                wait = max(wait, self.tokens.wait_time(tokens, now))
+            if wait == 0.0:
+                if self.requests:
+                    self.requests.take(1)
+                if self.tokens:
+                    self.tokens.take(tokens)
+                self.admitted += 1
+            return wait
+
+    async def acquire(self, tokens: float):
+        """
+        Admits one call costing `tokens`, waiting briefly if the bucket refills
+        soon. Fails fast when the wait would exceed `max_wait` or too many
+        callers are already waiting.
+        """
+        waited = False
+        while True:
+            wait = self._try_admit(tokens)
+            if wait == 0.0:
+                return
+            if wait > self.max_wait or (not waited and self.waiters >= self.max_waiters):
+                self.rejected += 1
+                raise RateLimitExceeded(self.model_id, wait)
+            self.waiters += 1
+            waited = True
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self.waiters -= 1
+
+    def record_usage(self, estimated: float, actual: float):
+        if self.tokens and actual:
+            with self._lock:
+                self.tokens.debit(actual - estimated)
+
+    def block(self, seconds: float):
+        now = time.monotonic()
+        with self._lock:
+            self.upstream_429 += 1
+            for bucket in (self.requests, self.tokens):
+                if bucket:
+                    bucket.block(seconds, now)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rpm": self.requests.rate * 60 if self.requests else None,
+                "tpm": self.tokens.rate * 60 if self.tokens else None,
+                "request_tokens": round(self.requests.tokens, 1) if self.requests else None,
+                "token_tokens": round(self.tokens.tokens, 1) if self.tokens else None,
+                "waiters": self.waiters,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "upstream_429": self.upstream_429,
+            }
+
+
+class RateLimiter:
+    """
+    Per-model limiters configured from the environment.
+
+    `MODEL_RATE_LIMITS` is a JSON object such as
+    {"gemini-2.0-flash": {"rpm": 1000, "tpm": 1000000}, "imagen-3.0-generate-001": {"rpm": 20}};
+    models not listed use `DEFAULT_MODEL_RPM` / `DEFAULT_MODEL_TPM` (0 disables a limit).
+    """
+
+    def __init__(self):
+        self.limits = json.loads(os.getenv("MODEL_RATE_LIMITS", "{}"))
+        self.default_rpm = float(os.getenv("DEFAULT_MODEL_RPM", "60"))
+        self.default_tpm = float(os.getenv("DEFAULT_MODEL_TPM", "0"))
+        self.max_wait = float(os.getenv("RATE_LIMIT_MAX_WAIT", "2.0"))
+        self.max_waiters = int(os.getenv("RATE_LIMIT_MAX_WAITERS", "32"))
+        self.upstream_retry_after = float(os.getenv("UPSTREAM_429_BACKOFF", "10"))
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, model_id: str) -> ModelLimiter:
+        limiter = self._limiters.get(model_id)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(model_id)
+                if limiter is None:
+                    config = self.limits.get(model_id, {})
+                    limiter = ModelLimiter(
+                        model_id,
+                        rpm=config.get("rpm", self.default_rpm),
+                        tpm=config.get("tpm", self.default_tpm),
+                        max_wait=self.max_wait,
+                        max_waiters=self.max_waiters,
+                    )
+                    self._limiters[model_id] = limiter
+        return limiter
+
+    async def acquire(self, model_id: str, tokens: float):
+        await self.limiter(model_id).acquire(tokens)
+
+    def record_usage(self, model_id: str, estimated: float, actual: float):
+        self.limiter(model_id).record_usage(estimated, actual)
+
+    def upstream_rejected(self, model_id: str, retry_after: float = None) -> RateLimitExceeded:
+        """Blocks the model after an upstream 429 and returns the error to raise."""
+        retry_after = retry_after or self.upstream_retry_after
+        self.limiter(model_id).block(retry_after)
+        return RateLimitExceeded(model_id, retry_after, "upstream quota exhausted")
+
+    def stats(self) -> dict:
+        return {model_id: limiter.stats() for model_id, limiter in self._limiters.items()}
+
+
+def retry_after_header(exc: RateLimitExceeded) -> str:
+    return str(max(1, math.ceil(exc.retry_after)))
+
+
+rate_limiter = RateLimiter()
@@ -1,16 +1,33 @@
 import os
-import random
 from typing import Optional
-import base64
 try:
-    import google.generativeai as genai
+    from google import genai
+    from google.genai import types
 except ImportError:
     genai = None
 except Exception:
     genai = None
-from PIL import Image
-import io
-import json
+from agents.base_agent import invoke_model
+from agents.registry import client_registry
+from agents.generation_profiles import SCENE_PROFILE, parse_structured
+from services.frame_preprocessor import frame_preprocessor
+from services.frame_cache import frame_cache
+from services.scene_quality import measure, measure_timings, scene_gate, scene_quality
+from services.rate_limiter import RateLimitExceeded
+from services.metrics import SCENE_CACHE_LOOKUPS, SCENE_GATE_DECISIONS
+from services.logging_setup import get_logger
+from services.tracing import span
+
+logger = get_logger("scene_analyzer")
+
+# Returned when the frame cannot be decoded and no model answer is available.
+UNREADABLE_FRAME = {
+    "composition_score": 1,
+    "lighting": "Poor",
+    "suggestion": "Could not read the camera frame. Try again.",
+    "is_ready_to_shoot": False,
+    "details": {"subject_position": "", "background_quality": ""},
+}
 
 class SceneAnalyzer:
     """
@@ -19,20 +36,30 @@ class SceneAnalyzer:
     
     def __init__(self):
         self.api_key = os.getenv("GEMINI_API_KEY")
-        if self.api_key:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
+        self.model_id = os.getenv("SCENE_MODEL", 'gemini-1.5-flash')
+        self.client = None
+        if self.api_key and genai:
+            self.client = client_registry.get_client(self.api_key)
+            client_registry.register_model(self.api_key, self.model_id)
         else:
-            print("Warning: GEMINI_API_KEY not found, using mock responses")
-            self.model = None
+            logger.warning("GEMINI_API_KEY not found, using local scene analysis only")
     
-    async def analyze_scene(self, image_bytes: bytes, context: str) -> dict:
+    async def analyze_scene(self, image_bytes: bytes, context: str, session_id: Optional[str] = None) -> dict:
         """
         Analyze a camera frame for photography guidance.
         
+        Every frame is first scored locally by `scene_quality` in a few
+        milliseconds. `scene_gate` then decides whether Gemini is worth asking:
+        unchanged scenes reuse the session's last model answer and unusable
+        frames get the local answer. Near-duplicate frames (same context,
+        perceptual hash within tolerance) are answered from `frame_cache`.
+        Without a client, or if the model call fails, the local answer is
+        returned.
+        
         Args:
             image_bytes: JPEG image data
             context: Photography context (e.g., "Professional Profile", "Wedding")
+            session_id: Optional client session, used for per-session cache counters
         
         Returns:
             {
@@ -47,104 +74,90 @@ class SceneAnalyzer:
             }
         """
         
-        if self.model:
-            try:
-                # Use real Gemini API
-                image = Image.open(io.BytesIO(image_bytes))
-                
-                prompt = f"""Analyze this photo for {context} photography.
+        try:
+            with span("local_quality") as local_span:
+                metrics = await frame_preprocessor.run(measure, image_bytes)
+                local = scene_quality.score(metrics, context)
+                local_span.set(score=local["composition_score"], ms=metrics.timings_ms.get("total"))
+        except Exception as e:
+            # Undecodable upload: nothing local to go on, let the model try.
+            logger.warning("Local scene analysis failed", extra={"error": str(e)})
+            metrics = local = None
+        if metrics is not None:
+            measure_timings.record(metrics)
+
+        if not self.client:
+            SCENE_GATE_DECISIONS.inc(decision="no_client")
+            return local or dict(UNREADABLE_FRAME)
+
+        gate_key = f"{session_id or 'anonymous'}:{context}"
+        if local is not None:
+            reason, answer = scene_gate.check(gate_key, metrics, local)
+            if answer is not None:
+                SCENE_GATE_DECISIONS.inc(decision="local" if answer is local else "reuse")
+                return answer
+            SCENE_GATE_DECISIONS.inc(decision=reason)
+
+            # dHash ignores brightness and focus, so only trust the shared
+            # cache when the gate did not just see the frame change.
+            if reason in ("first_frame", "stale"):
+                cached = frame_cache.get(context, metrics.phash, session_id)
+                SCENE_CACHE_LOOKUPS.inc(result="miss" if cached is None else "hit")
+                if cached is not None:
+                    scene_gate.record(gate_key, metrics, local, cached)
+                    return cached
 
-Provide a JSON response with:
+        try:
+            # Use real Gemini API
+            frame = await frame_preprocessor.prepare_async(image_bytes)
+            image = types.Part.from_bytes(data=frame.data, mime_type=frame.mime_type)
+
+            prompt = f"""Analyze this photo for {context} photography.
+
+Fill in:
 1. composition_score: integer from 1-10
 2. lighting: one of ["Poor", "Fair", "Good", "Excellent"]
 3. suggestion: one specific, actionable tip to improve the shot (max 50 words)
-4. subject_position: brief description of subject positioning
-5. background_quality: brief description of background
+4. is_ready_to_shoot: true if the shot can be taken as is
+5. subject_position: brief description of subject positioning
+6. background_quality: brief description of background
 
-Be concise and professional. Return ONLY valid JSON.
+Be concise and professional."""
 
-Example:
-{{
-  "composition_score": 8,
-  "lighting": "Good",
-  "suggestion": "Move slightly left to better align with rule of thirds",
-  "subject_position": "Well-centered",
-  "background_quality": "Clean and uncluttered"
-}}"""
+            response = await invoke_model(
+                self.client,
+                "generate_content",
+                model=self.model_id,
+                contents=[prompt, image],
+                config=SCENE_PROFILE.config(),
+                timeout=SCENE_PROFILE.timeout,
+            )
 
-                response = self.model.generate_content([prompt, image])
-                
-                # Parse JSON from response
-                response_text = response.text.strip()
-                # Remove markdown code blocks if present
-                if response_text.startswith("```json"):
-                    response_text = response_text[7:]
-                if response_text.startswith("```"):
-                    response_text = response_text[3:]
-                if response_text.endswith("```"):
-                    response_text = response_text[:-3]
-                response_text = response_text.strip()
-                
-                data = json.loads(response_text)
-                
-                return {
-                    "composition_score": data.get("composition_score", 5),
-                    "lighting": data.get("lighting", "Fair"),
-                    "suggestion": data.get("suggestion", "Keep practicing!"),
-                    "is_ready_to_shoot": data.get("composition_score", 5) >= 7,
-                    "details": {
-                        "subject_position": data.get("subject_position", ""),
-                        "background_quality": data.get("background_quality", "")
-                    }
-                }
-            except Exception as e:
-                print(f"Gemini API error: {e}")
-                # Fall through to mock response
-        
-        # Mock responses for testing (fallback)
-        mock_responses = [
-            {
-                "composition_score": 8,
-                "lighting": "Good",
-                "suggestion": "Subject is well-positioned. Try tilting your head slightly for a more dynamic look.",
-                "is_ready_to_shoot": True,
-                "details": {
-                    "subject_position": "Center-aligned, following rule of thirds",
-                    "background_quality": "Clean with good depth of field"
-                }
-            },
-            {
-                "composition_score": 6,
-                "lighting": "Fair",
-                "suggestion": "Move closer to the window for better natural light.",
-                "is_ready_to_shoot": False,
-                "details": {
-                    "subject_position": "Slightly off-center",
-                    "background_quality": "Cluttered, consider changing angle"
-                }
-            },
-            {
-                "composition_score": 9,
-                "lighting": "Excellent",
-                "suggestion": "Perfect lighting and composition! Ready to shoot.",
-                "is_ready_to_shoot": True,
-                "details": {
-                    "subject_position": "Excellent positioning with natural framing",
-                    "background_quality": "Professional quality"
-                }
-            },
-            {
-                "composition_score": 5,
-                "lighting": "Poor",
-                "suggestion": "Lighting is too harsh. Move to a shaded area or adjust camera position.",
-                "is_ready_to_shoot": False,
+            # JSON mode + schema: validate directly, no fence stripping
+            data = parse_structured(SCENE_PROFILE, response)
+            if data is None:
+                raise ValueError("Unparseable scene analysis")
+
+            result = {
+                "composition_score": data.composition_score,
+                "lighting": data.lighting,
+                "suggestion": data.suggestion,
+                "is_ready_to_shoot": data.is_ready_to_shoot,
                 "details": {
-                    "subject_position": "Acceptable but could be improved",
-                    "background_quality": "Backlit, causing silhouette effect"
+                    "subject_position": data.subject_position,
+                    "background_quality": data.background_quality
                 }
             }
-        ]
-        
-        return random.choice(mock_responses)
+            if local is not None:
+                frame_cache.put(context, metrics.phash, result)
+                scene_gate.record(gate_key, metrics, local, result)
+            return result
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            logger.error("Gemini API error", extra={"context": context, "error": str(e)})
+
+        # Model unavailable: the local analysis is still a real answer.
+        return local or dict(UNREADABLE_FRAME)
 
 scene_analyzer = SceneAnalyzer()
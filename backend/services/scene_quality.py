@@ -0,0 +1,338 @@
+import io
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from services.frame_cache import dhash
+
+# Longest edge of the grayscale image the metrics are computed on. Small
+# enough for a few-millisecond pass, large enough to see focus and edges.
+ANALYSIS_EDGE = 256
+# Columns of the coarse grid used for saliency.
+SALIENCY_GRID = 32
+THIRDS_POINTS = ((1 / 3, 1 / 3), (2 / 3, 1 / 3), (1 / 3, 2 / 3), (2 / 3, 2 / 3))
+
+
+@dataclass
+class SceneMetrics:
+    """Local measurements of one frame; all ratios are in 0..1."""
+    exposure: float
+    dark_clip: float
+    bright_clip: float
+    contrast: float
+    sharpness: float
+    tilt_degrees: Optional[float]
+    subject_x: float
+    subject_y: float
+    thirds_distance: float
+    clutter: float
+    phash: int = 0
+    timings_ms: dict = field(default_factory=dict)
+
+
+def _quantile(values: np.ndarray, q: float) -> float:
+    """q-quantile by partial sort (much cheaper than np.percentile)."""
+    flat = values.ravel()
+    k = min(flat.size - 1, int(q * flat.size))
+    return float(np.partition(flat, k)[k])
+
+
+def _decode(image_bytes: bytes) -> Image.Image:
+    image = Image.open(io.BytesIO(image_bytes))
+    # JPEG draft mode lets the decoder skip most of the IDCT work.
+    image.draft("RGB", (ANALYSIS_EDGE, ANALYSIS_EDGE))
+    image = ImageOps.exif_transpose(image.convert("RGB"))
+    factor = max(image.size) // ANALYSIS_EDGE
+    return image.reduce(factor) if factor > 1 else image
+
+
+def measure(image_bytes: bytes) -> SceneMetrics:
+    """
+    Exposure, focus, horizon tilt and subject placement of a frame (CPU-bound).
+
+    The frame is decoded once; its perceptual hash for `frame_cache` is taken
+    from the same decode.
+    """
+    timings = {}
+    started = last = time.perf_counter()
+
+    def mark(stage):
+        nonlocal last
+        now = time.perf_counter()
+        timings[stage] = round((now - last) * 1000, 3)
+        last = now
+
+    image = _decode(image_bytes)
+    gray = image.convert("L")
+    phash = dhash(gray)
+    lum = np.asarray(gray, dtype=np.float32) * (1 / 255.0)
+    mark("decode")
+
+    # Exposure from the luminance histogram.
+    hist = np.asarray(gray.histogram(), dtype=np.float64) / lum.size
+    levels = np.arange(256) / 255.0
+    exposure = float((hist * levels).sum())
+    contrast = float(math.sqrt(max(0.0, (hist * (levels - exposure) ** 2).sum())))
+    dark_clip = float(hist[:6].sum())
+    bright_clip = float(hist[250:].sum())
+    mark("histogram")
+
+    # Focus: variance of the 4-neighbour Laplacian.
+    center = lum[1:-1, 1:-1]
+    laplacian = lum[:-2, 1:-1] + lum[2:, 1:-1] + lum[1:-1, :-2] + lum[1:-1, 2:] - 4 * center
+    sharpness = float(laplacian.var())
+    mark("sharpness")
+
+    # Horizon tilt: dominant direction of strong near-horizontal edges,
+    # averaged as doubled angles so the +/-90 degree wrap-around cancels out.
+    gx = lum[1:-1, 2:] - lum[1:-1, :-2]
+    gy = lum[2:, 1:-1] - lum[:-2, 1:-1]
+    magnitude = np.abs(gx) + np.abs(gy)
+    strong = magnitude > max(_quantile(magnitude, 0.9), 0.04)
+    sx, sy, weights = gx[strong], gy[strong], magnitude[strong]
+    # Near-horizontal lines have mostly vertical gradients.
+    horizontal = np.abs(sy) > 2.75 * np.abs(sx)
+    tilt = None
+    if horizontal.sum() > 0.002 * magnitude.size:
+        hx, hy, hw = sx[horizontal], sy[horizontal], weights[horizontal]
+        line_angle = np.arctan2(hx, hy)  # 0 for a level edge, either polarity
+        line_angle = (line_angle + np.pi / 2) % np.pi - np.pi / 2
+        tilt = float(np.degrees(np.arctan2((hw * np.sin(2 * line_angle)).sum(),
+                                           (hw * np.cos(2 * line_angle)).sum()) / 2))
+    mark("tilt")
+
+    # Saliency on a coarse grid: colours that are rare in the frame (a subject
+    # against sky, wall or table) plus local edge energy; the subject is the
+    # weighted centroid of the most salient cells.
+    cols = SALIENCY_GRID
+    rows = max(1, round(cols * image.height / image.width))
+    grid = np.asarray(image.resize((cols, rows), Image.BOX), dtype=np.int32)
+    bins = (grid[..., 0] >> 6) * 16 + (grid[..., 1] >> 6) * 4 + (grid[..., 2] >> 6)
+    frequency = np.bincount(bins.ravel(), minlength=64)[bins] / bins.size
+    rarity = -np.log(frequency)
+    edges = np.asarray(Image.fromarray((strong * 255).astype(np.uint8)).resize((cols, rows), Image.BOX),
+                       dtype=np.float32) / 255.0
+    saliency = rarity / (rarity.max() + 1e-6) + 0.5 * edges / (edges.max() + 1e-6)
+    top = saliency >= _quantile(saliency, 0.85)
+    ys, xs = np.nonzero(top)
+    w = saliency[top]
+    if w.sum() > 0:
+        subject_x = float(((xs + 0.5) * w).sum() / w.sum() / cols)
+        subject_y = float(((ys + 0.5) * w).sum() / w.sum() / rows)
+    else:
+        # A flat frame (e.g. lens covered) has no salient cell.
+        subject_x = subject_y = 0.5
+    thirds_distance = min(math.hypot(subject_x - x, subject_y - y) for x, y in THIRDS_POINTS)
+    # Busy backgrounds: strong edges outside the salient region.
+    clutter = float(edges[~top].mean()) if (~top).any() else 0.0
+    mark("saliency")
+    timings["total"] = round((time.perf_counter() - started) * 1000, 3)
+
+    return SceneMetrics(
+        exposure=round(exposure, 4), dark_clip=round(dark_clip, 4), bright_clip=round(bright_clip, 4),
+        contrast=round(contrast, 4), sharpness=round(sharpness, 6),
+        tilt_degrees=round(tilt, 2) if tilt is not None else None,
+        subject_x=round(subject_x, 3), subject_y=round(subject_y, 3),
+        thirds_distance=round(thirds_distance, 3), clutter=round(clutter, 4),
+        phash=phash, timings_ms=timings,
+    )
+
+
+class SceneQualityEngine:
+    """
+    Turns `SceneMetrics` into the same result shape Gemini returns.
+
+    Thresholds are env-tunable: `SCENE_SHARPNESS_MIN` is the Laplacian
+    variance treated as "in focus" at the analysis size, `SCENE_TILT_MAX` the
+    horizon tilt (degrees) that still counts as level.
+    """
+
+    def __init__(self):
+        self.sharpness_min = float(os.getenv("SCENE_SHARPNESS_MIN", "0.002"))
+        self.tilt_max = float(os.getenv("SCENE_TILT_MAX", "3"))
+        self.ready_score = int(os.getenv("SCENE_READY_SCORE", "7"))
+
+    def exposure_quality(self, m: SceneMetrics) -> float:
+        centered = 1.0 - min(1.0, abs(m.exposure - 0.48) / 0.35)
+        clipping = min(1.0, (m.dark_clip + m.bright_clip) * 4)
+        contrast = min(1.0, m.contrast / 0.18)
+        return max(0.0, 0.55 * centered + 0.25 * contrast + 0.2 * (1.0 - clipping))
+
+    def score(self, m: SceneMetrics, context: str = "") -> dict:
+        exposure_q = self.exposure_quality(m)
+        focus_q = min(1.0, m.sharpness / self.sharpness_min)
+        level_q = 1.0 if m.tilt_degrees is None else max(0.0, 1.0 - abs(m.tilt_degrees) / (self.tilt_max * 3))
+        placement_q = max(0.0, 1.0 - m.thirds_distance / 0.35)
+        clean_q = max(0.0, 1.0 - m.clutter / 0.25)
+        overall = 0.3 * exposure_q + 0.3 * focus_q + 0.15 * level_q + 0.15 * placement_q + 0.1 * clean_q
+        # A frame that is unusable on one axis cannot score well overall.
+        overall *= min(1.0, 0.4 + min(exposure_q, focus_q))
+        composition_score = max(1, min(10, round(1 + 9 * overall)))
+
+        if exposure_q >= 0.8:
+            lighting = "Excellent"
+        elif exposure_q >= 0.6:
+            lighting = "Good"
+        elif exposure_q >= 0.4:
+            lighting = "Fair"
+        else:
+            lighting = "Poor"
+
+        return {
+            "composition_score": composition_score,
+            "lighting": lighting,
+            "suggestion": self.suggest(m, exposure_q, focus_q),
+            "is_ready_to_shoot": composition_score >= self.ready_score and focus_q >= 0.8 and exposure_q >= 0.5,
+            "details": {
+                "subject_position": self.describe_position(m),
+                "background_quality": "Busy, simplify the background" if clean_q < 0.5 else "Clean",
+            },
+        }
+
+    def suggest(self, m: SceneMetrics, exposure_q: float, focus_q: float) -> str:
+        """Spoken tip for the worst problem in the frame."""
+        if m.exposure < 0.2 or m.dark_clip > 0.25:
+            return "Too dark. Move toward the light or turn on the torch."
+        if m.exposure > 0.8 or m.bright_clip > 0.2:
+            return "Too bright. Step out of direct light or lower exposure."
+        if focus_q < 0.5:
+            return "Image is blurry. Hold steady and tap to focus."
+        if m.tilt_degrees is not None and abs(m.tilt_degrees) > self.tilt_max:
+            direction = "left" if m.tilt_degrees > 0 else "right"
+            return f"Horizon is tilted. Rotate the camera slightly {direction}."
+        if m.thirds_distance > 0.2:
+            return "Place the subject on a thirds line for a stronger frame."
+        if exposure_q < 0.6:
+            return "Lighting is flat. Try angling the subject toward the light."
+        return "Good framing and light. Take the shot!"
+
+    @staticmethod
+    def describe_position(m: SceneMetrics) -> str:
+        horizontal = "left" if m.subject_x < 0.4 else "right" if m.subject_x > 0.6 else "center"
+        vertical = "top" if m.subject_y < 0.4 else "bottom" if m.subject_y > 0.6 else "middle"
+        thirds = "on a thirds point" if m.thirds_distance <= 0.12 else "off the thirds grid"
+        return f"Subject {vertical}-{horizontal}, {thirds}"
+
+
+class _GateState:
+    __slots__ = ("metrics", "ready", "result", "escalated_at")
+
+    def __init__(self, metrics: SceneMetrics, ready: bool, result: dict, escalated_at: float):
+        self.metrics = metrics
+        self.ready = ready
+        self.result = result
+        self.escalated_at = escalated_at
+
+
+class SceneGate:
+    """
+    Decides per session whether a frame is worth a model call.
+
+    A frame escalates when it is the session's first, when local readiness
+    flips, when exposure, focus, tilt or subject position moved beyond the
+    configured deltas, or when the last model answer is older than `max_age`.
+    Otherwise the last model answer (or, for clearly unusable frames, the
+    local one) is returned without going upstream.
+    """
+
+    def __init__(self, max_sessions: int = 1024):
+        self.exposure_delta = float(os.getenv("SCENE_GATE_EXPOSURE_DELTA", "0.08"))
+        self.sharpness_ratio = float(os.getenv("SCENE_GATE_SHARPNESS_RATIO", "0.5"))
+        self.tilt_delta = float(os.getenv("SCENE_GATE_TILT_DELTA", "3"))
+        self.subject_delta = float(os.getenv("SCENE_GATE_SUBJECT_DELTA", "0.12"))
+        self.max_age = float(os.getenv("SCENE_GATE_MAX_AGE", "20"))
+        self.floor_score = int(os.getenv("SCENE_GATE_FLOOR", "3"))
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self.decisions = {}
+
+    def _changed(self, old: SceneMetrics, new: SceneMetrics) -> bool:
+        if abs(new.exposure - old.exposure) > self.exposure_delta:
+            return True
+        base = max(old.sharpness, 1e-9)
+        if abs(new.sharpness - old.sharpness) / base > self.sharpness_ratio:
+            return True
+        if (old.tilt_degrees is None) != (new.tilt_degrees is None):
+            return True
+        if old.tilt_degrees is not None and abs(new.tilt_degrees - old.tilt_degrees) > self.tilt_delta:
+            return True
+        return math.hypot(new.subject_x - old.subject_x, new.subject_y - old.subject_y) > self.subject_delta
+
+    def check(self, key: str, metrics: SceneMetrics, local: dict) -> tuple:
+        """Returns (reason, result): a reason to escalate and None, or None and the answer to serve."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._sessions.get(key)
+            if state is not None:
+                self._sessions.move_to_end(key)
+            if local["composition_score"] <= self.floor_score and (state is None or not state.ready):
+                decision, result = "local_unusable", local
+            elif state is None:
+                decision, result = "first_frame", None
+            elif local["is_ready_to_shoot"] != state.ready:
+                decision, result = "readiness_changed", None
+            elif now - state.escalated_at > self.max_age:
+                decision, result = "stale", None
+            elif self._changed(state.metrics, metrics):
+                decision, result = "scene_changed", None
+            else:
+                decision, result = "reuse", state.result
+            self.decisions[decision] = self.decisions.get(decision, 0) + 1
+        return (None, result) if result is not None else (decision, None)
+
+    def record(self, key: str, metrics: SceneMetrics, local: dict, result: dict):
+        """Remembers the frame a model answer was fetched for."""
+        with self._lock:
+            self._sessions[key] = _GateState(metrics, local["is_ready_to_shoot"], result, time.monotonic())
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            decisions = dict(self.decisions)
+            sessions = len(self._sessions)
+        served_locally = decisions.get("reuse", 0) + decisions.get("local_unusable", 0)
+        total = sum(decisions.values())
+        return {
+            "sessions": sessions,
+            "decisions": decisions,
+            "local_ratio": round(served_locally / total, 3) if total else None,
+        }
+
+
+class _TimingStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.total_ms = {}
+
+    def record(self, metrics: SceneMetrics):
+        with self._lock:
+            self.frames += 1
+            for stage, ms in metrics.timings_ms.items():
+                self.total_ms[stage] = self.total_ms.get(stage, 0.0) + ms
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "frames": self.frames,
+                "avg_ms": {k: round(v / self.frames, 3) for k, v in self.total_ms.items()} if self.frames else {},
+            }
+
+
+scene_quality = SceneQualityEngine()
+scene_gate = SceneGate()
+measure_timings = _TimingStats()
+
+
+def metrics_dict(metrics: SceneMetrics) -> dict:
+    return {k: v for k, v in asdict(metrics).items() if k not in ("timings_ms", "phash")}
@@ -0,0 +1,25 @@
+import os
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+# One year, never revalidated: the URL changes whenever the content does.
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    StaticFiles for content-addressed files (names embed a hash of the content).
+
+    The filename doubles as a strong ETag, so a conditional request is answered
+    `304` without hashing anything, and every response may be cached forever.
+    """
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        headers = {"etag": f'"{os.path.basename(full_path)}"', "cache-control": IMMUTABLE}
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
@@ -0,0 +1,151 @@
+import contextvars
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Optional
+
+
+class Trace:
+    """Timing record for one request (or one background job) and its spans."""
+
+    __slots__ = ("trace_id", "name", "started_at", "_t0", "duration_ms", "spans", "attrs")
+
+    def __init__(self, trace_id: str, name: str):
+        self.trace_id = trace_id
+        self.name = name
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms = None
+        self.spans = []
+        self.attrs = {}
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "attrs": self.attrs,
+            "spans": self.spans,
+        }
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("current_trace", default=None)
+
+
+class _Span:
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.trace = _current_trace.get()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        trace = self.trace
+        if trace is not None:
+            record = {
+                "name": self.name,
+                "start_ms": round((self.started - trace._t0) * 1000, 3),
+                "duration_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            }
+            if self.attrs:
+                record["attrs"] = self.attrs
+            if exc_type is not None:
+                record["error"] = exc_type.__name__
+            trace.spans.append(record)
+        return False
+
+
+def span(name: str, **attrs) -> _Span:
+    """Times a block as a span of the current trace (no-op outside a trace)."""
+    return _Span(name, attrs)
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+class TraceStore:
+    """Ring buffer of finished traces, exportable as JSON."""
+
+    def __init__(self, size: int = None):
+        self.size = size or int(os.getenv("TRACE_BUFFER_SIZE", "1000"))
+        self._lock = threading.Lock()
+        self._traces = deque(maxlen=self.size)
+        self.exporters = []
+
+    def start(self, name: str, trace_id: str = None):
+        """Begins a trace in the current context; returns a token for `finish`."""
+        trace = Trace(trace_id or uuid.uuid4().hex, name)
+        return trace, _current_trace.set(trace)
+
+    def finish(self, trace: Trace, token, **attrs):
+        trace.duration_ms = round((time.perf_counter() - trace._t0) * 1000, 3)
+        trace.attrs.update(attrs)
+        _current_trace.reset(token)
+        with self._lock:
+            self._traces.append(trace)
+        for exporter in self.exporters:
+            exporter(trace)
+        return trace
+
+    def export(self, limit: int = 100, min_duration_ms: float = 0, trace_id: str = None) -> list:
+        with self._lock:
+            traces = list(self._traces)
+        selected = [
+            t.to_dict() for t in reversed(traces)
+            if (trace_id is None or t.trace_id == trace_id) and (t.duration_ms or 0) >= min_duration_ms
+        ]
+        return selected[:limit]
+
+
+trace_store = TraceStore()
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware giving every HTTP request a trace.
+
+    The id is taken from an incoming `X-Trace-Id` header when present, echoed
+    back on the response, and available to any code on the request path via
+    `current_trace_id()`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-trace-id":
+                incoming = value.decode("latin-1")[:64]
+                break
+        trace, token = trace_store.start(f"{scope['method']} {scope['path']}", incoming)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-trace-id", trace.trace_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            trace_store.finish(trace, token, status=status["code"], route=getattr(route, "path", None))
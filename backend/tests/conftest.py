@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the backend modules the way `main.py` does (`services.x`, `agents.x`).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def anyio_backend():
+    # The services are written against asyncio.
+    return "asyncio"
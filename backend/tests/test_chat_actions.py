@@ -0,0 +1,87 @@
+import pytest
+
+from services.chat_actions import CAPTURE_MARKER, MarkerStripper, StreamingActionDetector, detect_action, strip_marker
+
+
+def _stream(detector: StreamingActionDetector, chunks: list) -> list:
+    return [detector.feed(chunk) for chunk in chunks]
+
+
+@pytest.mark.parametrize("text, action", [
+    ("Lights, camera, ACTION!", "start_recording"),
+    ("That's a wrap, cut!", "stop_recording"),
+    ("Hold still, I'll capture it", "capture_photo"),
+    ("Nice framing.", None),
+])
+def test_detect_action_on_complete_replies(text, action):
+    assert detect_action(text) == action
+
+
+def test_keyword_split_across_chunks_is_found():
+    detector = StreamingActionDetector()
+    assert _stream(detector, ["Ready? Start", "_reco", "rding now"]) == [None, None, "start_recording"]
+
+
+def test_every_split_point_of_a_keyword_is_found():
+    text = "okay, take a photo please"
+    for cut in range(1, len(text)):
+        detector = StreamingActionDetector()
+        fired = [a for a in _stream(detector, [text[:cut], text[cut:]]) if a]
+        assert fired == ["capture_photo"], cut
+
+
+def test_first_keyword_in_the_stream_wins_and_fires_once():
+    detector = StreamingActionDetector()
+    fired = _stream(detector, ["We cut here", " then action", " and capture"])
+    assert fired == ["stop_recording", None, None]
+    assert detector.action == "stop_recording"
+
+
+def test_earliest_keyword_within_one_chunk_wins():
+    detector = StreamingActionDetector()
+    assert detector.feed("capture first, then cut") == "capture_photo"
+
+
+def test_no_action_in_plain_reply():
+    detector = StreamingActionDetector()
+    assert _stream(detector, ["Tilt the ", "camera down ", "a little."]) == [None, None, None]
+
+
+def _strip(chunks: list) -> str:
+    stripper = MarkerStripper()
+    return "".join(stripper.feed(chunk) for chunk in chunks) + stripper.flush()
+
+
+def test_marker_in_one_chunk_is_removed():
+    assert _strip([f"Perfect {CAPTURE_MARKER} shot"]) == "Perfect  shot"
+
+
+def test_marker_split_at_every_point_is_removed():
+    text = f"Great light. {CAPTURE_MARKER} Hold it."
+    for cut in range(len(text) + 1):
+        for second in range(cut, len(text) + 1):
+            assert _strip([text[:cut], text[cut:second], text[second:]]) == "Great light.  Hold it."
+
+
+def test_held_back_prefix_is_released_when_not_the_marker():
+    stripper = MarkerStripper()
+    assert stripper.feed("Try the CAP") == "Try the "
+    assert stripper.feed("E instead") == "CAPE instead"
+
+
+def test_trailing_prefix_is_flushed_at_the_end():
+    assert _strip(["Wear a CA"]) == "Wear a CA"
+
+
+def test_marker_formed_by_removing_another_is_removed():
+    assert CAPTURE_MARKER not in _strip([f"CAP{CAPTURE_MARKER}TURE"])
+
+
+@pytest.mark.parametrize("text", [
+    f"Perfect {CAPTURE_MARKER} shot",
+    f"CAP{CAPTURE_MARKER}TURE now",
+    f"CA{CAPTURE_MARKER}P{CAPTURE_MARKER}TURE{CAPTURE_MARKER}",
+    "No marker here",
+])
+def test_whole_reply_and_stream_strip_the_same(text):
+    assert strip_marker(text) == _strip([text]) == _strip(list(text))
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from services.clip_uploads import ClipUploadStore, UploadError
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ClipUploadStore(directory=str(tmp_path), max_bytes=1000, chunk_bytes=4, ttl=60)
+
+
+async def _body(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def test_append_in_pieces_completes_the_upload(store):
+    upload_id = store.create(10)["upload_id"]
+    status = await store.append(upload_id, 0, _body(b"abc", b"def"))
+    assert (status["offset"], status["complete"]) == (6, False)
+    status = await store.append(upload_id, 6, _body(b"ghij"))
+    assert status["complete"]
+    with open(store.path(upload_id), "rb") as f:
+        assert f.read() == b"abcdefghij"
+    assert store.stats()["bytes_received"] == 10
+
+
+async def test_wrong_offset_is_rejected_with_the_current_one(store):
+    upload_id = store.create(10)["upload_id"]
+    await store.append(upload_id, 0, _body(b"abc"))
+    with pytest.raises(UploadError) as info:
+        await store.append(upload_id, 0, _body(b"abc"))
+    assert (info.value.status_code, info.value.offset) == (409, 3)
+
+
+async def test_dropped_connection_keeps_what_arrived(store):
+    upload_id = store.create(10)["upload_id"]
+
+    async def dropped():
+        yield b"abcde"
+        raise ConnectionResetError
+
+    with pytest.raises(ConnectionResetError):
+        await store.append(upload_id, 0, dropped())
+    offset = store.status(upload_id)["offset"]
+    assert offset == 5
+    assert (await store.append(upload_id, offset, _body(b"fghij")))["complete"]
+
+
+async def test_body_past_declared_size_is_rejected(store):
+    upload_id = store.create(4)["upload_id"]
+    with pytest.raises(UploadError) as info:
+        await store.append(upload_id, 0, _body(b"abc", b"de"))
+    assert info.value.status_code == 413
+    assert store.status(upload_id)["offset"] == 3
+
+
+async def test_concurrent_append_is_rejected(store):
+    upload_id = store.create(10)["upload_id"]
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow():
+        yield b"ab"
+        started.set()
+        await release.wait()
+        yield b"cd"
+
+    first = asyncio.create_task(store.append(upload_id, 0, slow()))
+    await started.wait()
+    with pytest.raises(UploadError) as info:
+        await store.append(upload_id, 0, _body(b"ab"))
+    assert info.value.status_code == 409
+    release.set()
+    assert (await first)["offset"] == 4
+
+
+async def test_other_process_holding_the_file_lock_is_rejected(store):
+    fcntl = pytest.importorskip("fcntl")
+    upload_id = store.create(10)["upload_id"]
+    # A separate open file description stands in for another worker.
+    with open(store._paths(upload_id)[0], "ab") as other:
+        fcntl.flock(other.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        with pytest.raises(UploadError) as info:
+            await store.append(upload_id, 0, _body(b"ab"))
+    assert info.value.status_code == 409
+    assert (await store.append(upload_id, 0, _body(b"ab")))["offset"] == 2
+
+
+def test_unknown_or_malformed_ids_are_404(store):
+    for upload_id in ("0" * 32, "../etc/passwd", ""):
+        with pytest.raises(UploadError) as info:
+            store.status(upload_id)
+        assert info.value.status_code == 404
+
+
+def test_create_validates_size(store):
+    for size, code in ((0, 400), (1001, 413)):
+        with pytest.raises(UploadError) as info:
+            store.create(size)
+        assert info.value.status_code == code
+
+
+def test_prune_removes_only_idle_uploads(store):
+    stale = store.create(10)["upload_id"]
+    fresh = store.create(10)["upload_id"]
+    old = time.time() - 120
+    for path in store._paths(stale):
+        os.utime(path, (old, old))
+    store.prune()
+    with pytest.raises(UploadError):
+        store.status(stale)
+    assert store.status(fresh)["offset"] == 0
@@ -0,0 +1,28 @@
+import math
+
+import pytest
+
+from services.cpu_pool import CpuPool
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_runs_jobs_in_worker_processes():
+    pool = CpuPool(workers=1)
+    try:
+        assert await pool.map(math.sqrt, [4.0, 9.0]) == [2.0, 3.0]
+        assert pool.stats()["tasks"] == 2
+    finally:
+        pool.shutdown()
+
+
+async def test_shutdown_is_final():
+    pool = CpuPool(workers=1)
+    assert await pool.run(math.sqrt, 16.0) == 4.0
+    pool.shutdown()
+    with pytest.raises(RuntimeError):
+        await pool.run(math.sqrt, 16.0)
+    with pytest.raises(RuntimeError):
+        await pool.warm_up()
+    assert pool.stats()["started"] is False
+    assert pool.stats()["closed"] is True
@@ -0,0 +1,67 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from services.effect_storage import URL_PREFIX, EffectStorage
+
+WEBP = "image/avif,image/webp,*/*"
+
+
+def _png(size: tuple) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGBA", size, (200, 120, 40, 128)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = EffectStorage(root=str(tmp_path / "effects"), index_path=str(tmp_path / "index.sqlite3"))
+    storage.preview_edge = 64
+    return storage
+
+
+def test_large_png_gets_webp_and_previews(storage):
+    url = storage.save_bytes(_png((200, 100)), "effect")
+    assert set(storage.variant_urls(url)) == {"webp", "preview.webp", "preview.png"}
+    preview_path = os.path.join(storage.root, storage.filename_of(storage.variant_urls(url)["preview.png"]))
+    with Image.open(preview_path) as preview:
+        assert max(preview.size) == 64
+
+
+def test_small_png_gets_no_preview(storage):
+    url = storage.save_bytes(_png((32, 32)), "effect")
+    assert set(storage.variant_urls(url)) == {"webp"}
+    assert storage.pick_variant(url, WEBP, width=32) == storage.variant_urls(url)["webp"]
+
+
+@pytest.mark.parametrize("accept, width, variant", [
+    (WEBP, None, "webp"),
+    (WEBP, 1080, "webp"),
+    (WEBP, 64, "preview.webp"),
+    ("image/png,*/*", 64, "preview.png"),
+    ("", 48, "preview.png"),
+])
+def test_pick_variant_negotiates_format_and_size(storage, accept, width, variant):
+    url = storage.save_bytes(_png((200, 100)), "effect")
+    assert storage.pick_variant(url, accept, width) == storage.variant_urls(url)[variant]
+
+
+@pytest.mark.parametrize("accept, width", [("", None), ("image/png", 1080), (None, None)])
+def test_pick_variant_falls_back_to_the_original(storage, accept, width):
+    url = storage.save_bytes(_png((200, 100)), "effect")
+    assert storage.pick_variant(url, accept, width) == url
+
+
+def test_precomputed_variants_are_stored_as_given(storage):
+    url = storage.save_bytes(b"apng bytes", "video_fx", "png", variants={"webp": b"webp bytes"})
+    assert set(storage.variant_urls(url)) == {"webp"}
+    assert storage.pick_variant(url, WEBP, width=32) == storage.variant_urls(url)["webp"]
+    assert storage.pick_variant(url, "image/png", width=32) == url
+
+
+def test_urls_outside_the_store_have_no_variants(storage):
+    assert storage.variant_urls("https://example.com/effect.png") == {}
+    assert storage.pick_variant("https://example.com/effect.png", WEBP, 32) == "https://example.com/effect.png"
+    assert storage.variant_urls(URL_PREFIX + "effect_missing.png") == {}
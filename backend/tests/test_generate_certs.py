@@ -0,0 +1,28 @@
+import ipaddress
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+from generate_certs import build_cert
+
+
+def _addresses(cert_pem: bytes) -> list:
+    cert = x509.load_pem_x509_certificate(cert_pem)
+    return cert.extensions.get_extension_for_class(x509.SubjectAlternativeName).value.get_values_for_type(x509.IPAddress)
+
+
+@pytest.mark.parametrize("ip, expected", [
+    ("192.168.1.20", ["192.168.1.20", "127.0.0.1"]),
+    ("127.0.0.1", ["127.0.0.1"]),
+    ("fd00::20", ["fd00::20", "127.0.0.1"]),
+])
+def test_san_lists_the_given_address_and_loopback(ip, expected):
+    _, cert_pem = build_cert(ip)
+    assert _addresses(cert_pem) == [ipaddress.ip_address(a) for a in expected]
+
+
+@pytest.mark.parametrize("key_type, key_class", [("ecdsa", ec.EllipticCurvePublicKey), ("rsa", rsa.RSAPublicKey)])
+def test_key_type(key_type, key_class):
+    _, cert_pem = build_cert("10.0.0.2", key_type=key_type, days=1)
+    assert isinstance(x509.load_pem_x509_certificate(cert_pem).public_key(), key_class)
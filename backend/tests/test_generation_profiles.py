@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import pytest
+
+from agents.generation_profiles import GenerationProfile, generation_stats, parse_structured
+from schemas import BurstModelOutput
+
+VALID = '{"frames": [{"index": 0, "composition_score": 8, "suggestion": "Hold steady"}], "best_index": 0, "reason": "Sharpest"}'
+
+
+def _profile(name: str) -> GenerationProfile:
+    return GenerationProfile(name=name, max_output_tokens=100, timeout=1.0, response_schema=BurstModelOutput)
+
+
+def _response(text, finish_reason=None, output_tokens=None):
+    return SimpleNamespace(
+        text=text,
+        candidates=[SimpleNamespace(finish_reason=finish_reason)],
+        usage_metadata=SimpleNamespace(candidates_token_count=output_tokens),
+    )
+
+
+def test_plain_json_takes_the_fast_path():
+    profile = _profile("test_fast")
+    parsed = parse_structured(profile, _response(VALID, output_tokens=20))
+    assert parsed.frames[0].suggestion == "Hold steady"
+    counters = generation_stats.stats()["test_fast"]
+    assert counters["parsed"] == 1 and counters["parse_fallbacks"] == 0
+    assert counters["output_tokens"] == 20
+
+
+@pytest.mark.parametrize("text", [
+    f"```json\n{VALID}\n```",
+    f"Here you go:\n```json\n{VALID}\n```\nThanks",
+    f"```\n{VALID}\n```",
+    f"  {VALID}\n",
+])
+def test_fenced_or_padded_json_uses_the_fallback(text):
+    profile = _profile("test_fallback")
+    assert parse_structured(profile, _response(text)).frames[0].index == 0
+
+
+@pytest.mark.parametrize("text", [None, "", "not json", '{"frames": [{"index": "first"}]}', '{"frames": ['])
+def test_unusable_replies_return_none_and_count_a_failure(text):
+    profile = _profile("test_failure")
+    before = generation_stats.stats().get("test_failure", {}).get("parse_failures", 0)
+    assert parse_structured(profile, _response(text)) is None
+    assert generation_stats.stats()["test_failure"]["parse_failures"] == before + 1
+
+
+def test_truncated_replies_are_counted():
+    profile = _profile("test_truncated")
+    parse_structured(profile, _response('{"frames": [', finish_reason="FinishReason.MAX_TOKENS"))
+    counters = generation_stats.stats()["test_truncated"]
+    assert counters["truncated"] == 1 and counters["parse_failures"] == 1
+
+
+def test_profile_limits_can_be_overridden_from_env(monkeypatch):
+    monkeypatch.setenv("PROFILE_TESTENV_MAX_TOKENS", "42")
+    monkeypatch.setenv("PROFILE_TESTENV_TIMEOUT", "2.5")
+    profile = GenerationProfile.from_env("testenv", 100, 8.0)
+    assert (profile.max_output_tokens, profile.timeout) == (42, 2.5)
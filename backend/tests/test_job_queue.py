@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from services.job_queue import JobQueue, JobState
+
+pytestmark = pytest.mark.anyio
+
+
+async def _finished(queue: JobQueue, job_id: str):
+    async for status in queue.watch(job_id):
+        if status.state in (JobState.SUCCEEDED, JobState.FAILED):
+            return status
+
+
+async def test_lower_priority_runs_first():
+    queue = JobQueue(workers=1, max_depth=10, retention=60)
+    order = []
+    gate = asyncio.Event()
+
+    async def job(name):
+        await gate.wait()
+        order.append(name)
+        return {"name": name}
+
+    first = queue.submit("x", lambda: job("blocker"), priority=5)
+    await asyncio.sleep(0)
+    late = queue.submit("x", lambda: job("late"), priority=9)
+    urgent = queue.submit("x", lambda: job("urgent"), priority=0)
+    gate.set()
+    for status in (first, late, urgent):
+        await _finished(queue, status.job_id)
+    await queue.stop()
+    assert order == ["blocker", "urgent", "late"]
+
+
+async def test_error_result_marks_job_failed():
+    queue = JobQueue(workers=1, max_depth=10, retention=60)
+
+    async def job():
+        return {"error": "no image"}
+
+    status = await _finished(queue, queue.submit("x", job).job_id)
+    await queue.stop()
+    assert status.state == JobState.FAILED
+    assert status.error == "no image"
+
+
+async def test_prune_is_not_blocked_by_a_stuck_job():
+    queue = JobQueue(workers=2, max_depth=10, retention=60, max_jobs=3)
+    stuck = asyncio.Event()
+
+    async def slow():
+        await stuck.wait()
+        return {}
+
+    async def quick():
+        return {}
+
+    blocker = queue.submit("x", slow)
+    done = [queue.submit("x", quick) for _ in range(4)]
+    for status in done:
+        await _finished(queue, status.job_id)
+    queue.submit("x", quick)  # submitting prunes
+
+    assert queue.get(blocker.job_id) is not None
+    assert queue.get(done[0].job_id) is None
+    assert len(queue._jobs) <= queue.max_jobs + 1
+    stuck.set()
+    await queue.stop(drain_timeout=1)
@@ -0,0 +1,25 @@
+import os
+
+from services import mode_controller
+from services.mode_controller import AppMode, ModeController, create_store
+
+
+def test_sqlite_store_defaults_to_the_backend_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(mode_controller, "BACKEND_DIR", str(tmp_path / "backend"))
+    os.makedirs(tmp_path / "backend")
+    monkeypatch.setenv("MODE_STORE", "sqlite")
+    monkeypatch.delenv("MODE_STORE_PATH", raising=False)
+    stores = []
+    for cwd in (tmp_path, tmp_path / "backend"):
+        monkeypatch.chdir(cwd)
+        stores.append(create_store())
+    assert stores[0].path == stores[1].path == str(tmp_path / "backend" / "mode_state.db")
+
+    # Two "workers" see each other's writes.
+    ModeController(stores[0]).set_mode(AppMode.VIDEOGRAPHY, "s1")
+    assert ModeController(stores[1]).get_state("s1").current_mode == AppMode.VIDEOGRAPHY
+
+
+def test_unknown_backend_falls_back_to_memory(monkeypatch):
+    monkeypatch.setenv("MODE_STORE", "redis")
+    assert create_store().name == "memory"
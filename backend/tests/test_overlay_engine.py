@@ -0,0 +1,68 @@
+import io
+
+import pytest
+from PIL import Image
+
+from services.overlay_engine import EFFECTS, LOOP_FPS, LOOP_SIZES, OVERLAY_MAX_EDGE, loop_size, render_loop
+
+
+def test_defaults_are_one_of_the_fixed_sizes():
+    assert LOOP_SIZES == ((180, 320), (360, 640), (405, 720))
+    assert LOOP_FPS == (15, 24, 30)
+    assert loop_size() == (360, 640, 15)
+
+
+@pytest.mark.parametrize("request_size, expected", [
+    ((100, None, None), (180, 320, 15)),
+    ((180, 320, None), (180, 320, 15)),
+    ((320, 180, None), (320, 180, 15)),
+    ((181, None, None), (360, 640, 15)),
+    ((None, 321, None), (360, 640, 15)),
+    ((None, 700, None), (405, 720, 15)),
+    ((405, 720, None), (405, 720, 15)),
+    ((1080, 1920, None), (405, 720, 15)),
+    ((640, 360, None), (640, 360, 15)),
+    ((300, 170, None), (320, 180, 15)),
+    ((300, 200, None), (640, 360, 15)),
+    ((None, None, 5), (360, 640, 15)),
+    ((None, None, 16), (360, 640, 24)),
+    ((None, None, 25), (360, 640, 30)),
+    ((None, None, 60), (360, 640, 30)),
+])
+def test_requests_snap_to_the_fixed_set(request_size, expected):
+    assert loop_size(*request_size) == expected
+
+
+def test_arbitrary_requests_share_a_few_keys():
+    keys = {loop_size(w, h, f) for w in range(16, OVERLAY_MAX_EDGE + 1, 7)
+            for h in (None, 16, 400, OVERLAY_MAX_EDGE) for f in range(5, 31)}
+    assert len(keys) <= len(LOOP_SIZES) * 2 * len(LOOP_FPS)
+
+
+@pytest.mark.parametrize("bad", [(0, None, None), (None, -1, None), (None, None, 0)])
+def test_non_positive_values_are_rejected(bad):
+    with pytest.raises(ValueError):
+        loop_size(*bad)
+
+
+@pytest.mark.parametrize("effect", sorted(EFFECTS))
+def test_render_is_deterministic_and_matches_metadata(effect):
+    first = render_loop(effect, 64, 112, 15, seconds=0.4)
+    second = render_loop(effect, 64, 112, 15, seconds=0.4)
+    assert first.apng == second.apng
+    with Image.open(io.BytesIO(first.apng)) as apng:
+        assert (apng.size, apng.n_frames, apng.mode) == ((64, 112), first.frames, "RGBA")
+    meta = first.metadata()
+    assert (meta["width"], meta["height"], meta["frame_rate"], meta["frames"]) == (64, 112, 15, 6)
+
+
+def test_endpoint_rejects_out_of_range_geometry():
+    from fastapi.testclient import TestClient
+
+    from main import app
+
+    client = TestClient(app)
+    for field, value in (("overlay_width", 0), ("overlay_height", OVERLAY_MAX_EDGE + 1), ("fps", 60)):
+        for path in ("/video_effect", "/jobs/video_effect"):
+            response = client.post(path, data={"effect_type": "steam_loop", field: value})
+            assert response.status_code == 422, (path, field)
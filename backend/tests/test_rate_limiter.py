@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from services.rate_limiter import ModelLimiter, RateLimitExceeded, TokenBucket, retry_after_header
+
+
+def test_bucket_starts_full_and_refills_at_rate():
+    bucket = TokenBucket(per_minute=60)
+    start = bucket.updated
+    assert bucket.wait_time(60, start) == 0.0
+    bucket.take(60)
+    assert bucket.wait_time(1, start) == pytest.approx(1.0)
+    assert bucket.wait_time(1, start + 0.5) == pytest.approx(0.5)
+    assert bucket.wait_time(1, start + 1.0) == 0.0
+
+
+def test_bucket_caps_refill_and_oversized_requests_at_capacity():
+    bucket = TokenBucket(per_minute=60, burst=10)
+    start = bucket.updated
+    bucket.wait_time(1, start + 3600)
+    assert bucket.tokens == 10
+    # A request larger than the bucket must not wait forever.
+    assert bucket.wait_time(1000, start + 3600) == 0.0
+
+
+def test_debit_can_go_negative_and_delays_next_caller():
+    bucket = TokenBucket(per_minute=60)
+    start = bucket.updated
+    bucket.debit(90)
+    assert bucket.tokens == -30
+    assert bucket.wait_time(1, start) == pytest.approx(31.0)
+
+
+def test_block_holds_the_bucket_until_expiry():
+    bucket = TokenBucket(per_minute=60)
+    start = bucket.updated
+    bucket.block(10, start)
+    assert bucket.wait_time(1, start + 4) == pytest.approx(6.0)
+    assert bucket.wait_time(1, start + 10) == 0.0
+
+
+@pytest.mark.anyio
+async def test_limiter_rejects_when_wait_exceeds_max_wait():
+    limiter = ModelLimiter("m", rpm=60, tpm=0, max_wait=0.5, max_waiters=4)
+    limiter.requests.tokens = 0
+    with pytest.raises(RateLimitExceeded) as info:
+        await limiter.acquire(1)
+    assert info.value.retry_after == pytest.approx(1.0, abs=0.05)
+    assert limiter.rejected == 1
+    assert retry_after_header(info.value) == "1"
+
+
+@pytest.mark.anyio
+async def test_limiter_waits_briefly_for_refill():
+    limiter = ModelLimiter("m", rpm=600, tpm=0, max_wait=1.0, max_waiters=4)
+    limiter.requests.tokens = 0
+    await asyncio.wait_for(limiter.acquire(1), 1.0)
+    assert limiter.admitted == 1
+    assert limiter.waiters == 0
+
+
+@pytest.mark.anyio
+async def test_limiter_checks_token_budget_too():
+    limiter = ModelLimiter("m", rpm=0, tpm=1000, max_wait=0.1, max_waiters=4)
+    await limiter.acquire(800)
+    with pytest.raises(RateLimitExceeded):
+        await limiter.acquire(800)
+    limiter.record_usage(estimated=800, actual=100)
+    await limiter.acquire(800)
+    assert limiter.admitted == 2
+
+
+@pytest.mark.anyio
+async def test_upstream_block_rejects_until_backoff():
+    limiter = ModelLimiter("m", rpm=60, tpm=0, max_wait=0.5, max_waiters=4)
+    limiter.block(30)
+    with pytest.raises(RateLimitExceeded):
+        await limiter.acquire(1)
+    assert limiter.stats()["upstream_429"] == 1
@@ -0,0 +1,108 @@
+import http.client
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "frontend"))
+
+from static_server import IMMUTABLE, StaticSite, accepted_encodings, make_server  # noqa: E402
+
+SCRIPT = b"console.log('hello from the flutter build');\n" * 200
+
+
+@pytest.mark.parametrize("header, codings", [
+    ("gzip, deflate, br", {"gzip", "deflate", "br"}),
+    ("br;q=1.0, gzip;q=0.5", {"br", "gzip"}),
+    ("GZIP", {"gzip"}),
+    ("br;q=0, gzip", {"gzip"}),
+    ("gzip; q=0.000, br", {"br"}),
+    ("gzip;q=0.001", {"gzip"}),
+    ("", {""}),
+    (None, {""}),
+])
+def test_accepted_encodings(header, codings):
+    assert accepted_encodings(header) == codings
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    root = tmp_path_factory.mktemp("web")
+    (root / "index.html").write_bytes(b"<html>app</html>")
+    (root / "main.dart.js").write_bytes(SCRIPT)
+    (root / "chunk.3f2a9c1d.js").write_bytes(SCRIPT)
+    site = StaticSite(str(root), workers=2)
+    site.load()
+    server = make_server("127.0.0.1", 0, site)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _get(server, path: str, **headers):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+    try:
+        connection.request("GET", path, headers={k.replace("_", "-"): v for k, v in headers.items()})
+        response = connection.getresponse()
+        return response, response.read()
+    finally:
+        connection.close()
+
+
+def test_gzip_is_served_with_its_own_etag(server):
+    plain, body = _get(server, "/main.dart.js", Accept_Encoding="identity")
+    gzipped, gz_body = _get(server, "/main.dart.js", Accept_Encoding="gzip")
+    assert body == SCRIPT and plain.getheader("Content-Encoding") is None
+    assert gzipped.getheader("Content-Encoding") == "gzip" and len(gz_body) < len(SCRIPT)
+    assert gzipped.getheader("ETag") == plain.getheader("ETag")[:-1] + '-gzip"'
+    assert gzipped.getheader("Vary") == "Accept-Encoding"
+
+
+def test_matching_etag_gets_304(server):
+    first, _ = _get(server, "/main.dart.js", Accept_Encoding="gzip")
+    etag = first.getheader("ETag")
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response, body = _get(server, "/main.dart.js", Accept_Encoding="gzip", If_None_Match=if_none_match)
+        assert (response.status, body) == (304, b""), if_none_match
+        assert response.getheader("ETag") == etag
+
+
+def test_etag_of_another_coding_gets_the_body(server):
+    gzipped, _ = _get(server, "/main.dart.js", Accept_Encoding="gzip")
+    response, body = _get(server, "/main.dart.js", If_None_Match=gzipped.getheader("ETag"))
+    assert (response.status, body) == (200, SCRIPT)
+
+
+def test_cache_policy_by_name(server):
+    assert _get(server, "/")[0].getheader("Cache-Control") == "no-cache"
+    assert _get(server, "/main.dart.js")[0].getheader("Cache-Control") == "no-cache"
+    assert _get(server, "/chunk.3f2a9c1d.js")[0].getheader("Cache-Control") == IMMUTABLE
+    assert _get(server, "/missing.js")[0].status == 404
+
+
+def test_memory_budget_is_never_exceeded(tmp_path):
+    for i in range(8):
+        (tmp_path / f"asset{i}.js").write_bytes(SCRIPT + bytes([i]))
+    (tmp_path / "big.bin").write_bytes(os.urandom(50_000))
+    site = StaticSite(str(tmp_path), memory_limit=len(SCRIPT) * 3, workers=4)
+    site.load()
+    assert site.memory_bytes <= site.memory_limit
+    held = sum(f.size for f in site.files.values() if f.body is not None)
+    assert held + sum(len(v) for f in site.files.values() for v in f.encoded.values()) == site.memory_bytes
+    assert site.files["/big.bin"].body is None
+    assert any(f.body is None for name, f in site.files.items() if name.endswith(".js"))
+
+    server = make_server("127.0.0.1", 0, site)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        for name, entry in site.files.items():
+            response, body = _get(server, name, Accept_Encoding="identity")
+            with open(entry.path, "rb") as f:
+                assert body == f.read(), name
+            assert response.getheader("ETag") == entry.etag
+    finally:
+        server.shutdown()
+        server.server_close()
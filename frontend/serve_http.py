@@ -1,18 +1,13 @@
-import http.server
-import socketserver
+import argparse
+
+from static_server import add_arguments, serve, site_options
 
 PORT = 8081
 DIRECTORY = "build/web"
 
-class Handler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, directory=DIRECTORY, **kwargs)
-
-print(f"Serving {DIRECTORY} at http://0.0.0.0:{PORT}")
-print(f"Access from iPhone at: http://192.168.1.118:{PORT}")
-
-with socketserver.TCPServer(("0.0.0.0", PORT), Handler) as httpd:
-    try:
-        httpd.serve_forever()
-    except KeyboardInterrupt:
-        pass
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the Flutter web build over HTTP.")
+    add_arguments(parser, PORT, DIRECTORY)
+    args = parser.parse_args()
+    print(f"Access from iPhone at: http://192.168.1.118:{args.port}")
+    serve(args.host, args.port, args.directory, **site_options(args))
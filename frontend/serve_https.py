@@ -1,30 +1,24 @@
-import http.server
-import ssl
+import argparse
 import os
 import datetime
 from cryptography import x509
 from cryptography.x509.oid import NameOID
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives import serialization
 
+from static_server import add_arguments, serve, site_options, tls_context
+
 # Configuration
 PORT = 8080
 DIRECTORY = "build/web"
 
-class Handler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, directory=DIRECTORY, **kwargs)
-
 def generate_self_signed_cert():
     """Generates a self-signed certificate and key using cryptography library."""
     print("Generating self-signed certificate...")
     
-    # Generate private key
-    key = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=2048,
-    )
+    # ECDSA P-256: a much cheaper handshake signature than RSA-2048
+    key = ec.generate_private_key(ec.SECP256R1())
 
     # Generate certificate
     subject = issuer = x509.Name([
@@ -70,23 +64,16 @@ def import_ip_address(ip):
     return ipaddress.ip_address(ip)
 
 def main():
+    parser = argparse.ArgumentParser(description="Serve the Flutter web build over HTTPS.")
+    add_arguments(parser, PORT, DIRECTORY)
+    args = parser.parse_args()
+
     # Generate certs if they don't exist
     if not os.path.exists("cert.pem") or not os.path.exists("key.pem"):
         generate_self_signed_cert()
-        
-    print(f"Serving {DIRECTORY} at https://0.0.0.0:{PORT}")
-    
-    server_address = ('0.0.0.0', PORT)
-    httpd = http.server.HTTPServer(server_address, Handler)
-    
-    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
-    context.load_cert_chain(certfile="cert.pem", keyfile="key.pem")
-    httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
-    
-    try:
-        httpd.serve_forever()
-    except KeyboardInterrupt:
-        pass
+
+    context = tls_context(certfile="cert.pem", keyfile="key.pem")
+    serve(args.host, args.port, args.directory, ssl_context=context, **site_options(args))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,308 @@
+"""
+Concurrent static file server for the Flutter web build.
+
+Used by serve_http.py and serve_https.py, or directly:
+
+    python static_server.py --port 8081 --directory build/web
+
+At startup every file under the directory is hashed for its ETag, and
+compressible files (JS, WASM, JSON, fonts...) get gzip and, if the `brotli`
+package is installed, brotli variants. Compression runs once, in parallel.
+Files are held in RAM while they fit the memory budget, checked as they are
+loaded; the rest are sent from disk with sendfile. Each connection gets its own thread and is kept alive between
+requests, so a slow phone download doesn't stall other clients. Over TLS
+several session tickets are issued per handshake, so reconnects resume.
+Restart the server after `flutter build web`; the file list is fixed at startup.
+"""
+import argparse
+import gzip
+import hashlib
+import http.server
+import mimetypes
+import os
+import re
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from urllib.parse import unquote, urlsplit
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".js", ".mjs", ".css", ".html", ".json", ".wasm", ".svg", ".txt", ".map",
+    ".xml", ".ttf", ".otf", ".ico", ".frag", ".symbols",
+}
+# Entry points that must always be revalidated so a new build is picked up.
+ENTRY_POINTS = {"index.html", "flutter_service_worker.js", "flutter_bootstrap.js", "flutter.js",
+                "main.dart.js", "version.json", "manifest.json"}
+# Filenames carrying a content hash (e.g. "main.3f2a9c1d.js") never change.
+HASHED_NAME = re.compile(r"[.-][0-9a-f]{8,}\.")
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Don't keep a compressed variant that saves less than this fraction.
+MIN_SAVING = 0.1
+# TLS 1.3 tickets sent per full handshake; each resumed connection uses one up.
+TLS_SESSION_TICKETS = int(os.getenv("TLS_SESSION_TICKETS", "4"))
+
+
+class StaticFile:
+    __slots__ = ("path", "size", "etag", "last_modified", "content_type", "cache_control", "body", "encoded")
+
+    def __init__(self, path: str, size: int, etag: str, last_modified: str, content_type: str, cache_control: str):
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.body = None     # bytes if held in memory
+        self.encoded = {}    # "br"/"gzip" -> bytes
+
+
+class StaticSite:
+    """Index of a build directory: ETags, cache policy, in-memory bodies and precompressed variants."""
+
+    def __init__(self, root: str, memory_limit: int = 256 * 1024 * 1024, brotli_quality: int = 9,
+                 max_age: int = 0, workers: int = None):
+        self.root = os.path.abspath(root)
+        self.memory_limit = memory_limit
+        self.brotli_quality = brotli_quality
+        self.max_age = max_age
+        self.workers = workers or os.cpu_count() or 2
+        self.files = {}
+        self.memory_bytes = 0
+        self._budget_lock = threading.Lock()
+
+    def cache_control(self, relative: str) -> str:
+        name = os.path.basename(relative)
+        if HASHED_NAME.search(name):
+            return IMMUTABLE
+        if name in ENTRY_POINTS or self.max_age <= 0:
+            return "no-cache"
+        return f"public, max-age={self.max_age}"
+
+    def load(self):
+        started = time.perf_counter()
+        paths = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                paths.append(os.path.join(directory, name))
+        # Compression releases the GIL, so a thread pool uses every core.
+        # Smallest first, so the memory budget holds as many files as possible.
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            entries = list(pool.map(self._load_file, sorted(paths, key=os.path.getsize)))
+        for relative, entry in entries:
+            self.files["/" + relative] = entry
+        if "/index.html" in self.files:
+            self.files["/"] = self.files["/index.html"]
+        raw = sum(f.size for f in set(self.files.values()))
+        print(f"Indexed {len(set(self.files.values()))} files ({raw / 1e6:.1f} MB, "
+              f"{self.memory_bytes / 1e6:.1f} MB in memory) in {time.perf_counter() - started:.1f}s"
+              f"{'' if brotli else '; install brotli for br variants'}")
+
+    def _reserve(self, size: int) -> bool:
+        """Claims `size` bytes of the memory budget if they fit."""
+        with self._budget_lock:
+            if self.memory_bytes + size > self.memory_limit:
+                return False
+            self.memory_bytes += size
+            return True
+
+    def _load_file(self, path: str):
+        """
+        Indexes one file. The budget is claimed before anything is kept, so
+        loading never holds more than the budget plus the files the workers
+        are compressing at that moment. Bodies past it stay on disk; their
+        compressed variants are kept only while those still fit.
+        """
+        relative = os.path.relpath(path, self.root).replace(os.sep, "/")
+        stat = os.stat(path)
+        compressible = os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS and stat.st_size > 1024
+        in_memory = self._reserve(stat.st_size)
+        digest = hashlib.blake2b(digest_size=12)
+        data = None
+        with open(path, "rb") as f:
+            if in_memory or compressible:
+                data = f.read()
+                digest.update(data)
+            else:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in ("application/javascript", "application/json"):
+            content_type += "; charset=utf-8"
+        entry = StaticFile(
+            path=path,
+            size=stat.st_size,
+            etag='"%s"' % digest.hexdigest(),
+            last_modified=formatdate(stat.st_mtime, usegmt=True),
+            content_type=content_type,
+            cache_control=self.cache_control(relative),
+        )
+        if compressible:
+            candidates = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                candidates["br"] = brotli.compress(data, quality=self.brotli_quality)
+            encoded = {k: v for k, v in candidates.items() if len(v) <= len(data) * (1 - MIN_SAVING)}
+            if self._reserve(sum(len(v) for v in encoded.values())):
+                entry.encoded = encoded
+        if in_memory:
+            entry.body = data
+        return relative, entry
+
+    def lookup(self, url_path: str):
+        path = unquote(urlsplit(url_path).path)
+        entry = self.files.get(path)
+        if entry is None and path.endswith("/"):
+            entry = self.files.get(path + "index.html")
+        return entry
+
+
+def accepted_encodings(header: str) -> set:
+    """Codings the client accepts (q=0 excluded)."""
+    accepted = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    server_version = "StaticServer"
+    # Idle keep-alive connections are closed after this many seconds.
+    timeout = 30
+    site = None
+
+    def setup(self):
+        super().setup()
+        if isinstance(self.connection, ssl.SSLSocket):
+            # The listening socket doesn't handshake in accept(), so a slow
+            # client only ties up its own thread.
+            self.connection.do_handshake()
+
+    def do_GET(self):
+        self._serve(head=False)
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def _serve(self, head: bool):
+        entry = self.site.lookup(self.path)
+        if entry is None:
+            self.send_error(404, "File not found")
+            return
+
+        accepted = accepted_encodings(self.headers.get("Accept-Encoding"))
+        coding = next((c for c in ("br", "gzip") if c in entry.encoded and c in accepted), None)
+        # Each content-coding is its own representation, so it gets its own strong ETag.
+        etag = f'{entry.etag[:-1]}-{coding}"' if coding else entry.etag
+
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match and (if_none_match.strip() == "*" or
+                              etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]):
+            self.send_response(304)
+            self._common_headers(entry, etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = entry.encoded[coding] if coding else entry.body
+        length = len(body) if body is not None else entry.size
+
+        self.send_response(200)
+        self._common_headers(entry, etag)
+        self.send_header("Content-Type", entry.content_type)
+        self.send_header("Content-Length", str(length))
+        if coding:
+            self.send_header("Content-Encoding", coding)
+        self.end_headers()
+        if head:
+            return
+        try:
+            if body is not None:
+                self.wfile.write(body)
+            else:
+                with open(entry.path, "rb") as f:
+                    self.connection.sendfile(f)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _common_headers(self, entry: StaticFile, etag: str):
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", entry.last_modified)
+        self.send_header("Cache-Control", entry.cache_control)
+        if entry.encoded:
+            self.send_header("Vary", "Accept-Encoding")
+
+    def log_message(self, format, *args):
+        if os.getenv("STATIC_ACCESS_LOG"):
+            super().log_message(format, *args)
+
+
+class StaticServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def tls_context(certfile: str, keyfile: str) -> ssl.SSLContext:
+    """Server context with session resumption on and compression off, TLS 1.2 or newer."""
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(certfile=certfile, keyfile=keyfile)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.options |= ssl.OP_NO_COMPRESSION
+    context.options &= ~ssl.OP_NO_TICKET
+    context.num_tickets = TLS_SESSION_TICKETS
+    context.set_ciphers("ECDHE+AESGCM:ECDHE+CHACHA20")
+    context.set_alpn_protocols(["http/1.1"])
+    return context
+
+
+def make_server(host: str, port: int, site: StaticSite, ssl_context: ssl.SSLContext = None) -> StaticServer:
+    handler = type("Handler", (StaticHandler,), {"site": site})
+    server = StaticServer((host, port), handler)
+    if ssl_context is not None:
+        server.socket = ssl_context.wrap_socket(server.socket, server_side=True, do_handshake_on_connect=False)
+    return server
+
+
+def serve(host: str, port: int, directory: str, ssl_context: ssl.SSLContext = None, **site_options):
+    site = StaticSite(directory, **site_options)
+    site.load()
+    server = make_server(host, port, site, ssl_context)
+    print(f"Serving {directory} at {'https' if ssl_context else 'http'}://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def add_arguments(parser: argparse.ArgumentParser, port: int, directory: str = "build/web"):
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=port)
+    parser.add_argument("--directory", default=directory)
+    parser.add_argument("--memory-mb", type=int, default=int(os.getenv("STATIC_MEMORY_MB", "256")),
+                        help="Budget for file bodies and compressed variants held in RAM")
+    parser.add_argument("--brotli-quality", type=int, default=int(os.getenv("STATIC_BROTLI_QUALITY", "9")))
+    parser.add_argument("--max-age", type=int, default=int(os.getenv("STATIC_MAX_AGE", "0")),
+                        help="Cache lifetime (s) for unhashed assets; 0 means always revalidate by ETag")
+
+
+def site_options(args) -> dict:
+    return {"memory_limit": args.memory_mb * 1024 * 1024, "brotli_quality": args.brotli_quality,
+            "max_age": args.max_age}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the Flutter web build.")
+    add_arguments(parser, 8081)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.directory, **site_options(args))